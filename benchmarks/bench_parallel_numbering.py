@@ -0,0 +1,54 @@
+"""
+Numbering throughput (sequences per second) against worker count.
+
+Usage:
+    python benchmarks/bench_parallel_numbering.py --n-seqs 2000 --workers 1 2 4 8
+
+Requires anarci. Input sequences are random CDR3 variants of a human VH so
+that every sequence goes through a full HMMER search.
+"""
+import argparse
+import random
+import time
+
+from protein_ab_tools import run_numbering_batch
+
+HEAVY_CHAIN_SEQ = 'QVQLVESGGGVVQPGRSLRLDCKASGITFSNSGMHWVRQAPGKGLEWVAVIWYDGSKRYYADSVKGRFTISRNSKNTLFLQMNSLRAEDTAVYYCATNDDYWGQGTLVTTVSS'
+AMINO_ACIDS = 'ACDEFGHIKLMNPQRSTVWY'
+
+
+def make_variants(n, seed=0):
+    """Heavy chains with random CDR3s of 3 to 15 residues."""
+    rng = random.Random(seed)
+    prefix = HEAVY_CHAIN_SEQ[:HEAVY_CHAIN_SEQ.index('YYCA') + 4]
+    suffix = HEAVY_CHAIN_SEQ[HEAVY_CHAIN_SEQ.index('WGQG'):]
+    return [
+        prefix + ''.join(rng.choices(AMINO_ACIDS, k=rng.randint(3, 15))) + suffix
+        for _ in range(n)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--n-seqs', type=int, default=2000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--chunk-size', type=int, default=250)
+    parser.add_argument('--scheme', default='imgt')
+    args = parser.parse_args()
+
+    seqs = make_variants(args.n_seqs)
+    print(f'{"workers":>8} {"seconds":>10} {"seqs/s":>10} {"speedup":>8}')
+    baseline = None
+    for n_jobs in args.workers:
+        start = time.perf_counter()
+        records = run_numbering_batch(seqs, scheme=args.scheme, chain='H',
+                                      chunk_size=args.chunk_size, n_jobs=n_jobs)
+        elapsed = time.perf_counter() - start
+        assert len(records) == len(seqs)
+        rate = len(seqs) / elapsed
+        baseline = baseline or rate
+        print(f'{n_jobs:>8} {elapsed:>10.2f} {rate:>10.1f} {rate / baseline:>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
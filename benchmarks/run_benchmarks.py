@@ -0,0 +1,193 @@
+"""
+Throughput and latency benchmarks, saved as JSON and checked against a baseline.
+
+Usage:
+    python benchmarks/run_benchmarks.py -o baseline.json
+    python benchmarks/run_benchmarks.py --baseline baseline.json -o current.json
+
+Inputs are seeded synthetic VH and VL domains (``protein_ab_tools.testing``).
+Numbering uses the deterministic ANARCI stand-in by default, so the numbers
+measure this package's own overhead and run without a bioconda install; pass
+``--anarci real`` to include HMMER. With ``--baseline``, every case whose
+throughput fell by more than ``--tolerance`` is reported and the exit status
+is 1. Compare results from the same machine, ``--anarci`` mode and
+``--quick`` setting only.
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import protein_ab_tools
+from protein_ab_tools import (assign_germlines_batch, calc_percent_similarity, extract_regions,
+                              extract_regions_batch, is_similar_matrix, run_numbering,
+                              run_numbering_batch, similarity_matrix)
+from protein_ab_tools.testing import synthetic_sequences, use_fake_anarci
+
+# Items per case: (quick, full).
+SIZES = {
+    'numbering': (20, 200),
+    'numbering_batch': (200, 2000),
+    'similarity': (100, 1000),
+    'matrix': (30, 150),
+    'import': (3, 10),
+}
+
+
+def _summary(n_items: int, seconds: float, latencies=None) -> dict:
+    """
+    Throughput of a case. With per-call ``latencies`` it is taken from the
+    median latency, which is less sensitive to stray slow calls than the
+    total time.
+    """
+    result = {'n': n_items, 'seconds': round(seconds, 6),
+              'ops_per_s': round(n_items / seconds, 3) if seconds else None}
+    if latencies:
+        latencies = sorted(latencies)
+        median = statistics.median(latencies)
+        result['ops_per_s'] = round(1 / median, 3) if median else None
+        result['p50_ms'] = round(1000 * median, 4)
+        result['p95_ms'] = round(1000 * latencies[int(0.95 * (len(latencies) - 1))], 4)
+    return result
+
+
+def _per_call(func, items) -> dict:
+    """Call ``func`` on each item in turn, timing every call."""
+    func(items[0])
+    latencies = []
+    for item in items:
+        start = time.perf_counter()
+        func(item)
+        latencies.append(time.perf_counter() - start)
+    return _summary(len(items), sum(latencies), latencies)
+
+
+def _batch(func, items, n_items=None, repeat: int = 3) -> dict:
+    """Best of ``repeat`` timed calls of ``func`` on all ``items``."""
+    func(items[:2])
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(items)
+        timings.append(time.perf_counter() - start)
+    return _summary(n_items or len(items), min(timings))
+
+
+def bench_import(repeat: int) -> dict:
+    """``import protein_ab_tools`` in fresh interpreters, from ``-X importtime``."""
+    latencies = []
+    for _ in range(repeat):
+        stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                                 'import protein_ab_tools'],
+                                capture_output=True, text=True, check=True).stderr
+        for line in stderr.splitlines():
+            parts = [part.strip() for part in line.split('|')]
+            if len(parts) == 3 and parts[2] == 'protein_ab_tools':
+                latencies.append(int(parts[1]) / 1e6)
+    return _summary(len(latencies), sum(latencies), latencies)
+
+
+def run_benchmarks(quick: bool = False, seed: int = 0) -> dict:
+    """Run every case and return ``{name: summary}``."""
+    size = {key: quick_size if quick else full_size
+            for key, (quick_size, full_size) in SIZES.items()}
+    heavy = synthetic_sequences(size['numbering_batch'], 'H', seed=seed)
+    light = synthetic_sequences(size['numbering_batch'], 'L', seed=seed + 1)
+    few = heavy[:size['numbering']]
+    pairs = list(zip(heavy[:size['similarity']], light[:size['similarity']]))
+    matrix_seqs = heavy[:size['matrix']]
+    n_pairs = size['matrix'] * (size['matrix'] - 1) // 2
+
+    return {
+        'import_time': bench_import(size['import']),
+        'run_numbering': _per_call(run_numbering, few),
+        'run_numbering_batch': _batch(lambda seqs: run_numbering_batch(seqs, chain='H'), heavy),
+        'run_numbering_batch_light': _batch(lambda seqs: run_numbering_batch(seqs, chain='L'),
+                                            light),
+        'assign_germlines_batch': _batch(lambda seqs: assign_germlines_batch(seqs, chain='H'),
+                                         heavy),
+        'extract_regions': _per_call(extract_regions, few),
+        'extract_regions_batch': _batch(extract_regions_batch, heavy),
+        'calc_percent_similarity': _per_call(lambda pair: calc_percent_similarity(*pair), pairs),
+        'similarity_matrix': _batch(similarity_matrix, matrix_seqs, n_pairs),
+        'is_similar_matrix': _batch(is_similar_matrix, matrix_seqs, n_pairs),
+    }
+
+
+def metadata(anarci: str, quick: bool, seed: int) -> dict:
+    return {
+        'date': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'version': protein_ab_tools.__version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'anarci': anarci,
+        'quick': quick,
+        'seed': seed,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float = 0.2) -> list:
+    """
+    Messages for the cases of ``results`` whose throughput is more than
+    ``tolerance`` (a fraction) below that of ``baseline``.
+    """
+    regressions = []
+    for name, result in results['results'].items():
+        before = baseline['results'].get(name, {}).get('ops_per_s')
+        after = result.get('ops_per_s')
+        if before and after is not None and after < before * (1 - tolerance):
+            regressions.append(f'{name}: {after:.1f}/s vs {before:.1f}/s in the baseline '
+                               f'({after / before - 1:+.0%})')
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--anarci', choices=['fake', 'real'], default='fake',
+                        help='number with the ANARCI stand-in or with anarci (default: fake)')
+    parser.add_argument('--quick', action='store_true', help='small inputs, for smoke tests')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', help='write the results as JSON to this file')
+    parser.add_argument('--baseline', help='JSON results to check for regressions against')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed fractional throughput drop (default: 0.2)')
+    args = parser.parse_args(argv)
+
+    if args.anarci == 'real' and not protein_ab_tools.ANARCI_AVAILABLE:
+        parser.error('--anarci real needs anarci to be installed')
+    fake = use_fake_anarci() if args.anarci == 'fake' else contextlib.nullcontext()
+    with fake:
+        results = {'meta': metadata(args.anarci, args.quick, args.seed),
+                   'results': run_benchmarks(quick=args.quick, seed=args.seed)}
+
+    print(f'{"case":<28} {"n":>6} {"ops/s":>12} {"p50 ms":>10} {"p95 ms":>10}')
+    for name, result in results['results'].items():
+        print(f'{name:<28} {result["n"]:>6} {result["ops_per_s"] or 0:>12.1f} '
+              f'{result.get("p50_ms", ""):>10} {result.get("p95_ms", ""):>10}')
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        for key in ('anarci', 'quick'):
+            if baseline['meta'].get(key) != results['meta'][key]:
+                print(f'warning: baseline was run with {key}={baseline["meta"].get(key)}',
+                      file=sys.stderr)
+        regressions = compare(results, baseline, args.tolerance)
+        for message in regressions:
+            print(f'REGRESSION {message}', file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,24 +1,114 @@
 """
 Protein and Antibody Tools (PAT) - Utilities for protein and antibody sequence analysis.
+
+The public names below are imported from their subpackages on first
+access, so ``import protein_ab_tools`` stays fast and worker processes only
+load the dependencies (anarci, Biopython, NumPy) of what they use.
 """
-from .ab_analysis import (
-    run_numbering,
-    get_numbered_seq,
-    extract_regions,
-    extract_species,
-    ANARCI_AVAILABLE
-)
-from .align import calc_percent_similarity
+import importlib
+
+_EXPORTS = {
+    'run_numbering': '.ab_analysis',
+    'run_numbering_batch': '.ab_analysis',
+    'annotate': '.ab_analysis',
+    'annotate_batch': '.ab_analysis',
+    'annotate_domains': '.ab_analysis',
+    'annotate_domains_batch': '.ab_analysis',
+    'split_chains': '.ab_analysis',
+    'Annotation': '.ab_analysis',
+    'get_numbered_seq': '.ab_analysis',
+    'get_numbered_seq_batch': '.ab_analysis',
+    'extract_regions': '.ab_analysis',
+    'extract_regions_batch': '.ab_analysis',
+    'extract_species': '.ab_analysis',
+    'extract_species_batch': '.ab_analysis',
+    'NumberingRecord': '.ab_analysis',
+    'NumberingBatch': '.ab_analysis',
+    'NumberingCache': '.ab_analysis',
+    'NumberedChain': '.ab_analysis',
+    'PositionalLibrary': '.ab_analysis',
+    'positional_identity': '.ab_analysis',
+    'Prefilter': '.ab_analysis',
+    'Repertoire': '.ab_analysis',
+    'cluster_clonotypes': '.ab_analysis',
+    'cluster_annotations': '.ab_analysis',
+    'assign_germlines_batch': '.ab_analysis',
+    'GermlineCall': '.ab_analysis',
+    'ANARCI_AVAILABLE': '.ab_analysis',
+    'AsyncNumberer': '.aio',
+    'AsyncSimilarity': '.aio',
+    'anumber': '.aio',
+    'asimilarity': '.aio',
+    'KmerIndex': '.align',
+    'calc_percent_similarity': '.align',
+    'is_similar': '.align',
+    'is_similar_batch': '.align',
+    'is_similar_matrix': '.align',
+    'similarity_matrix': '.align',
+}
+
+
+# Subpackages that used to be imported with the package, so
+# ``protein_ab_tools.align`` works without importing it first.
+_SUBPACKAGES = ('ab_analysis', 'aio', 'align')
+
+
+def __getattr__(name):
+    if name in _SUBPACKAGES:
+        return importlib.import_module(f'.{name}', __name__)
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS) | set(_SUBPACKAGES))
+
 
 __all__ = [
     # Antibody numbering functions
     'run_numbering',
+    'run_numbering_batch',
+    'annotate',
+    'annotate_batch',
+    'annotate_domains',
+    'annotate_domains_batch',
+    'split_chains',
+    'Annotation',
     'get_numbered_seq',
+    'get_numbered_seq_batch',
     'extract_regions',
+    'extract_regions_batch',
     'extract_species',
+    'extract_species_batch',
+    'NumberingRecord',
+    'NumberingBatch',
+    'NumberingCache',
+    'NumberedChain',
+    'PositionalLibrary',
+    'positional_identity',
+    'Prefilter',
+    'Repertoire',
+    'cluster_clonotypes',
+    'cluster_annotations',
+    'assign_germlines_batch',
+    'GermlineCall',
     'ANARCI_AVAILABLE',
     # Sequence alignment functions
     'calc_percent_similarity',
+    'is_similar',
+    'is_similar_batch',
+    'is_similar_matrix',
+    'similarity_matrix',
+    'KmerIndex',
+    # Asyncio API
+    'anumber',
+    'asimilarity',
+    'AsyncNumberer',
+    'AsyncSimilarity',
 ]
 
 __version__ = '0.0.1'
@@ -1,18 +1,91 @@
 """
 Antibody analysis module.
+
+Names are imported from their submodules on first access, so importing the
+package does not load NumPy or anarci until they are needed.
 """
-from .numbering import (
-    run_numbering,
-    get_numbered_seq,
-    extract_regions,
-    extract_species,
-    ANARCI_AVAILABLE
-)
+import importlib
+
+_EXPORTS = {
+    'PyhmmerBackend': '.backends',
+    'get_backend': '.backends',
+    'register_backend': '.backends',
+    'NumberingCache': '.cache',
+    'NumberedChain': '.chain',
+    'cluster_annotations': '.clonotype',
+    'cluster_clonotypes': '.clonotype',
+    'GermlineCall': '.germline',
+    'GermlineDB': '.germline',
+    'assign_germlines_batch': '.germline',
+    'germline_db': '.germline',
+    'run_numbering': '.numbering',
+    'run_numbering_batch': '.numbering',
+    'annotate': '.numbering',
+    'annotate_batch': '.numbering',
+    'annotate_domains': '.numbering',
+    'annotate_domains_batch': '.numbering',
+    'split_chains': '.numbering',
+    'Annotation': '.numbering',
+    'get_numbered_seq': '.numbering',
+    'get_numbered_seq_batch': '.numbering',
+    'extract_regions': '.numbering',
+    'extract_regions_batch': '.numbering',
+    'extract_species': '.numbering',
+    'extract_species_batch': '.numbering',
+    'NumberingRecord': '.numbering',
+    'NumberingBatch': '.numbering',
+    'ANARCI_AVAILABLE': '.numbering',
+    'PositionalLibrary': '.positional',
+    'positional_identity': '.positional',
+    'Prefilter': '.prefilter',
+    'Repertoire': '.repertoire',
+}
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
+
 
 __all__ = [
     'run_numbering',
+    'run_numbering_batch',
+    'annotate',
+    'annotate_batch',
+    'annotate_domains',
+    'annotate_domains_batch',
+    'split_chains',
+    'Annotation',
     'get_numbered_seq',
+    'get_numbered_seq_batch',
     'extract_regions',
+    'extract_regions_batch',
     'extract_species',
+    'extract_species_batch',
+    'NumberingRecord',
+    'NumberingBatch',
+    'NumberingCache',
+    'NumberedChain',
+    'PositionalLibrary',
+    'positional_identity',
+    'Prefilter',
+    'Repertoire',
+    'cluster_clonotypes',
+    'cluster_annotations',
+    'assign_germlines_batch',
+    'germline_db',
+    'GermlineCall',
+    'GermlineDB',
+    'PyhmmerBackend',
+    'get_backend',
+    'register_backend',
     'ANARCI_AVAILABLE'
 ]
@@ -0,0 +1,204 @@
+"""
+HMM search backends for numbering.
+
+anarci finds and aligns domains with ``run_hmmer``, which writes the
+sequences to a temporary FASTA file, runs ``hmmscan`` on it and parses the
+text output. That is the default, ``'hmmscan'``. A backend is any object
+with the same ``run_hmmer(sequence_list, bit_score_threshold=80,
+hmmer_species=None)`` method, returning anarci's ``(hit_table,
+state_vectors, details)`` for each sequence. Numbering from its alignments
+is unchanged, so every backend gives the same numbering as anarci.
+
+``'pyhmmer'`` (``PyhmmerBackend``) scores sequences in-process with the
+pyhmmer bindings to HMMER. anarci's HMMs are read once per process and
+kept in memory, and hits are handed to anarci's own hit parser without a
+subprocess, temporary files or text output. Other backends can be added
+with ``register_backend``.
+"""
+import importlib.util
+import os
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+PYHMMER_AVAILABLE = importlib.util.find_spec('pyhmmer') is not None
+
+_factories: Dict[str, Callable[[], object]] = {}
+_instances: Dict[str, object] = {}
+
+
+def _check_pyhmmer():
+    """Check if pyhmmer is available and raise helpful error if not."""
+    if not PYHMMER_AVAILABLE:
+        raise ImportError(
+            "pyhmmer is required for the 'pyhmmer' backend. "
+            "Please install it: pip install pyhmmer"
+        )
+
+
+def check_for_j(sequences: Sequence[Tuple[str, str]], alignments: list,
+                run_hmmer: Callable[..., list]):
+    """
+    anarci's ``check_for_j``, searching with the ``run_hmmer`` of a backend.
+
+    A long CDR3 can make an alignment without the J region score best.
+    When a single-domain alignment ends before state 120 with over 30
+    residues left, the sequence after Cys104 is searched again for a J
+    region, and the residues in between are numbered as CDR3. Alignments
+    are updated in place.
+    """
+    for (name, seq), (_, state_vectors, details) in zip(sequences, alignments):
+        if len(state_vectors) != 1:
+            continue
+        alignment = state_vectors[0]
+        (last_state, _), last_index = alignment[-1]
+        if last_state >= 120 or last_index + 30 >= len(seq):
+            continue
+        cys_index = dict(alignment).get((104, 'm'))
+        if cys_index is None:
+            continue
+        cys_position = alignment.index(((104, 'm'), cys_index))
+        _, j_states, _ = run_hmmer([(name, seq[cys_index + 1:])], bit_score_threshold=10)[0]
+        if not (j_states and j_states[0][-1][0][0] >= 126 and j_states[0][0][0][0] <= 117):
+            continue
+        j_region = [(state, index + cys_index + 1) for state, index in j_states[0]
+                    if state[0] >= 117 and index is not None]
+        cdr_region = []
+        state = 105
+        for index in range(cys_index + 1, j_region[0][1]):
+            if state >= 116:
+                cdr_region.append(((116, 'i'), index))
+            else:
+                cdr_region.append(((state, 'm'), index))
+                state += 1
+        state_vectors[0] = alignment[:cys_position + 1] + cdr_region + j_region
+        details[0]['query_end'] = j_region[-1][1] + 1
+
+
+class HmmscanBackend:
+    """anarci's ``run_hmmer``: an hmmscan subprocess per call."""
+
+    name = 'hmmscan'
+
+    def __repr__(self):
+        return 'HmmscanBackend()'
+
+    def run_hmmer(self, sequence_list, bit_score_threshold: float = 80,
+                  hmmer_species: Optional[List[str]] = None) -> list:
+        from . import numbering
+        return numbering.run_hmmer(sequence_list, bit_score_threshold=bit_score_threshold,
+                                   hmmer_species=hmmer_species)
+
+
+def _hsp(hit, domain) -> SimpleNamespace:
+    """
+    A pyhmmer domain as the Biopython HSP anarci parses from hmmscan's
+    text output, with the scores rounded as hmmscan prints them.
+    """
+    alignment = domain.alignment
+    return SimpleNamespace(
+        hit_id=hit.name,
+        hit_description=hit.description or '',
+        evalue=float(f'{domain.i_evalue:.2g}'),
+        bitscore=float(f'{domain.score:.1f}'),
+        bias=float(f'{domain.bias:.1f}'),
+        query_start=alignment.target_from - 1,
+        query_end=alignment.target_to,
+        hit_start=alignment.hmm_from - 1,
+        hit_end=alignment.hmm_to,
+        # '.' marks insert columns; anarci's HMMs annotate every match state 'x'.
+        aln_annotation={
+            'RF': ''.join('.' if aa == '.' else 'x' for aa in alignment.hmm_sequence),
+            'PP': alignment.posterior_probabilities,
+        },
+    )
+
+
+class PyhmmerBackend:
+    """
+    In-process HMMER search with pyhmmer.
+
+    The HMMs are read and optimised once, when the backend is created;
+    ``get_backend('pyhmmer')`` keeps one per process.
+
+    Args:
+        hmm_path: HMM database. Defaults to the one shipped with anarci.
+        cpus: Threads per search. The default of 1 leaves parallelism to
+            the ``n_jobs`` worker processes of the batch functions.
+    """
+
+    name = 'pyhmmer'
+
+    def __init__(self, hmm_path: Optional[str] = None, cpus: int = 1):
+        _check_pyhmmer()
+        from pyhmmer import plan7
+        if hmm_path is None:
+            from . import numbering
+            numbering._check_anarci()
+            import anarci
+            hmm_path = os.path.join(os.path.dirname(anarci.__file__), 'dat', 'HMMs', 'ALL.hmm')
+        self.hmm_path = hmm_path
+        self.cpus = cpus
+        with plan7.HMMFile(hmm_path) as hmm_file:
+            hmms = list(hmm_file)
+        self._alphabet = hmms[0].alphabet
+        background = plan7.Background(self._alphabet)
+        profiles = []
+        for hmm in hmms:
+            profile = plan7.Profile(hmm.M, self._alphabet)
+            profile.configure(hmm, background)
+            profiles.append(profile.to_optimized())
+        self._profiles = plan7.OptimizedProfileBlock(self._alphabet, profiles)
+
+    def __repr__(self):
+        return f'PyhmmerBackend({self.hmm_path!r}, cpus={self.cpus})'
+
+    def run_hmmer(self, sequence_list, bit_score_threshold: float = 80,
+                  hmmer_species: Optional[List[str]] = None) -> list:
+        from anarci.anarci import _parse_hmmer_query
+        from pyhmmer import easel, hmmer
+        queries = [easel.TextSequence(name=str(i).encode(), sequence=seq).digitize(self._alphabet)
+                   for i, (_, seq) in enumerate(sequence_list)]
+        results = []
+        # hmmscan's text output lists the reported domains of the reported hits.
+        for (_, seq), hits in zip(sequence_list,
+                                  hmmer.hmmscan(queries, self._profiles, cpus=self.cpus)):
+            hsps = [_hsp(hit, domain) for hit in hits.reported
+                    for domain in hit.domains.reported]
+            query = SimpleNamespace(hsps=hsps, seq_len=len(seq))
+            results.append(_parse_hmmer_query(query, bit_score_threshold=bit_score_threshold,
+                                              hmmer_species=hmmer_species))
+        return results
+
+
+def register_backend(name: str, factory: Callable[[], object]):
+    """
+    Make ``factory()`` the backend called ``name``. It is called once per
+    process, on first use, so worker processes create their own.
+    """
+    _factories[name] = factory
+    _instances.pop(name, None)
+
+
+def get_backend(backend: Union[str, object]) -> object:
+    """The backend called ``backend``, or ``backend`` itself if it is one."""
+    if not isinstance(backend, str):
+        if not callable(getattr(backend, 'run_hmmer', None)):
+            raise TypeError(f'A backend needs a run_hmmer method, not {backend!r}')
+        return backend
+    if backend not in _instances:
+        if backend not in _factories:
+            raise ValueError(f'Unknown backend {backend!r}; expected one of {sorted(_factories)}')
+        _instances[backend] = _factories[backend]()
+    return _instances[backend]
+
+
+def align(backend: object, sequences: Sequence[Tuple[str, str]],
+          hmmer_species: Optional[List[str]] = None) -> list:
+    """Alignments of (name, seq) pairs, as anarci's ``run_hmmer`` and ``check_for_j`` make them."""
+    alignments = backend.run_hmmer(sequences, hmmer_species=hmmer_species)
+    check_for_j(sequences, alignments, backend.run_hmmer)
+    return alignments
+
+
+register_backend('hmmscan', HmmscanBackend)
+register_backend('pyhmmer', PyhmmerBackend)
@@ -0,0 +1,203 @@
+"""
+Persistent on-disk cache of numbering results.
+"""
+import copy
+import hashlib
+import os
+import pickle
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .. import instrumentation
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS numbering (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS numbering_accessed ON numbering (accessed);
+'''
+
+# SQLite limits the number of bound parameters per statement.
+_MAX_PARAMS = 500
+
+
+def _anarci_version() -> str:
+    # importlib.metadata takes longer to import than the rest of this module.
+    from importlib import metadata
+    try:
+        return metadata.version('anarci')
+    except metadata.PackageNotFoundError:
+        return 'unknown'
+
+
+class NumberingCache:
+    """
+    SQLite-backed cache of ``run_numbering`` results.
+
+    Entries are keyed by a hash of the normalised sequence and the numbering
+    parameters (scheme, chain, germline, species) plus the installed anarci
+    version, so upgrading anarci never serves stale numbering. Each process
+    opens its own connection and the database runs in WAL mode, so one cache
+    file can be shared by concurrent jobs and pool workers.
+
+    Values are pickled; only point the cache at files you created.
+
+    Args:
+        path: Location of the SQLite database file. Created if missing.
+        max_size: Optional size limit in bytes for the stored results.
+            When exceeded, least recently used entries are evicted.
+        timeout: Seconds to wait for a lock held by another process.
+    """
+
+    def __init__(self, path: str, max_size: Optional[int] = None, timeout: float = 30.0):
+        self.path = os.fspath(path)
+        self.max_size = max_size
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._namespace = _anarci_version()
+        self._conn = None
+        self._pid = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_conn'] = None
+        state['_pid'] = None
+        return state
+
+    def __repr__(self):
+        return f'NumberingCache({self.path!r}, max_size={self.max_size!r})'
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """The connection of the current process, opened on first use."""
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(_SCHEMA)
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def close(self):
+        if self._conn is not None and self._pid == os.getpid():
+            self._conn.close()
+        self._conn = None
+        self._pid = None
+
+    def key(self, seq: str, scheme: str, chain: str, germline: bool,
+            species: Iterable[str]) -> str:
+        """Cache key of an already normalised sequence and numbering parameters."""
+        fields = (self._namespace, scheme.lower(), str(chain), str(bool(germline)),
+                  ','.join(sorted(species)), seq)
+        return hashlib.sha256('\x1f'.join(fields).encode()).hexdigest()
+
+    def get(self, key: str):
+        """Cached result for ``key``, or None."""
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, tuple]:
+        """Cached results for the keys that are present."""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        for start in range(0, len(keys), _MAX_PARAMS):
+            part = keys[start:start + _MAX_PARAMS]
+            marks = ','.join('?' * len(part))
+            rows = self.conn.execute(
+                f'SELECT key, value FROM numbering WHERE key IN ({marks})', part).fetchall()
+            found.update((k, pickle.loads(v)) for k, v in rows)
+        if found:
+            now = time.time()
+            hit_keys = list(found)
+            for start in range(0, len(hit_keys), _MAX_PARAMS):
+                part = hit_keys[start:start + _MAX_PARAMS]
+                marks = ','.join('?' * len(part))
+                self.conn.execute(
+                    f'UPDATE numbering SET accessed = ? WHERE key IN ({marks})', [now, *part])
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        instrumentation.count('cache_hits', len(found))
+        instrumentation.count('cache_misses', len(keys) - len(found))
+        return found
+
+    def get_named(self, keys: List[str], names: List[str]) -> Dict[int, tuple]:
+        """
+        Cached results by position in ``keys``, with the anarci ``query_name``
+        set to the matching entry of ``names``.
+        """
+        found = self.get_many(keys)
+        results = {}
+        seen = set()
+        for i, key in enumerate(keys):
+            if key not in found:
+                continue
+            result = copy.deepcopy(found[key]) if key in seen else found[key]
+            seen.add(key)
+            for details in result[1]:
+                for domain in details or ():
+                    domain['query_name'] = names[i]
+            results[i] = result
+        return results
+
+    def put(self, key: str, result: tuple):
+        self.put_many([(key, result)])
+
+    def put_many(self, items: Iterable[Tuple[str, tuple]]):
+        """Store results and evict old entries if the cache is over ``max_size``."""
+        now = time.time()
+        rows = []
+        for key, result in items:
+            value = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+            rows.append((key, value, len(value), now))
+        if not rows:
+            return
+        conn = self.conn
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany(
+                'INSERT OR REPLACE INTO numbering (key, value, size, accessed) VALUES (?, ?, ?, ?)',
+                rows)
+            if self.max_size is not None:
+                self._evict(conn)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _evict(self, conn: sqlite3.Connection):
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM numbering').fetchone()[0]
+        if total <= self.max_size:
+            return
+        # Evict down to 90% of the limit so a full cache doesn't evict on every put.
+        target = int(self.max_size * 0.9)
+        evict = []
+        for key, size in conn.execute('SELECT key, size FROM numbering ORDER BY accessed'):
+            if total <= target:
+                break
+            evict.append((key,))
+            total -= size
+        conn.executemany('DELETE FROM numbering WHERE key = ?', evict)
+
+    def clear(self):
+        self.conn.execute('DELETE FROM numbering')
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Hit/miss counts of this instance and the size of the shared cache.
+        """
+        entries, size = self.conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM numbering').fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': entries,
+            'size_bytes': size,
+        }
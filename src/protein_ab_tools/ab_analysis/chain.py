@@ -0,0 +1,168 @@
+"""
+Compact array-backed representation of one numbered antibody domain.
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .regions import NO_REGION, region_chain, region_table
+from .repertoire import Repertoire, _on_axis, position_axis
+
+GAP = ord('-')
+
+
+class NumberedChain:
+    """
+    One numbered domain stored as three parallel arrays instead of anarci's
+    list of ``((number, insertion), aa)`` tuples.
+
+    ``numbers`` (int16) and ``insertions`` (2-byte codes) give the position
+    of each entry and ``residues`` (uint8) its residue byte, with 0 at
+    gaps, the encoding of ``Repertoire``. Regions, species, germline and
+    the gapped sequence are computed on access. A chain takes several times
+    less memory than the nested tuples and pickles to about half the size.
+
+    Use ``from_result`` to convert a ``run_numbering`` result.
+    """
+
+    __slots__ = ('numbers', 'insertions', 'residues', 'scheme', 'chain',
+                 'start', 'end', 'details', 'hits')
+
+    def __init__(self, numbers: np.ndarray, insertions: np.ndarray, residues: np.ndarray,
+                 scheme: str = 'imgt', chain: str = 'H', start: Optional[int] = None,
+                 end: Optional[int] = None, details: Optional[dict] = None, hits=None):
+        self.numbers = numbers
+        self.insertions = insertions
+        self.residues = residues
+        self.scheme = scheme
+        self.chain = chain
+        self.start = start
+        self.end = end
+        self.details = details if details is not None else {}
+        self.hits = hits
+
+    @classmethod
+    def from_numbering(cls, numbered: Sequence, scheme: str = 'imgt', chain: str = 'H',
+                       **kwargs) -> 'NumberedChain':
+        """Build a chain from an anarci numbered domain."""
+        numbers = np.fromiter((number for (number, _), _ in numbered), dtype=np.int16,
+                              count=len(numbered))
+        insertions = np.array([insertion for (_, insertion), _ in numbered], dtype='S2')
+        residues = np.frombuffer(''.join([aa for _, aa in numbered]).encode('ascii'),
+                                 dtype=np.uint8).copy()
+        residues[residues == GAP] = 0
+        return cls(numbers, insertions, residues, scheme=scheme, chain=chain, **kwargs)
+
+    @classmethod
+    def from_result(cls, result: tuple, scheme: str = 'imgt',
+                    chain: str = 'H') -> 'NumberedChain':
+        """
+        Convert a ``run_numbering`` result. Only the first domain is kept,
+        as everywhere else in this package. With ``chain='auto'`` the chain
+        is the detected chain type of the domain.
+        """
+        numbered, start, end = result[0][0][0]
+        if chain == 'auto':
+            chain = region_chain(result[1][0][0]['chain_type'])
+        return cls.from_numbering(numbered, scheme=scheme, chain=chain, start=start, end=end,
+                                  details=result[1][0][0], hits=result[2][0])
+
+    def to_result(self) -> tuple:
+        """The chain in the nested shape returned by ``run_numbering``."""
+        return ([[(self.numbering, self.start, self.end)]], [[self.details]], [self.hits])
+
+    def renamed(self, name: str) -> 'NumberedChain':
+        """A copy sharing the arrays, with the anarci ``query_name`` set to ``name``."""
+        return NumberedChain(self.numbers, self.insertions, self.residues, scheme=self.scheme,
+                             chain=self.chain, start=self.start, end=self.end,
+                             details=dict(self.details, query_name=name), hits=self.hits)
+
+    def __getstate__(self):
+        # Raw bytes pickle far smaller and faster than three ndarrays, and
+        # most positions have no insertion code, so only the others are kept.
+        insertions = {i: bytes(code) for i, code in enumerate(self.insertions) if code != b' '}
+        return (self.numbers.tobytes(), self.residues.tobytes(), insertions, self.scheme,
+                self.chain, self.start, self.end, self.details, self.hits)
+
+    def __setstate__(self, state):
+        numbers, residues, insertions, *rest = state
+        self.numbers = np.frombuffer(numbers, dtype=np.int16).copy()
+        self.residues = np.frombuffer(residues, dtype=np.uint8).copy()
+        self.insertions = np.full(len(self.numbers), b' ', dtype='S2')
+        for i, code in insertions.items():
+            self.insertions[i] = code
+        self.scheme, self.chain, self.start, self.end, self.details, self.hits = rest
+
+    def __len__(self):
+        return len(self.residues)
+
+    def __repr__(self):
+        return (f'NumberedChain(scheme={self.scheme!r}, chain={self.chain!r}, '
+                f'seq={self.sequence!r})')
+
+    def __eq__(self, other):
+        if not isinstance(other, NumberedChain):
+            return NotImplemented
+        return (self.scheme == other.scheme and self.chain == other.chain
+                and np.array_equal(self.numbers, other.numbers)
+                and np.array_equal(self.insertions, other.insertions)
+                and np.array_equal(self.residues, other.residues))
+
+    @property
+    def positions(self) -> List[Tuple[int, str]]:
+        return [(int(number), insertion.decode('ascii') or ' ')
+                for number, insertion in zip(self.numbers, self.insertions)]
+
+    @property
+    def numbering(self) -> List[Tuple[Tuple[int, str], str]]:
+        """The anarci numbered domain, ``[((number, insertion), aa), ...]``."""
+        return list(zip(self.positions, self.numbered_seq))
+
+    @property
+    def numbered_seq(self) -> str:
+        """The gapped numbered sequence, as returned by ``get_numbered_seq``."""
+        gapped = np.where(self.residues == 0, GAP, self.residues).astype(np.uint8)
+        return gapped.tobytes().decode('ascii')
+
+    @property
+    def sequence(self) -> str:
+        """The numbered residues without gaps."""
+        return self.residues[self.residues != 0].tobytes().decode('ascii')
+
+    @property
+    def regions(self) -> Dict[str, str]:
+        """Framework and CDR sequences, as returned by ``extract_regions``."""
+        table = region_table(self.scheme, self.chain)
+        numbers = self.numbers.astype(np.int64)
+        inside = (numbers >= 0) & (numbers < len(table.array))
+        region = np.full(len(numbers), NO_REGION, dtype=np.int64)
+        region[inside] = table.array[numbers[inside]]
+        residues = np.where(self.residues == 0, GAP, self.residues).astype(np.uint8)
+        return {key: residues[region == i].tobytes().decode('ascii')
+                for i, key in enumerate(table.keys)}
+
+    @property
+    def chain_type(self) -> Optional[str]:
+        return self.details.get('chain_type')
+
+    @property
+    def species(self) -> Optional[str]:
+        """The species of the best HMM hit, as returned by ``extract_species``."""
+        return self.details.get('species')
+
+    @property
+    def germline(self) -> Optional[dict]:
+        """V and J germline assignments, if numbering was run with ``germline=True``."""
+        return self.details.get('germlines')
+
+    def to_repertoire(self) -> Repertoire:
+        """
+        A one-sequence ``Repertoire`` over the position axis of
+        ``Repertoire.from_numbering``. Its residue matrix is a view of this
+        chain's residues (no copy) when the chain spans the whole axis, as
+        untruncated domains do.
+        """
+        positions = self.positions
+        axis = position_axis(positions, self.scheme, self.chain)
+        return Repertoire(_on_axis(self.residues[None, :], positions, axis), axis,
+                          scheme=self.scheme, chain=self.chain)
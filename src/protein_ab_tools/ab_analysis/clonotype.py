@@ -0,0 +1,318 @@
+"""
+Clonotype clustering of CDR3s without all-vs-all alignment.
+
+Two sequences can only be in the same clonotype if they share V gene, J gene
+and CDR3 length, so sequences are first split into buckets on those keys.
+CDR3s of a bucket all have the same length, so their identity is a Hamming
+identity: ``100 * (1 - mismatches / length)``. Within a bucket, identical
+CDR3s are merged, and pairs within the allowed number of mismatches ``k``
+are found by pigeonhole: split the CDR3 into ``k + 1`` segments, and any two
+CDR3s with at most ``k`` mismatches agree exactly on at least one segment.
+So only CDR3s sharing a segment are compared, with vectorised Hamming
+distances. The pairs are then joined by single linkage or assigned to
+greedy centroids. Buckets are clustered in parallel with ``n_jobs``.
+"""
+import itertools
+from functools import partial
+from typing import Iterable, List, Literal, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..parallel import imap_ordered
+
+# Buckets (of distinct CDR3s) up to this size are compared all-vs-all.
+_ALL_PAIRS_SIZE = 128
+# Groups sharing a segment up to this size are paired by offset in one
+# vectorised pass; larger groups are compared all-vs-all.
+_OFFSET_GROUP_SIZE = 32
+# Entries of the temporary (rows x columns x length) comparison arrays.
+_BLOCK_ELEMENTS = 1 << 24
+# Distinct CDR3s per unit of work sent to a worker.
+_CHUNK_SIZE = 200_000
+
+
+def max_mismatches(length: int, min_identity: float) -> int:
+    """Mismatches allowed between two CDR3s of ``length`` residues at ``min_identity`` %."""
+    return int(np.floor(length * (100.0 - min_identity) / 100.0 + 1e-9))
+
+
+def _gene(call, allele: bool) -> str:
+    """``'IGHV3-23*01'`` (or a ``(species, gene)`` pair) -> ``'IGHV3-23'``."""
+    if call is None:
+        return ''
+    if isinstance(call, (tuple, list)):
+        call = call[1]
+    return call if allele else call.split('*')[0]
+
+
+def _gene_ids(genes: Optional[Sequence], n: int, allele: bool) -> np.ndarray:
+    """Integer id of the gene of each call (all 0 without calls)."""
+    if genes is None:
+        return np.zeros(n, dtype=np.int64)
+    # Number the distinct calls first (without a Python loop over all of
+    # them), then the genes of the distinct calls.
+    first = {}
+    call_ids = np.fromiter(map(first.setdefault, genes, itertools.count()), dtype=np.int64,
+                           count=n)
+    lookup = np.zeros(max(first.values(), default=0) + 1, dtype=np.int64)
+    ids = {}
+    for call, call_id in first.items():
+        lookup[call_id] = ids.setdefault(_gene(call, allele), len(ids))
+    return lookup[call_ids]
+
+
+def _hamming_pairs(codes: np.ndarray, k: int, i: np.ndarray, j: np.ndarray):
+    """The (i, j) pairs of rows of ``codes`` with at most ``k`` mismatches."""
+    step = max(1, _BLOCK_ELEMENTS // max(codes.shape[1], 1))
+    keep = np.empty(len(i), dtype=bool)
+    for start in range(0, len(i), step):
+        stop = start + step
+        keep[start:stop] = ((codes[i[start:stop]] != codes[j[start:stop]]).sum(axis=1) <= k)
+    return i[keep], j[keep]
+
+
+def _all_pairs(codes: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """All pairs i < j of rows of ``codes`` with at most ``k`` mismatches."""
+    n, length = codes.shape
+    block = max(1, _BLOCK_ELEMENTS // max(n * length, 1))
+    rows, cols = [], []
+    for start in range(0, n, block):
+        distances = (codes[start:start + block, None, :] != codes[None, :, :]).sum(axis=2)
+        i, j = np.nonzero(distances <= k)
+        i += start
+        upper = i < j
+        rows.append(i[upper])
+        cols.append(j[upper])
+    return np.concatenate(rows), np.concatenate(cols)
+
+
+def _neighbour_pairs(codes: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pairs i < j of distinct rows of ``codes`` (n x length) with at most
+    ``k`` mismatches, each pair once.
+    """
+    n, length = codes.shape
+    if n < 2 or k == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    if n <= _ALL_PAIRS_SIZE or k + 1 >= length:
+        return _all_pairs(codes, k)
+    bounds = np.linspace(0, length, k + 2).astype(np.int64)
+    rows, cols = [], []
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        segment = np.ascontiguousarray(codes[:, start:stop]).view(f'V{stop - start}').ravel()
+        order = np.argsort(segment, kind='stable')
+        segment = segment[order]
+        new_group = np.ones(n, dtype=bool)
+        new_group[1:] = segment[1:] != segment[:-1]
+        group_starts = np.flatnonzero(new_group)
+        sizes = np.diff(np.append(group_starts, n))
+        group = np.cumsum(new_group) - 1
+        # Small groups: pair each member with the following ones in order.
+        small = sizes[group] <= _OFFSET_GROUP_SIZE
+        for offset in range(1, min(int(sizes.max()), _OFFSET_GROUP_SIZE)):
+            same = small[:-offset] & (group[:-offset] == group[offset:])
+            if not same.any():
+                break
+            first = np.flatnonzero(same)
+            i, j = _hamming_pairs(codes, k, order[first], order[first + offset])
+            rows.append(i)
+            cols.append(j)
+        for group_start, size in zip(group_starts[sizes > _OFFSET_GROUP_SIZE],
+                                     sizes[sizes > _OFFSET_GROUP_SIZE]):
+            members = order[group_start:group_start + size]
+            i, j = _all_pairs(codes[members], k)
+            rows.append(members[i])
+            cols.append(members[j])
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    i = np.concatenate(rows)
+    j = np.concatenate(cols)
+    i, j = np.minimum(i, j), np.maximum(i, j)
+    pairs = np.unique(i * n + j)
+    return pairs // n, pairs % n
+
+
+def _single_linkage(n: int, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+    """Connected components of the graph with edges (i, j), labelled by their smallest node."""
+    labels = np.arange(n)
+    while len(i):
+        root_i, root_j = labels[i], labels[j]
+        low = np.minimum(root_i, root_j)
+        updated = labels.copy()
+        np.minimum.at(updated, root_i, low)
+        np.minimum.at(updated, root_j, low)
+        while True:
+            jumped = updated[updated]
+            if np.array_equal(jumped, updated):
+                break
+            updated = jumped
+        if np.array_equal(updated, labels):
+            break
+        labels = updated
+    return labels
+
+
+def _greedy(n: int, i: np.ndarray, j: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """
+    Greedy centroid clustering: the most abundant unassigned CDR3 becomes a
+    centroid and takes every unassigned CDR3 within the threshold of it.
+    """
+    sources = np.concatenate([i, j])
+    targets = np.concatenate([j, i])
+    order = np.argsort(sources, kind='stable')
+    targets = targets[order]
+    starts = np.searchsorted(sources[order], np.arange(n + 1))
+    labels = np.full(n, -1, dtype=np.int64)
+    for centroid in np.lexsort((np.arange(n), -counts)).tolist():
+        if labels[centroid] >= 0:
+            continue
+        labels[centroid] = centroid
+        neighbours = targets[starts[centroid]:starts[centroid + 1]]
+        labels[neighbours[labels[neighbours] < 0]] = centroid
+    return labels
+
+
+def _cluster_bucket(codes: np.ndarray, counts: np.ndarray, k: int, method: str) -> np.ndarray:
+    """Cluster labels (0..) of the distinct CDR3s of one bucket."""
+    i, j = _neighbour_pairs(codes, k)
+    if method == 'single':
+        labels = _single_linkage(len(codes), i, j)
+    else:
+        labels = _greedy(len(codes), i, j, counts)
+    return np.unique(labels, return_inverse=True)[1].reshape(-1)
+
+
+def _cluster_buckets(buckets, min_identity: float, method: str) -> List[np.ndarray]:
+    return [_cluster_bucket(codes, counts, max_mismatches(codes.shape[1], min_identity), method)
+            for codes, counts in buckets]
+
+
+def _encode_buckets(cdr3s: Sequence[str], buckets: List[np.ndarray], lengths: np.ndarray,
+                    distinct: list):
+    """
+    Yield the distinct CDR3s of each bucket (of sequence indices) as a
+    uint8 matrix, with their counts. The indices and the index of each
+    sequence's distinct CDR3 are appended to ``distinct``.
+    """
+    for members in buckets:
+        length = int(lengths[members[0]])
+        data = ''.join([cdr3s[i] for i in members]).encode('ascii')
+        codes = np.frombuffer(data, dtype=np.uint8).reshape(len(members), length)
+        rows, inverse, counts = np.unique(codes, axis=0, return_inverse=True,
+                                          return_counts=True)
+        distinct.append((members, inverse.reshape(-1)))
+        yield rows, counts
+
+
+def _chunk_buckets(buckets: Iterable, chunk_size: int):
+    """Group buckets into units of work of about ``chunk_size`` distinct CDR3s."""
+    chunk, size = [], 0
+    for bucket in buckets:
+        chunk.append(bucket)
+        size += len(bucket[0])
+        if size >= chunk_size:
+            yield chunk
+            chunk, size = [], 0
+    if chunk:
+        yield chunk
+
+
+def cluster_clonotypes(
+    cdr3s: Sequence[Optional[str]],
+    v_genes: Optional[Sequence] = None,
+    j_genes: Optional[Sequence] = None,
+    min_identity: float = 80.0,
+    method: Literal['single', 'greedy'] = 'single',
+    allele: bool = False,
+    n_jobs: int = 1,
+) -> np.ndarray:
+    """
+    Group sequences into clonotypes: same V gene, same J gene, same CDR3
+    length and CDR3 identity of at least ``min_identity`` percent.
+
+    Args:
+        cdr3s: CDR3 sequences, without gaps. None or '' gives label -1.
+        v_genes: Optional V gene calls, one per CDR3, as strings
+            (``'IGHV3-23*01'``) or ``(species, gene)`` pairs as assigned by
+            anarci. Without them, the V gene is not used.
+        j_genes: Optional J gene calls, likewise.
+        min_identity: Minimum percent identity (Hamming identity over the
+            CDR3 length) for two CDR3s to be linked.
+        method: 'single' for single linkage (clonotypes are the connected
+            groups of linked CDR3s) or 'greedy' for greedy centroids (the
+            most frequent CDR3 not yet assigned takes every unassigned CDR3
+            linked to it, as in CD-HIT), which keeps every member within
+            ``min_identity`` of its centroid.
+        allele: Compare genes with their allele (``*01``) rather than
+            ignoring it.
+        n_jobs: Number of worker processes; -1 uses all CPUs.
+
+    Returns:
+        numpy.ndarray: int64 clonotype label of each sequence, numbered
+        from 0 in order of first appearance, or -1 without a CDR3.
+    """
+    if method not in ('single', 'greedy'):
+        raise ValueError(f"method must be 'single' or 'greedy', not {method!r}")
+    if not 0 <= min_identity <= 100:
+        raise ValueError('min_identity must be between 0 and 100')
+    n = len(cdr3s)
+    for genes in (v_genes, j_genes):
+        if genes is not None and len(genes) != n:
+            raise ValueError('v_genes and j_genes must have one call per CDR3')
+    # Bucket key: (V gene, J gene, CDR3 length), as one integer per sequence.
+    v_ids = _gene_ids(v_genes, n, allele)
+    j_ids = _gene_ids(j_genes, n, allele)
+    lengths = np.fromiter((len(cdr3) if cdr3 else 0 for cdr3 in cdr3s), dtype=np.int64, count=n)
+    keys = ((v_ids * (j_ids.max(initial=0) + 1) + j_ids)
+            * (lengths.max(initial=0) + 1) + lengths)
+    present = np.flatnonzero(lengths > 0)
+    order = present[np.argsort(keys[present], kind='stable')]
+    buckets = np.split(order, np.flatnonzero(np.diff(keys[order])) + 1) if len(order) else []
+
+    distinct = []
+    labels = np.full(n, -1, dtype=np.int64)
+    offset = 0
+    worker = partial(_cluster_buckets, min_identity=min_identity, method=method)
+    encoded = _encode_buckets(cdr3s, buckets, lengths, distinct)
+    chunk_labels = imap_ordered(worker, _chunk_buckets(encoded, _CHUNK_SIZE), n_jobs=n_jobs)
+    bucket = 0
+    for chunk in chunk_labels:
+        for bucket_labels in chunk:
+            members, inverse = distinct[bucket]
+            distinct[bucket] = None
+            labels[members] = bucket_labels[inverse] + offset
+            offset += int(bucket_labels.max()) + 1
+            bucket += 1
+    # Renumber in order of first appearance.
+    found = labels >= 0
+    _, first, inverse = np.unique(labels[found], return_index=True, return_inverse=True)
+    rank = np.empty(len(first), dtype=np.int64)
+    rank[np.argsort(first, kind='stable')] = np.arange(len(first))
+    labels[found] = rank[inverse.reshape(-1)]
+    return labels
+
+
+def cluster_annotations(annotations: Sequence, min_identity: float = 80.0,
+                        method: Literal['single', 'greedy'] = 'single',
+                        allele: bool = False, n_jobs: int = 1) -> np.ndarray:
+    """
+    ``cluster_clonotypes`` of ``Annotation`` objects, e.g. from
+    ``annotate_batch``, using their CDR3 and germline assignment. Failed
+    (None) annotations get label -1. Annotate with ``germline=True`` to
+    bucket by V and J genes.
+    """
+    cdr3s, v_genes, j_genes = [], [], []
+    for annotation in annotations:
+        if annotation is None:
+            cdr3s.append(None)
+            v_genes.append(None)
+            j_genes.append(None)
+            continue
+        regions = annotation.regions
+        cdr3s.append(next(seq for key, seq in regions.items() if key.endswith('cdr3'))
+                     .replace('-', ''))
+        germline = annotation.germline or {}
+        v_genes.append((germline.get('v_gene') or (None,))[0])
+        j_genes.append((germline.get('j_gene') or (None,))[0])
+    return cluster_clonotypes(cdr3s, v_genes, j_genes, min_identity=min_identity,
+                              method=method, allele=allele, n_jobs=n_jobs)
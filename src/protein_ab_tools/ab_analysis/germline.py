@@ -0,0 +1,280 @@
+"""
+Batch germline assignment against anarci's germline reference.
+
+anarci assigns germlines one sequence and one germline at a time: each
+domain's 128 HMM match states are compared, as a string, with every V gene
+of the allowed species and then with every J gene of the species of the
+best V gene. ``GermlineDB`` holds the same reference encoded once as uint8
+matrices, so a whole batch of domains is compared with every gene in a
+few vectorised passes. Calls and identities are the same as anarci's,
+including how ties are broken.
+
+The reference is built once per process by ``germline_db()``. Build it
+before starting fork-based workers and they share it read-only.
+"""
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from .cache import NumberingCache
+from .prefilter import Prefilter
+
+N_STATES = 128
+_GAP = ord('-')
+
+_db = None
+
+
+class _GeneSet(NamedTuple):
+    """The germlines of one segment and chain type, in anarci's order."""
+    names: List[tuple]
+    species_rows: Dict[str, np.ndarray]
+    codes: np.ndarray
+    lengths: np.ndarray
+
+
+def _encode(rows: Sequence[str]) -> np.ndarray:
+    data = ''.join(rows).upper().encode('ascii')
+    return np.frombuffer(data, dtype=np.uint8).reshape(len(rows), N_STATES)
+
+
+def _best(states: np.ndarray, genes: _GeneSet, rows: np.ndarray):
+    """
+    Index into ``rows`` and identity of the closest gene for each state
+    sequence. Identity is the fraction of the gene's residues matched, as
+    in anarci's ``get_identity``, and ties go to the first row.
+    """
+    codes = genes.codes[rows]
+    matches = np.zeros((len(states), len(rows)), dtype=np.int32)
+    for state in np.flatnonzero((codes != _GAP).any(axis=0)):
+        column = codes[:, state]
+        matches += (states[:, state, None] == column) & (column != _GAP)
+    lengths = genes.lengths[rows]
+    identities = np.divide(matches, lengths, out=np.zeros(matches.shape),
+                           where=lengths > 0)
+    best = identities.argmax(axis=1)
+    return best, identities[np.arange(len(states)), best]
+
+
+class GermlineDB:
+    """
+    V and J germline sequences, pre-encoded for vectorised assignment.
+
+    Args:
+        germlines: Germlines shaped like anarci's ``all_germlines``:
+            ``{'V' | 'J': {chain_type: {species: {gene: sequence}}}}``, each
+            sequence aligned to the 128 HMM match states with '-' gaps.
+    """
+
+    def __init__(self, germlines: dict):
+        self.species = list(germlines['V'].get('H', {}))
+        self._sets = {}
+        for segment, chains in germlines.items():
+            for chain_type, by_species in chains.items():
+                names, species_rows, rows = [], {}, []
+                for species, genes in by_species.items():
+                    start = len(names)
+                    names.extend((species, gene) for gene in genes)
+                    rows.extend(genes.values())
+                    species_rows[species] = np.arange(start, len(names))
+                codes = _encode(rows)
+                codes.flags.writeable = False
+                lengths = (codes != _GAP).sum(axis=1)
+                self._sets[segment, chain_type] = _GeneSet(names, species_rows, codes, lengths)
+
+    @classmethod
+    def from_anarci(cls) -> 'GermlineDB':
+        """The reference shipped with anarci."""
+        from .numbering import _check_anarci
+        _check_anarci()
+        from anarci.germlines import all_germlines
+        return cls(all_germlines)
+
+    def __repr__(self):
+        n_genes = sum(len(genes.names) for genes in self._sets.values())
+        return f'GermlineDB({n_genes} genes)'
+
+    def assign(self, states: np.ndarray, chain_types: Sequence[str],
+               allowed_species: Optional[Sequence[str]] = None) -> List[dict]:
+        """
+        Assign V and J germlines to domains.
+
+        Args:
+            states: uint8 matrix (domains x 128) of the residues at the HMM
+                match states, '-' where a state is not matched (see
+                ``state_codes``).
+            chain_types: Chain type of each domain.
+            allowed_species: Species to choose V genes from. Default is
+                every species.
+
+        Returns:
+            list: One dict per domain, shaped like anarci's:
+            ``{'v_gene': [(species, gene), identity], 'j_gene': [...]}``,
+            with ``[None, None]`` when no gene could be assigned. It is empty
+            for chain types without germlines for all ``allowed_species``.
+        """
+        states = np.asarray(states, dtype=np.uint8)
+        chain_types = np.asarray(chain_types)
+        results = [None] * len(states)
+        for chain_type in np.unique(chain_types):
+            domains = np.flatnonzero(chain_types == chain_type)
+            v_genes = self._sets.get(('V', chain_type))
+            if v_genes is None:
+                for i in domains:
+                    results[i] = {'v_gene': [None, None], 'j_gene': [None, None]}
+                continue
+            if allowed_species is not None and not all(
+                    species in v_genes.species_rows for species in allowed_species):
+                for i in domains:
+                    results[i] = {}
+                continue
+            species_list = self.species if allowed_species is None else allowed_species
+            rows = np.concatenate(
+                [v_genes.species_rows[species] for species in species_list
+                 if species in v_genes.species_rows] or [np.zeros(0, dtype=np.int64)])
+            if not len(rows):
+                raise ValueError(f'No {chain_type} germlines for species {allowed_species}')
+            best, identities = _best(states[domains], v_genes, rows)
+            for i, row, identity in zip(domains, rows[best], identities):
+                results[i] = {'v_gene': [v_genes.names[row], float(identity)],
+                              'j_gene': [None, None]}
+            # The J gene is taken from the species of the V gene.
+            j_genes = self._sets.get(('J', chain_type))
+            if j_genes is None:
+                continue
+            v_species = np.array([results[i]['v_gene'][0][0] for i in domains])
+            for species in np.unique(v_species):
+                if species not in j_genes.species_rows:
+                    continue
+                same = domains[v_species == species]
+                rows = j_genes.species_rows[species]
+                best, identities = _best(states[same], j_genes, rows)
+                for i, row, identity in zip(same, rows[best], identities):
+                    results[i]['j_gene'] = [j_genes.names[row], float(identity)]
+        return results
+
+
+def germline_db() -> GermlineDB:
+    """The process-wide ``GermlineDB``, built from anarci's reference on first use."""
+    global _db
+    if _db is None:
+        _db = GermlineDB.from_anarci()
+    return _db
+
+
+def state_codes(state_vector: Iterable[tuple], seq: str) -> np.ndarray:
+    """
+    The residues of ``seq`` at the 128 match states of an anarci state
+    vector (``[((state, 'm' | 'i' | 'd'), index), ...]``), as uint8 codes.
+    """
+    codes = np.full(N_STATES, _GAP, dtype=np.uint8)
+    seq = seq.upper().encode('ascii')
+    for (state, kind), index in state_vector:
+        if kind == 'm' and index is not None and 1 <= state <= N_STATES:
+            codes[state - 1] = seq[index]
+    return codes
+
+
+def assign_alignment_germlines(sequences: Sequence[tuple], alignments: Sequence[tuple],
+                               details: Sequence[Optional[list]], allow: Iterable[str],
+                               allowed_species: Optional[Sequence[str]] = None):
+    """
+    Add ``'germlines'`` to the details of every numbered domain, as
+    ``anarci(..., assign_germline=True)`` does.
+
+    Args:
+        sequences: The (name, seq) pairs given to ``run_hmmer``.
+        alignments: Its alignments, ``(hits, state_vectors, details)`` per
+            sequence.
+        details: The details returned by ``number_sequences_from_alignment``
+            for them, which only has the domains that were numbered.
+        allow: Chain types that were numbered.
+        allowed_species: Species to choose V genes from.
+    """
+    allow = set(allow)
+    states, chain_types, targets = [], [], []
+    for (_, seq), (_, state_vectors, domain_details), numbered_details in zip(
+            sequences, alignments, details):
+        numbered = [(state_vector, domain) for state_vector, domain
+                    in zip(state_vectors, domain_details)
+                    if state_vector and domain['chain_type'] in allow]
+        for (state_vector, domain), target in zip(numbered, numbered_details or ()):
+            states.append(state_codes(state_vector, seq))
+            chain_types.append(domain['chain_type'])
+            targets.append(target)
+    if not targets:
+        return
+    germlines = germline_db().assign(np.stack(states), chain_types, allowed_species)
+    for target, assigned in zip(targets, germlines):
+        target['germlines'] = assigned
+
+
+class GermlineCall(NamedTuple):
+    """
+    The V and J germline assignment of one sequence. Identities are
+    fractions (0 to 1) of the germline's residues matched. Sequences that
+    could not be numbered have ``error`` set and no calls.
+    """
+    name: str
+    species: Optional[str] = None
+    v_gene: Optional[str] = None
+    v_identity: Optional[float] = None
+    j_gene: Optional[str] = None
+    j_identity: Optional[float] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @classmethod
+    def from_details(cls, name: str, details: dict) -> 'GermlineCall':
+        """The call in the details of an anarci domain numbered with germlines."""
+        germlines = details.get('germlines') or {}
+        v_call, v_identity = germlines.get('v_gene') or (None, None)
+        j_call, j_identity = germlines.get('j_gene') or (None, None)
+        return cls(name, species=v_call[0] if v_call else None,
+                   v_gene=v_call[1] if v_call else None, v_identity=v_identity,
+                   j_gene=j_call[1] if j_call else None, j_identity=j_identity)
+
+
+def assign_germlines_batch(
+    seqs: Iterable[str],
+    names: Optional[Iterable[str]] = None,
+    chain: str = 'H',
+    species: Optional[List[str]] = None,
+    chunk_size: int = 1000,
+    n_jobs: int = 1,
+    max_pending: Optional[int] = None,
+    cache: Optional[NumberingCache] = None,
+    prefilter: Optional[Prefilter] = None,
+) -> List[GermlineCall]:
+    """
+    Assign V and J germline genes to many sequences.
+
+    The sequences are numbered with ``run_numbering_batch`` (IMGT,
+    ``germline=True``), whose chunks are assigned in one vectorised pass
+    each against the process-wide ``germline_db()``.
+
+    Args:
+        seqs: Sequences to assign.
+        names: Optional names, one per sequence.
+        chain: 'H' for heavy or 'L' for light (kappa or lambda) chains.
+        species: Species to choose genes from. Default is human and mouse.
+        chunk_size: Maximum number of sequences per anarci call.
+        n_jobs: Number of worker processes; -1 uses all CPUs.
+        max_pending: Maximum number of chunks in flight on the pool.
+        cache: Optional ``NumberingCache`` of the numbering results.
+        prefilter: Optional ``Prefilter`` run before numbering.
+
+    Returns:
+        list: One ``GermlineCall`` per sequence, in input order. For
+        sequences with several domains, the call is that of the first.
+    """
+    from .numbering import run_numbering_batch
+    records = run_numbering_batch(seqs, names=names, scheme='imgt', chain=chain,
+                                  germline=True, species=species, chunk_size=chunk_size,
+                                  n_jobs=n_jobs, max_pending=max_pending, cache=cache,
+                                  prefilter=prefilter)
+    return [GermlineCall.from_details(record.name, record.result[1][0][0]) if record.ok
+            else GermlineCall(record.name, error=record.error) for record in records]
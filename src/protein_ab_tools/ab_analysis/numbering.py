@@ -1,140 +1,808 @@
-from typing import Literal, Optional, List
-
-# Try to import anarci, but make it optional for testing
-try:
-    from anarci import anarci
-    ANARCI_AVAILABLE = True
-except ImportError:
-    ANARCI_AVAILABLE = False
+import copy
+import importlib
+import importlib.util
+import math
+from collections import Counter
+from dataclasses import dataclass
+from functools import partial
+from typing import Dict, Iterable, Literal, Optional, List, Sequence, Union
+
+from .. import instrumentation
+from ..parallel import chunked, imap_ordered, resolve_n_jobs
+from .backends import align, get_backend
+from .cache import NumberingCache
+from .chain import NumberedChain
+from .germline import assign_alignment_germlines, germline_db
+from .prefilter import PREFILTER_ERROR, Prefilter
+from .regions import (region_chain, region_table, regions_from_numbering,
+                      regions_from_numbering_batch)
+
+# anarci (and the Biopython modules it pulls in) is optional for testing and
+# slow to import, so it is only looked up here and imported on first use.
+ANARCI_AVAILABLE = importlib.util.find_spec('anarci') is not None
+_ANARCI_NAMES = ('anarci', 'check_for_j', 'number_sequences_from_alignment', 'run_hmmer',
+                 'scheme_short_to_long')
+if not ANARCI_AVAILABLE:
     anarci = None
 
 
 def _check_anarci():
-    """Check if anarci is available and raise helpful error if not."""
+    """Check if anarci is available and raise helpful error if not, then import it."""
     if not ANARCI_AVAILABLE:
         raise ImportError(
             "anarci is required but not installed. "
             "Please install it via conda: conda install -c bioconda anarci"
         )
+    if not all(name in globals() for name in _ANARCI_NAMES):
+        module = importlib.import_module('anarci')
+        for name in _ANARCI_NAMES:
+            # Keep names that were replaced, e.g. by tests.
+            globals().setdefault(name, getattr(module, name))
+
+
+def __getattr__(name):
+    if name in _ANARCI_NAMES:
+        _check_anarci()
+        return globals()[name]
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def _normalize_seq(seq: str) -> str:
+    """Strip whitespace and alignment gaps before numbering."""
+    return seq.strip().replace('-', '')
+
+
+def _server_client():
+    """The numbering server calls are routed to, or None (see ``client.connect``)."""
+    from ..client import active_client
+    return active_client()
+
+
+def _release_server(client):
+    from ..client import release
+    release(client)
+
+
+def _anarci_options(scheme: str, chain: str):
+    """Translate our scheme/chain arguments into anarci's ``scheme`` and ``allow``."""
+    if chain == 'H':
+        allow = ['H']
+    elif chain == 'L':
+        allow = ['K', 'L']
+    elif chain == 'auto':
+        allow = ['H', 'K', 'L']
+    else:
+        allow = chain
+    return _anarci_scheme(scheme), allow
+
+
+def _anarci_scheme(scheme: str) -> str:
+    # AbM uses Martin numbering under the hood (anarci calls it 'martin')
+    return 'martin' if scheme.lower() == 'abm' else scheme.lower()
+
+
+def _is_hmmscan(backend) -> bool:
+    return backend is None or backend == 'hmmscan'
+
+
+def _align(sequences, species: List[str], backend=None, ncpu: Optional[int] = None) -> list:
+    """anarci's ``run_hmmer`` and ``check_for_j``, searching with ``backend``."""
+    if not _is_hmmscan(backend):
+        return align(get_backend(backend), sequences, hmmer_species=species)
+    alignments = run_hmmer(sequences, ncpu=ncpu, hmmer_species=species)
+    check_for_j(sequences, alignments, None)
+    return alignments
+
+
+def _number_schemes(sequences, schemes: List[str], allow, germline: bool,
+                    species: List[str], ncpu: Optional[int] = None,
+                    backend=None) -> Dict[str, tuple]:
+    """
+    Number (name, seq) pairs in several schemes from a single HMMER search.
+
+    anarci first aligns the sequences to its HMMs and only then maps the
+    alignment onto a scheme, so the search (and the germline assignment,
+    which does not depend on the scheme) is shared by all schemes.
+
+    Returns:
+        dict: ``{scheme: (numbered, details, hits)}``, each value shaped like
+        the return value of ``anarci``.
+    """
+    _check_anarci()
+    long_names = {}
+    for scheme in schemes:
+        try:
+            long_names[scheme] = scheme_short_to_long[_anarci_scheme(scheme)]
+        except KeyError:
+            raise AssertionError(f'Unrecognised or unimplemented scheme: {scheme}')
+    with instrumentation.timer('anarci'):
+        alignments = _align(sequences, species, backend, ncpu)
+    results = {}
+    first_details = None
+    for scheme in schemes:
+        # Numbering writes into the alignment details, so each scheme gets a copy.
+        with instrumentation.timer('anarci'):
+            numbered, details, hits = number_sequences_from_alignment(
+                sequences, copy.deepcopy(alignments), scheme=long_names[scheme], allow=allow,
+                assign_germline=False, allowed_species=species)
+        if germline and first_details is None:
+            with instrumentation.timer('germline'):
+                assign_alignment_germlines(sequences, alignments, details, allow, species)
+        elif germline:
+            for domains, first_domains in zip(details, first_details):
+                for domain, first_domain in zip(domains or (), first_domains or ()):
+                    domain['germlines'] = copy.deepcopy(first_domain['germlines'])
+        first_details = first_details or details
+        results[scheme] = (numbered, details, hits)
+    return results
 
 
 def run_numbering(
     seq: str,
     name: Optional[str] = None,
-    scheme: str = 'imgt',
-    chain: Literal['H', 'L'] = 'H',
+    scheme: Union[str, Sequence[str]] = 'imgt',
+    chain: Literal['H', 'L', 'auto'] = 'H',
     germline: bool = False,
     species: Optional[List[str]] = None,
+    ncpu: Optional[int] = None,
+    cache: Optional[NumberingCache] = None,
+    as_chain: bool = False,
+    prefilter: Optional[Prefilter] = None,
+    backend: Optional[str] = None,
 ):
     """
     Numbering an antibody sequence.
+
+    ``ncpu`` is passed to anarci as the number of threads hmmscan may use.
+    With a ``cache``, previously numbered sequences are served from it and
+    new results are stored in it. With ``as_chain`` a compact
+    ``NumberedChain`` of the first domain is returned instead of anarci's
+    nested result.
+
+    ``scheme`` may also be a list of schemes, in which case a dict mapping
+    each scheme to its result is returned. HMMER then runs only once, so
+    numbering in several schemes costs about the same as in one.
+
+    With a ``prefilter``, sequences it rejects raise ``ValueError`` without
+    running anarci.
+
+    ``backend`` selects how the HMMs are searched: ``'hmmscan'`` (the
+    default, anarci's subprocess), ``'pyhmmer'`` (in-process, keeping the
+    HMMs loaded) or a backend object (see ``backends``). The numbering is
+    the same with every backend.
+
+    Without a ``cache``, single-scheme calls go to the numbering server if
+    one is connected (see ``protein_ab_tools.client``); it uses its own
+    cache, workers and backend, and ``ncpu`` is ignored.
     """
-    _check_anarci()
-    seq = seq.strip().replace('-', '')
+    if prefilter is not None:
+        reason = prefilter.check(_normalize_seq(seq))
+        if reason is not None:
+            instrumentation.count('prefilter_rejections')
+            raise ValueError(f"Invalid sequence: {_normalize_seq(seq)} "
+                             f"({PREFILTER_ERROR}: {reason})")
+    if not isinstance(scheme, str):
+        _check_anarci()
+        return _run_numbering_schemes(seq, name, list(scheme), chain, germline, species, ncpu,
+                                      cache, as_chain, backend)
+    seq = _normalize_seq(seq)
     if name is None:
         name = f'{chain}-{scheme}'
+    client = _server_client() if cache is None else None
+    if client is not None:
+        try:
+            with instrumentation.timer('server'):
+                result = client.number(seq, name=name, scheme=scheme, chain=chain,
+                                       germline=germline, species=species)
+        except OSError:
+            # The server is gone, or dropped or garbled its response.
+            _release_server(client)
+        except ValueError:
+            instrumentation.count('numbering_failures')
+            raise
+        else:
+            instrumentation.count('sequences_numbered')
+            return NumberedChain.from_result(result, scheme, chain) if as_chain else result
+    _check_anarci()
     prep_seq = (name, seq)
-    if chain == 'H':
-        chain = ['H']
-    elif chain == 'L':
-        chain = ['K', 'L']
-    # AbM uses Martin numbering under the hood (anarci calls it 'martin')
-    scheme = 'martin' if scheme.lower() == 'abm' else scheme.lower()
-    result = anarci(
-        [prep_seq],
-        scheme=scheme,
-        allow=chain,
-        assign_germline=germline,
-        allowed_species=species if species is not None else ['human', 'mouse'])
+    anarci_scheme, allow = _anarci_options(scheme, chain)
+    species = species if species is not None else ['human', 'mouse']
+    if cache is not None:
+        key = cache.key(seq, anarci_scheme, chain, germline, species)
+        cached = cache.get_named([key], [name])
+        if cached:
+            return NumberedChain.from_result(cached[0], scheme, chain) if as_chain else cached[0]
+    if _is_hmmscan(backend):
+        with instrumentation.timer('anarci'):
+            result = anarci(
+                [prep_seq],
+                scheme=anarci_scheme,
+                allow=allow,
+                assign_germline=germline,
+                allowed_species=species,
+                ncpu=ncpu)
+    else:
+        result = _anarci_numbering([prep_seq], anarci_scheme, allow, germline, species, backend)
     if result[0][0] is None:
+        instrumentation.count('numbering_failures')
         raise ValueError(f"Invalid sequence: {seq}")
-    return result
+    instrumentation.count('sequences_numbered')
+    if cache is not None:
+        cache.put(key, result)
+    return NumberedChain.from_result(result, scheme, chain) if as_chain else result
+
+
+def _run_numbering_schemes(seq, name, schemes, chain, germline, species, ncpu, cache,
+                           as_chain, backend=None) -> Dict[str, object]:
+    """``run_numbering`` for a list of schemes, sharing one HMMER search."""
+    seq = _normalize_seq(seq)
+    _, allow = _anarci_options(schemes[0] if schemes else 'imgt', chain)
+    species = species if species is not None else ['human', 'mouse']
+    names = {scheme: name if name is not None else f'{chain}-{scheme}' for scheme in schemes}
+    results = {}
+    keys = {}
+    if cache is not None:
+        for scheme in schemes:
+            keys[scheme] = cache.key(seq, _anarci_scheme(scheme), chain, germline, species)
+            cached = cache.get_named([keys[scheme]], [names[scheme]])
+            if cached:
+                results[scheme] = cached[0]
+    missing = [scheme for scheme in schemes if scheme not in results]
+    if missing:
+        numbered = _number_schemes([(names[missing[0]], seq)], missing, allow, germline,
+                                   species, ncpu, backend)
+        if numbered[missing[0]][0][0] is not None:
+            instrumentation.count('sequences_numbered')
+        for scheme in missing:
+            result = numbered[scheme]
+            if result[0][0] is None:
+                instrumentation.count('numbering_failures')
+                raise ValueError(f"Invalid sequence: {seq}")
+            for domain in result[1][0]:
+                domain['query_name'] = names[scheme]
+            if cache is not None:
+                cache.put(keys[scheme], result)
+            results[scheme] = result
+    if as_chain:
+        return {scheme: NumberedChain.from_result(results[scheme], scheme, chain)
+                for scheme in schemes}
+    return {scheme: results[scheme] for scheme in schemes}
+
+
+@dataclass
+class NumberingRecord:
+    """
+    Numbering outcome for one sequence of a batch.
+
+    ``result`` has the same shape as the return value of ``run_numbering``
+    (so ``record.result[0][0][0][0]`` is the numbered domain), or is a
+    ``NumberedChain`` when numbered with ``as_chain``; it is None when
+    numbering failed, in which case ``error`` holds the reason.
+    """
+    name: str
+    seq: str
+    result: Optional[tuple] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def renamed(self, name: str) -> 'NumberingRecord':
+        """A copy of this record for an identical sequence called ``name``."""
+        result = self.result
+        if isinstance(result, NumberedChain):
+            result = result.renamed(name)
+        elif result is not None:
+            details = [[dict(d, query_name=name) for d in domains] if domains else domains
+                       for domains in result[1]]
+            result = (result[0], details, result[2])
+        return NumberingRecord(name, self.seq, result=result, error=self.error)
+
+
+class NumberingBatch(list):
+    """
+    The records of ``run_numbering_batch``, in input order, together with
+    deduplication statistics.
+    """
+
+    def __init__(self, records: Iterable[NumberingRecord] = (), n_unique: Optional[int] = None):
+        super().__init__(records)
+        self.n_unique = len(self) if n_unique is None else n_unique
+
+    @property
+    def failures(self) -> List[NumberingRecord]:
+        return [record for record in self if not record.ok]
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        """Input, unique, duplicate and failure counts of the batch."""
+        n_input = len(self)
+        return {
+            'n_input': n_input,
+            'n_unique': self.n_unique,
+            'n_duplicates': n_input - self.n_unique,
+            'duplicate_fraction': (n_input - self.n_unique) / n_input if n_input else 0.0,
+            'n_failed': len(self.failures),
+        }
+
+    @property
+    def rejections(self) -> Dict[str, int]:
+        """Number of sequences rejected by a ``Prefilter``, by reason."""
+        prefix = f'{PREFILTER_ERROR}: '
+        return dict(Counter(record.error[len(prefix):] for record in self
+                            if record.error and record.error.startswith(prefix)))
+
+
+def _as_chains(records: List[NumberingRecord], scheme: str, chain: str) -> List[NumberingRecord]:
+    """Replace the anarci results of successful records by ``NumberedChain`` objects."""
+    for record in records:
+        if record.ok and not isinstance(record.result, NumberedChain):
+            record.result = NumberedChain.from_result(record.result, scheme, chain)
+    return records
+
+
+def _anarci_numbering(sequences, scheme: str, allow, germline: bool, species: List[str],
+                      backend=None) -> tuple:
+    """
+    ``anarci(..., assign_germline=germline)``, with the HMMs searched by
+    ``backend`` and the germlines of all the sequences assigned in one
+    vectorised pass by ``germline_db()`` rather than by anarci, one
+    sequence at a time.
+    """
+    try:
+        long_name = scheme_short_to_long[scheme]
+    except KeyError:
+        raise AssertionError(f'Unrecognised or unimplemented scheme: {scheme}')
+    with instrumentation.timer('anarci'):
+        alignments = _align(sequences, species, backend)
+        # As in anarci, numbering only adds to the details of the alignments.
+        numbered, details, hits = number_sequences_from_alignment(
+            sequences, alignments, scheme=long_name, allow=allow,
+            assign_germline=False, allowed_species=species)
+    if germline:
+        with instrumentation.timer('germline'):
+            assign_alignment_germlines(sequences, alignments, details, allow, species)
+    return numbered, details, hits
+
+
+def _number_chunk(chunk, scheme, allow, germline, species,
+                  chain_args=None, backend=None) -> List[NumberingRecord]:
+    """
+    Number a chunk of (name, seq) pairs with a single anarci call.
+    With ``chain_args`` (scheme, chain) the results are converted to
+    ``NumberedChain`` objects, so workers send back compact results.
+    """
+    _check_anarci()
+    try:
+        if germline or not _is_hmmscan(backend):
+            numbered, details, hits = _anarci_numbering(chunk, scheme, allow, germline, species,
+                                                        backend)
+        else:
+            with instrumentation.timer('anarci'):
+                numbered, details, hits = anarci(
+                    chunk,
+                    scheme=scheme,
+                    allow=allow,
+                    allowed_species=species)
+    except Exception as e:
+        if len(chunk) == 1:
+            name, seq = chunk[0]
+            return [NumberingRecord(name, seq, error=f'{type(e).__name__}: {e}')]
+        # One bad sequence fails the whole anarci call, so retry one by one
+        # to pin the failure on the sequences that caused it.
+        return [record for item in chunk
+                for record in _number_chunk([item], scheme, allow, germline, species,
+                                            chain_args, backend)]
+    records = []
+    for i, (name, seq) in enumerate(chunk):
+        if numbered[i] is None:
+            records.append(NumberingRecord(name, seq, error=f'Invalid sequence: {seq}'))
+        else:
+            records.append(NumberingRecord(
+                name, seq, result=([numbered[i]], [details[i]], [hits[i]])))
+    if chain_args is not None:
+        _as_chains(records, *chain_args)
+    return records
+
+
+def _number_items(items, anarci_scheme, allow, germline, species, chunk_size, n_jobs,
+                  max_pending, chain_args, backend=None) -> List[NumberingRecord]:
+    """Number (name, seq) pairs locally, ``chunk_size`` per anarci call."""
+    n_jobs = resolve_n_jobs(n_jobs)
+    if n_jobs > 1 and items:
+        chunk_size = min(chunk_size, math.ceil(len(items) / n_jobs))
+        # Built before the pool starts, so fork-started workers share them.
+        if germline:
+            germline_db()
+        if isinstance(backend, str):
+            get_backend(backend)
+    worker = partial(_number_chunk, scheme=anarci_scheme, allow=allow,
+                     germline=germline, species=species, chain_args=chain_args,
+                     backend=backend)
+    numbered = []
+    for chunk_records in imap_ordered(worker, chunked(items, chunk_size),
+                                      n_jobs=n_jobs, max_pending=max_pending):
+        numbered.extend(chunk_records)
+    return numbered
+
+
+def run_numbering_batch(
+    seqs: Iterable[str],
+    names: Optional[Iterable[str]] = None,
+    scheme: str = 'imgt',
+    chain: Literal['H', 'L', 'auto'] = 'H',
+    germline: bool = False,
+    species: Optional[List[str]] = None,
+    chunk_size: int = 1000,
+    n_jobs: int = 1,
+    max_pending: Optional[int] = None,
+    cache: Optional[NumberingCache] = None,
+    deduplicate: bool = True,
+    as_chain: bool = False,
+    prefilter: Optional[Prefilter] = None,
+    backend: Optional[str] = None,
+) -> NumberingBatch:
+    """
+    Number many antibody sequences, sending ``chunk_size`` sequences to each
+    anarci call so the HMMER start-up cost is shared by the whole chunk.
+    With ``n_jobs`` > 1 the chunks are numbered on a process pool.
+
+    Args:
+        seqs: Sequences to number.
+        names: Optional names, one per sequence. Defaults to ``{chain}-{scheme}-{i}``.
+        scheme: Numbering scheme (imgt, kabat, chothia, abm/martin, aho).
+        chain: 'H' for heavy or 'L' for light (kappa or lambda) chains.
+        germline: Whether anarci should also assign germlines.
+        species: Species allowed by anarci. Default is human and mouse.
+        chunk_size: Maximum number of sequences per anarci call. When
+            running in parallel, smaller chunks are used if needed so that
+            every worker gets work.
+        n_jobs: Number of worker processes; -1 uses all CPUs.
+        max_pending: Maximum number of chunks in flight on the pool.
+            Defaults to twice the number of workers.
+        cache: Optional ``NumberingCache``. Only sequences missing from the
+            cache are numbered, and their results are added to it.
+        deduplicate: Number each distinct normalised sequence only once and
+            copy its result to the duplicates.
+        as_chain: Return each result as a compact ``NumberedChain``. The
+            conversion happens in the workers, so less data is sent back
+            from the pool.
+        prefilter: Optional ``Prefilter``. Sequences it rejects are not
+            numbered; their records get an error starting with
+            ``PREFILTER_ERROR`` (see ``NumberingBatch.rejections``).
+        backend: How the HMMs are searched: ``'hmmscan'`` (default),
+            ``'pyhmmer'`` or a registered backend name (see ``backends``).
+            Workers create their own backend from its name.
+
+    Returns:
+        NumberingBatch: A list with one NumberingRecord per input sequence,
+        in input order. Sequences that could not be numbered have ``error``
+        set instead of raising for the whole batch. ``stats`` reports how
+        many inputs were duplicates.
+
+    Without a ``cache``, the sequences left after deduplication and
+    prefiltering are numbered by the connected numbering server, if any,
+    ``chunk_size`` sequences per request.
+    """
+    client = _server_client() if cache is None else None
+    if client is None:
+        _check_anarci()
+    if chunk_size < 1:
+        raise ValueError('chunk_size must be at least 1')
+    seqs = [_normalize_seq(seq) for seq in seqs]
+    if names is None:
+        names = [f'{chain}-{scheme}-{i}' for i in range(len(seqs))]
+    else:
+        names = list(names)
+        if len(names) != len(seqs):
+            raise ValueError('names and seqs must have the same length')
+    anarci_scheme, allow = _anarci_options(scheme, chain)
+    species = species if species is not None else ['human', 'mouse']
+    # Index of the first occurrence of each distinct sequence.
+    if deduplicate:
+        first = {}
+        unique = [first.setdefault(seq, i) for i, seq in enumerate(seqs)]
+        todo = list(first.values())
+    else:
+        unique = todo = list(range(len(seqs)))
+    records = [None] * len(seqs)
+    if prefilter is not None:
+        for i in todo:
+            reason = prefilter.check(seqs[i])
+            if reason is not None:
+                records[i] = NumberingRecord(names[i], seqs[i],
+                                             error=f'{PREFILTER_ERROR}: {reason}')
+        n_checked = len(todo)
+        todo = [i for i in todo if records[i] is None]
+        instrumentation.count('prefilter_rejections', n_checked - len(todo))
+    if cache is not None:
+        keys = {i: cache.key(seqs[i], anarci_scheme, chain, germline, species) for i in todo}
+        found = cache.get_named(list(keys.values()), [names[i] for i in keys])
+        for j, i in enumerate(keys):
+            if j in found:
+                records[i] = NumberingRecord(names[i], seqs[i], result=found[j])
+        todo = [i for i in todo if records[i] is None]
+    items = [(names[i], seqs[i]) for i in todo]
+    numbered = None
+    if client is not None and items:
+        try:
+            with instrumentation.timer('server'):
+                numbered = [record for chunk in chunked(items, chunk_size)
+                            for record in client.number_records(chunk, scheme=scheme,
+                                                                chain=chain, germline=germline,
+                                                                species=species)]
+        except OSError:
+            # The server is gone, or dropped or garbled its response.
+            _release_server(client)
+            _check_anarci()
+    if numbered is None:
+        # The cache stores anarci's results, so only convert in the workers
+        # when nothing has to be cached.
+        with instrumentation.timer('numbering_batch'):
+            numbered = _number_items(items, anarci_scheme, allow, germline, species,
+                                     chunk_size, n_jobs, max_pending,
+                                     (scheme, chain) if as_chain and cache is None else None,
+                                     backend)
+    n_failed = sum(not record.ok for record in numbered)
+    instrumentation.count('sequences_numbered', len(numbered) - n_failed)
+    instrumentation.count('numbering_failures', n_failed)
+    for i, record in zip(todo, numbered):
+        records[i] = record
+    if cache is not None:
+        cache.put_many((keys[i], record.result) for i, record in zip(todo, numbered)
+                       if record.ok)
+    if as_chain:
+        _as_chains([records[j] for j in set(unique)], scheme, chain)
+    for i, j in enumerate(unique):
+        if i != j:
+            records[i] = records[j].renamed(names[i])
+    return NumberingBatch(records, n_unique=len(set(unique)))
+
+
+class Annotation:
+    """
+    One numbered antibody domain. Regions, the gapped numbered sequence,
+    species and germline are all derived from the same numbering run.
+    With ``chain='auto'`` the chain is taken from the detected chain type.
+    """
+    __slots__ = ('seq', 'scheme', 'chain', 'result')
+
+    def __init__(self, seq: str, scheme: str, chain: str, result: tuple):
+        self.seq = seq
+        self.scheme = scheme
+        self.chain = region_chain(result[1][0][0]['chain_type']) if chain == 'auto' else chain
+        self.result = result
+
+    def __repr__(self):
+        return f'Annotation(scheme={self.scheme!r}, chain={self.chain!r}, seq={self.seq!r})'
+
+    @property
+    def numbering(self):
+        """The anarci numbering, a list of ``((number, insertion), aa)``."""
+        return self.result[0][0][0][0]
+
+    @property
+    def details(self) -> dict:
+        """The anarci alignment details of the domain."""
+        return self.result[1][0][0]
+
+    @property
+    def regions(self) -> Dict[str, str]:
+        """Framework and CDR sequences, as returned by ``extract_regions``."""
+        return regions_from_numbering(self.numbering, self.scheme, self.chain)
+
+    @property
+    def numbered_seq(self) -> str:
+        """The gapped numbered sequence, as returned by ``get_numbered_seq``."""
+        return ''.join([aa for _, aa in self.numbering])
+
+    @property
+    def name(self) -> str:
+        return self.details['query_name']
+
+    @property
+    def chain_type(self) -> str:
+        """The anarci chain type: 'H', 'K' (kappa) or 'L' (lambda)."""
+        return self.details['chain_type']
+
+    @property
+    def species(self) -> str:
+        """The species of the best HMM hit, as returned by ``extract_species``."""
+        return self.details['species']
+
+    @property
+    def germline(self) -> Optional[dict]:
+        """
+        The anarci germline assignment, ``{'v_gene': [(species, gene), identity],
+        'j_gene': [...]}``, or None if the numbering ran without ``germline``.
+        """
+        return self.details.get('germlines')
+
+
+def annotate(seq: str,
+             scheme: str = 'imgt',
+             chain: Literal['H', 'L', 'auto'] = 'H',
+             germline: bool = True,
+             species: Optional[List[str]] = None,
+             cache: Optional[NumberingCache] = None) -> Annotation:
+    """
+    Number an antibody sequence once and return an ``Annotation`` giving
+    its regions, numbered sequence, species and germline.
+    """
+    region_table(scheme, chain)
+    result = run_numbering(seq, scheme=scheme, chain=chain, germline=germline,
+                           species=species, cache=cache)
+    return Annotation(_normalize_seq(seq), scheme, chain, result)
+
+
+def annotate_batch(seqs: Iterable[str],
+                   names: Optional[Iterable[str]] = None,
+                   scheme: str = 'imgt',
+                   chain: Literal['H', 'L', 'auto'] = 'H',
+                   germline: bool = True,
+                   species: Optional[List[str]] = None,
+                   chunk_size: int = 1000,
+                   n_jobs: int = 1,
+                   cache: Optional[NumberingCache] = None,
+                   prefilter: Optional[Prefilter] = None) -> List[Optional[Annotation]]:
+    """
+    Batch version of ``annotate``. Failed sequences give None; use
+    ``run_numbering_batch`` directly to see why a sequence failed.
+    """
+    region_table(scheme, chain)
+    records = run_numbering_batch(seqs, names=names, scheme=scheme, chain=chain,
+                                  germline=germline, species=species,
+                                  chunk_size=chunk_size, n_jobs=n_jobs, cache=cache,
+                                  prefilter=prefilter)
+    return [Annotation(r.seq, scheme, chain, r.result) if r.ok else None for r in records]
 
 
 def extract_species(seq: str,
                     scheme: str = 'imgt',
-                    chain: Literal['H', 'L'] = 'H'):
+                    chain: Literal['H', 'L', 'auto'] = 'H'):
     result = run_numbering(seq, scheme=scheme, chain=chain)
     return result[1][0][0]['species']
 
 
+def extract_species_batch(seqs: Iterable[str],
+                          scheme: str = 'imgt',
+                          chain: Literal['H', 'L', 'auto'] = 'H',
+                          chunk_size: int = 1000,
+                          n_jobs: int = 1,
+                          cache: Optional[NumberingCache] = None) -> List[Optional[str]]:
+    """
+    Batch version of ``extract_species``. Failed sequences give None.
+    """
+    records = run_numbering_batch(seqs, scheme=scheme, chain=chain, chunk_size=chunk_size,
+                                  n_jobs=n_jobs, cache=cache)
+    return [r.result[1][0][0]['species'] if r.ok else None for r in records]
+
+
 def get_numbered_seq(seq: str,
                      scheme: str = 'imgt',
-                     chain: Literal['H', 'L'] = 'H'):
+                     chain: Literal['H', 'L', 'auto'] = 'H'):
     result = run_numbering(seq, scheme=scheme, chain=chain)
     return ''.join([aa for _, aa in result[0][0][0][0]])
 
 
+def get_numbered_seq_batch(seqs: Iterable[str],
+                           scheme: str = 'imgt',
+                           chain: Literal['H', 'L', 'auto'] = 'H',
+                           chunk_size: int = 1000,
+                           n_jobs: int = 1,
+                           cache: Optional[NumberingCache] = None) -> List[Optional[str]]:
+    """
+    Batch version of ``get_numbered_seq``. Failed sequences give None.
+    """
+    records = run_numbering_batch(seqs, scheme=scheme, chain=chain, chunk_size=chunk_size,
+                                  n_jobs=n_jobs, cache=cache)
+    return [''.join([aa for _, aa in r.result[0][0][0][0]]) if r.ok else None for r in records]
+
+
 def extract_regions(seq: str,
-                    scheme: str = 'imgt',
-                    chain: Literal['H', 'L'] = 'H'):
+                    scheme: Union[str, Sequence[str]] = 'imgt',
+                    chain: Literal['H', 'L', 'auto'] = 'H'):
     """
     Extract regions from an antibody sequence.
+
+    With a list of schemes a dict mapping each scheme to its regions is
+    returned, from a single HMMER search.
     """
-    result = run_numbering(seq, scheme=scheme, chain=chain)
-    if scheme.lower() == 'imgt':
-        breakpoint = {
-            'fwr1': [1, 26],
-            'cdr1': [27, 38],
-            'fwr2': [39, 55],
-            'cdr2': [56, 65],
-            'fwr3': [66, 104],
-            'cdr3': [105, 117],
-            'fwr4': [118, 128]
-        }
-    elif scheme.lower() == 'aho':
-        # https://plueckthun.bioc.uzh.ch/antibody/Numbering/NumFrame.html
-        breakpoint = {
-            'fwr1': [1, 26],
-            'cdr1': [27, 40],
-            'fwr2': [41, 57],
-            'cdr2': [58, 68],
-            'fwr3': [69, 106],
-            'cdr3': [107, 138],
-            'fwr4': [139, 149] if chain == 'H' else [139, 148]
-        }
-    elif scheme.lower() == 'chothia':
-        # AbM uses Martin numbering with Chothia CDR index ranges
-        breakpoint = {
-            'fwr1': [1, 25] if chain == 'H' else [1, 23],
-            'cdr1': [26, 32] if chain == 'H' else [24, 34],
-            'fwr2': [33, 51] if chain == 'H' else [35, 49],
-            'cdr2': [52, 56] if chain == 'H' else [50, 56],
-            'fwr3': [57, 94] if chain == 'H' else [57, 88],
-            'cdr3': [95, 102] if chain == 'H' else [89, 97],
-            'fwr4': [103, 113] if chain == 'H' else [98, 109]
-        }
-    elif scheme.lower() == 'kabat':
-        breakpoint = {
-            'fwr1': [1, 30] if chain == 'H' else [1, 23],
-            'cdr1': [31, 35] if chain == 'H' else [24, 34],
-            'fwr2': [36, 49] if chain == 'H' else [35, 49],
-            'cdr2': [50, 65] if chain == 'H' else [50, 56],
-            'fwr3': [66, 94] if chain == 'H' else [57, 88],
-            'cdr3': [95, 102] if chain == 'H' else [89, 97],
-            'fwr4': [103, 113] if chain == 'H' else [98, 109]
-        }
-    elif scheme.lower() in ('abm', "martin"):
-        breakpoint = {
-            'fwr1': [1, 25] if chain == 'H' else [1, 23],
-            'cdr1': [26, 35] if chain == 'H' else [24, 34],
-            'fwr2': [36, 49] if chain == 'H' else [35, 49],
-            'cdr2': [50, 58] if chain == 'H' else [50, 56],
-            'fwr3': [59, 94] if chain == 'H' else [57, 88],
-            'cdr3': [95, 102] if chain == 'H' else [89, 97],
-            'fwr4': [103, 113] if chain == 'H' else [98, 110]
-        }
-    else:
-        raise ValueError('Invalid numbering scheme')
-    chain = 'vh' if chain == 'H' else 'vl'
-    numbered_seq = result[0][0][0][0]
-    regions = {f'{chain}_{k}': '' for k in breakpoint.keys()}
-    for (number, _), aa in numbered_seq:
-        region = next(
-            (k for k, v in breakpoint.items() if v[0] <= number <= v[1]), None)
-        if region is not None:
-            regions[f'{chain}_{region}'] += aa
-    return regions
+    if not isinstance(scheme, str):
+        schemes = list(scheme)
+        for name in schemes:
+            region_table(name, chain)
+        results = run_numbering(seq, scheme=schemes, chain=chain)
+        return {name: regions_from_numbering(result[0][0][0][0], name, chain)
+                for name, result in results.items()}
+    return annotate(seq, scheme=scheme, chain=chain, germline=False).regions
+
+
+def extract_regions_batch(seqs: Iterable[str],
+                          scheme: str = 'imgt',
+                          chain: Literal['H', 'L', 'auto'] = 'H',
+                          chunk_size: int = 1000,
+                          n_jobs: int = 1,
+                          cache: Optional[NumberingCache] = None) -> List[Optional[Dict[str, str]]]:
+    """
+    Batch version of ``extract_regions``. Failed sequences give None; use
+    ``run_numbering_batch`` directly to see why a sequence failed.
+    """
+    annotations = annotate_batch(seqs, scheme=scheme, chain=chain, germline=False,
+                                 chunk_size=chunk_size, n_jobs=n_jobs, cache=cache)
+    if chain == 'auto':
+        # Heavy and light domains use different region tables.
+        return [a.regions if a is not None else None for a in annotations]
+    numbered = [a.numbering for a in annotations if a is not None]
+    regions = iter(regions_from_numbering_batch(numbered, scheme, chain))
+    return [next(regions) if a is not None else None for a in annotations]
+
+
+def _domain_annotations(seq: str, scheme: str, result: tuple) -> List[Annotation]:
+    """One ``Annotation`` per domain of a numbering result."""
+    numbered, details, hits = result
+    return [Annotation(seq, scheme, 'auto', ([[domain]], [[domain_details]], hits))
+            for domain, domain_details in zip(numbered[0], details[0])]
+
+
+def annotate_domains(seq: str,
+                     scheme: str = 'imgt',
+                     germline: bool = True,
+                     species: Optional[List[str]] = None,
+                     cache: Optional[NumberingCache] = None) -> List[Annotation]:
+    """
+    Number a sequence of unknown chain type in a single anarci run and
+    return an ``Annotation`` for every heavy, kappa or lambda domain found,
+    e.g. both domains of an scFv. The chain of each annotation is detected
+    (see ``Annotation.chain_type``), so its regions use the right table.
+    """
+    region_table(scheme, 'H')
+    result = run_numbering(seq, scheme=scheme, chain='auto', germline=germline,
+                           species=species, cache=cache)
+    return _domain_annotations(_normalize_seq(seq), scheme, result)
+
+
+def annotate_domains_batch(seqs: Iterable[str],
+                           names: Optional[Iterable[str]] = None,
+                           scheme: str = 'imgt',
+                           germline: bool = True,
+                           species: Optional[List[str]] = None,
+                           chunk_size: int = 1000,
+                           n_jobs: int = 1,
+                           cache: Optional[NumberingCache] = None) -> List[List[Annotation]]:
+    """
+    Batch version of ``annotate_domains``. Sequences without an antibody
+    domain give an empty list.
+    """
+    region_table(scheme, 'H')
+    records = run_numbering_batch(seqs, names=names, scheme=scheme, chain='auto',
+                                  germline=germline, species=species,
+                                  chunk_size=chunk_size, n_jobs=n_jobs, cache=cache)
+    return [_domain_annotations(r.seq, scheme, r.result) if r.ok else [] for r in records]
+
+
+def split_chains(seqs: Iterable[str],
+                 names: Optional[Iterable[str]] = None,
+                 scheme: str = 'imgt',
+                 germline: bool = True,
+                 species: Optional[List[str]] = None,
+                 chunk_size: int = 1000,
+                 n_jobs: int = 1,
+                 cache: Optional[NumberingCache] = None) -> Dict[str, List[Annotation]]:
+    """
+    Number unsorted heavy and light chain sequences in one pass and group
+    their domains by chain: ``{'H': [...], 'L': [...]}``, kappa and lambda
+    domains both going to 'L'. Each annotation keeps the input ``name``.
+    An scFv contributes one domain to each group.
+    """
+    groups = {'H': [], 'L': []}
+    for domains in annotate_domains_batch(seqs, names=names, scheme=scheme, germline=germline,
+                                          species=species, chunk_size=chunk_size,
+                                          n_jobs=n_jobs, cache=cache):
+        for annotation in domains:
+            groups[annotation.chain].append(annotation)
+    return groups
 
 
 if __name__ == '__main__':
@@ -0,0 +1,211 @@
+"""
+Alignment-free identity between antibody chains numbered with the same scheme.
+
+Numbered chains are already aligned by position, so identity is the number
+of positions with the same residue over the number of positions occupied in
+either chain (a residue opposite a gap counts like an alignment gap).
+"""
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .regions import NO_REGION, region_table
+
+Position = Tuple[int, str]
+
+
+def _numbering(item):
+    """The numbered domain of an ``Annotation`` or a numbered domain itself."""
+    return item.numbering if hasattr(item, 'numbering') else item
+
+
+def _region_indices(regions: Iterable[str], scheme: str, chain: str) -> List[int]:
+    table = region_table(scheme, chain)
+    indices = []
+    for region in regions:
+        if region not in table.keys:
+            raise ValueError(f'Unknown region {region!r}; expected one of {table.keys}')
+        indices.append(table.keys.index(region))
+    return indices
+
+
+def _in_regions(numbers: np.ndarray, regions: Optional[Iterable[str]], scheme: str,
+                chain: str) -> np.ndarray:
+    """Which position numbers fall in ``regions`` (all of them if None)."""
+    if regions is None:
+        return np.ones(len(numbers), dtype=bool)
+    wanted = _region_indices(regions, scheme, chain)
+    array = region_table(scheme, chain).array
+    inside = (numbers >= 0) & (numbers < len(array))
+    region = np.full(len(numbers), NO_REGION, dtype=np.int64)
+    region[inside] = array[numbers[inside]]
+    return np.isin(region, wanted)
+
+
+def _one_hot(encoded: np.ndarray, residues: np.ndarray) -> np.ndarray:
+    """Rows of ``encoded`` as float32 indicators, one column per position and residue."""
+    return (encoded[:, :, None] == residues).reshape(len(encoded), -1).astype(np.float32)
+
+
+def positional_identity(numbered1, numbered2,
+                        regions: Optional[Sequence[str]] = None,
+                        scheme: str = 'imgt',
+                        chain: str = 'H') -> float:
+    """
+    Percent identity of two numbered chains, compared position by position.
+
+    Args:
+        numbered1: An anarci numbered domain (list of ``((number, insertion), aa)``)
+            or an ``Annotation``.
+        numbered2: The second chain, numbered with the same scheme.
+        regions: Optional region keys as returned by ``extract_regions``
+            (e.g. ``['vh_cdr1', 'vh_cdr2', 'vh_cdr3']``) to restrict the
+            comparison to.
+        scheme: Numbering scheme, used to look up ``regions``.
+        chain: Chain type, used to look up ``regions``.
+
+    Returns:
+        float: Percent identity, or NaN if no position is occupied.
+    """
+    residues1 = {pos: aa for pos, aa in _numbering(numbered1) if aa != '-'}
+    residues2 = {pos: aa for pos, aa in _numbering(numbered2) if aa != '-'}
+    positions = residues1.keys() | residues2.keys()
+    if regions is not None:
+        wanted = set(_region_indices(regions, scheme, chain))
+        lookup = region_table(scheme, chain).lookup
+        positions = [pos for pos in positions
+                     if 0 <= pos[0] < len(lookup) and lookup[pos[0]] in wanted]
+    if not positions:
+        return float('nan')
+    matches = sum(1 for pos in positions if residues1.get(pos) == residues2.get(pos))
+    return matches / len(positions) * 100
+
+
+class PositionalLibrary:
+    """
+    A library of numbered chains encoded as a uint8 matrix (chains x
+    numbered positions) holding the residue byte, or 0 at gaps.
+
+    Identity against the library is computed with vectorised operations:
+    residue matches of many-vs-many comparisons are a sum of one-hot
+    matrix products, one per residue type.
+
+    Args:
+        matrix: Encoded residues, one row per chain.
+        positions: The ``(number, insertion)`` position of each column.
+        names: Optional names of the chains.
+        scheme: Numbering scheme of the chains.
+        chain: Chain type of the chains.
+    """
+
+    def __init__(self, matrix: np.ndarray, positions: Sequence[Position],
+                 names: Optional[Sequence[str]] = None, scheme: str = 'imgt',
+                 chain: str = 'H'):
+        self.matrix = matrix
+        self.positions = [tuple(pos) for pos in positions]
+        self.names = list(names) if names is not None else None
+        self.scheme = scheme
+        self.chain = chain
+        self._columns = {pos: j for j, pos in enumerate(self.positions)}
+        self._numbers = np.array([number for number, _ in self.positions], dtype=np.int64)
+
+    @classmethod
+    def from_numbering(cls, numbered_list: Iterable, names: Optional[Sequence[str]] = None,
+                       scheme: str = 'imgt', chain: str = 'H') -> 'PositionalLibrary':
+        """
+        Encode numbered domains (or ``Annotation`` objects) numbered with
+        ``scheme``. The columns are the union of their positions.
+        """
+        numbered_list = [_numbering(item) for item in numbered_list]
+        positions = sorted({pos for numbered in numbered_list for pos, _ in numbered})
+        library = cls(np.zeros((len(numbered_list), len(positions)), dtype=np.uint8),
+                      positions, names=names, scheme=scheme, chain=chain)
+        library.matrix, _ = library.encode(numbered_list)
+        return library
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def __repr__(self):
+        return (f'PositionalLibrary(size={len(self)}, positions={len(self.positions)}, '
+                f'scheme={self.scheme!r}, chain={self.chain!r})')
+
+    def encode(self, numbered_list: Iterable,
+               regions: Optional[Sequence[str]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Encode numbered domains onto the positions of this library.
+
+        Returns:
+            tuple: The uint8 matrix, and the number of residues of each
+            domain (within ``regions``) at positions the library lacks.
+        """
+        numbered_list = [_numbering(item) for item in numbered_list]
+        matrix = np.zeros((len(numbered_list), len(self.positions)), dtype=np.uint8)
+        extra = np.zeros(len(numbered_list), dtype=np.int64)
+        rows, cols, values = [], [], []
+        for i, numbered in enumerate(numbered_list):
+            missing = []
+            for pos, aa in numbered:
+                if aa == '-':
+                    continue
+                j = self._columns.get(pos)
+                if j is None:
+                    missing.append(pos[0])
+                else:
+                    rows.append(i)
+                    cols.append(j)
+                    values.append(ord(aa))
+            if missing:
+                numbers = np.array(missing, dtype=np.int64)
+                extra[i] = _in_regions(numbers, regions, self.scheme, self.chain).sum()
+        matrix[rows, cols] = values
+        return matrix, extra
+
+    def identity(self, query, regions: Optional[Sequence[str]] = None) -> np.ndarray:
+        """
+        Percent identity of one numbered chain against every library chain,
+        optionally restricted to ``regions`` (keys as in ``extract_regions``).
+        """
+        return self.identity_matrix([query], regions=regions)[0]
+
+    def identity_matrix(self, queries: Optional[Iterable] = None,
+                        regions: Optional[Sequence[str]] = None,
+                        block_size: int = 1024) -> np.ndarray:
+        """
+        Percent identity of each query against every library chain.
+
+        Args:
+            queries: Numbered domains or ``Annotation`` objects. Defaults to
+                the library itself (all-vs-all).
+            regions: Optional region keys to restrict the comparison to.
+            block_size: Queries compared per matrix product, bounding the
+                size of the temporary arrays.
+
+        Returns:
+            numpy.ndarray: float64 matrix (queries x library). NaN where
+            neither chain has a residue at any compared position.
+        """
+        columns = _in_regions(self._numbers, regions, self.scheme, self.chain)
+        library = self.matrix[:, columns]
+        if queries is None:
+            encoded, extra = self.matrix, np.zeros(len(self), dtype=np.int64)
+        else:
+            encoded, extra = self.encode(queries, regions=regions)
+        encoded = encoded[:, columns]
+        result = np.empty((len(encoded), len(self)), dtype=np.float64)
+        library_occupied = (library != 0).astype(np.float32)
+        library_counts = library_occupied.sum(axis=1)
+        residues = np.setdiff1d(np.unique(library), [0])
+        # One column per (position, residue); a single product counts the matches.
+        library_one_hot = _one_hot(library, residues)
+        for start in range(0, len(encoded), block_size):
+            block = encoded[start:start + block_size]
+            occupied = (block != 0).astype(np.float32)
+            both = occupied @ library_occupied.T
+            matches = _one_hot(block, residues) @ library_one_hot.T
+            covered = (occupied.sum(axis=1)[:, None] + library_counts[None, :] - both
+                       + extra[start:start + block_size, None])
+            with np.errstate(divide='ignore', invalid='ignore'):
+                result[start:start + block_size] = np.where(covered > 0, matches / covered * 100,
+                                                            np.nan)
+        return result
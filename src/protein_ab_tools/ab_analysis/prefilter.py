@@ -0,0 +1,108 @@
+"""
+Fast screening of sequences that cannot be antibody variable domains.
+"""
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Prefix of the ``NumberingRecord.error`` of sequences rejected by a prefilter.
+PREFILTER_ERROR = 'Rejected by prefilter'
+
+TOO_SHORT = 'too_short'
+TOO_LONG = 'too_long'
+INVALID_CHARACTERS = 'invalid_characters'
+NO_V_MOTIF = 'no_v_motif'
+
+
+@dataclass
+class Prefilter:
+    """
+    Cheap checks run before numbering so that obvious non-V-domains never
+    reach HMMER.
+
+    A sequence passes if its length is within bounds, it only contains
+    ``alphabet`` characters and (with ``check_motif``) it has the conserved
+    V-domain framework signature: the Cys of IMGT position 23, the Trp of
+    position 41 ``cys_trp_spacing`` residues later and, unless
+    ``trp_cys_spacing`` is None, the Cys of position 104 that many residues
+    after the Trp, with a Tyr/Phe/His of FR3 just before it. The defaults
+    keep the V genes of nearly all antibody germlines ANARCI ships; widen the
+    spacings, set ``trp_cys_spacing`` to None (e.g. for reads truncated
+    before CDR3) or turn off ``check_motif`` for more recall.
+
+    Rejections are counted by reason (see ``stats``).
+
+    Args:
+        min_length: Shortest sequence accepted.
+        max_length: Longest sequence accepted.
+        alphabet: Accepted residue letters (case-insensitive).
+        check_motif: Whether to require the framework motif.
+        cys_trp_spacing: Minimum and maximum residues between Cys23 and Trp41.
+        trp_cys_spacing: Minimum and maximum residues between Trp41 and
+            Cys104, or None to only look for Cys23 and Trp41.
+    """
+    min_length: int = 70
+    max_length: int = 1500
+    alphabet: str = 'ACDEFGHIKLMNPQRSTVWYX'
+    check_motif: bool = True
+    cys_trp_spacing: Tuple[int, int] = (9, 24)
+    trp_cys_spacing: Optional[Tuple[int, int]] = (40, 75)
+    counts: Counter = field(default_factory=Counter, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self._allowed = set(self.alphabet.upper())
+        low, high = self.cys_trp_spacing
+        pattern = f'C.{{{low},{high}}}W'
+        if self.trp_cys_spacing is not None:
+            low, high = self.trp_cys_spacing
+            # Cys104 follows the FR3 Tyr of "YYC"/"YFC"/"HYC"; the two
+            # residues before it count towards the spacing.
+            pattern += f'.{{{max(low - 2, 0)},{max(high - 2, 0)}}}(?:[YFH].|.[YF])C'
+        self._motif = re.compile(pattern)
+
+    def check(self, seq: str) -> Optional[str]:
+        """The reason ``seq`` is rejected, or None if it may be a V domain."""
+        self.counts['n_checked'] += 1
+        reason = self._reason(seq.upper())
+        if reason is not None:
+            self.counts[reason] += 1
+        return reason
+
+    def _reason(self, seq: str) -> Optional[str]:
+        if len(seq) < self.min_length:
+            return TOO_SHORT
+        if len(seq) > self.max_length:
+            return TOO_LONG
+        if not self._allowed.issuperset(seq):
+            return INVALID_CHARACTERS
+        if self.check_motif and self._motif.search(seq) is None:
+            return NO_V_MOTIF
+        return None
+
+    def filter(self, seqs: Iterable[str]) -> Tuple[List[int], Dict[int, str]]:
+        """
+        Screen sequences.
+
+        Returns:
+            tuple: Indices of the sequences that passed, and the reject
+            reason of each index that did not.
+        """
+        passed, rejected = [], {}
+        for i, seq in enumerate(seqs):
+            reason = self.check(seq)
+            if reason is None:
+                passed.append(i)
+            else:
+                rejected[i] = reason
+        return passed, rejected
+
+    def stats(self) -> Dict[str, int]:
+        """Number of sequences checked and rejected, overall and by reason."""
+        n_checked = self.counts['n_checked']
+        by_reason = {reason: self.counts[reason]
+                     for reason in (TOO_SHORT, TOO_LONG, INVALID_CHARACTERS, NO_V_MOTIF)}
+        return {'n_checked': n_checked, 'n_rejected': sum(by_reason.values()), **by_reason}
+
+    def reset(self):
+        self.counts.clear()
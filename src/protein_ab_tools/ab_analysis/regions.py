@@ -0,0 +1,172 @@
+"""
+Antibody region definitions and region extraction from numbered domains.
+"""
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+from .. import instrumentation
+
+# Marks positions that belong to no region in a lookup table.
+NO_REGION = -1
+
+
+def _breakpoints(scheme: str, chain: str) -> Dict[str, List[int]]:
+    """Region boundaries (inclusive position ranges) for a scheme and chain."""
+    if scheme.lower() == 'imgt':
+        breakpoint = {
+            'fwr1': [1, 26],
+            'cdr1': [27, 38],
+            'fwr2': [39, 55],
+            'cdr2': [56, 65],
+            'fwr3': [66, 104],
+            'cdr3': [105, 117],
+            'fwr4': [118, 128]
+        }
+    elif scheme.lower() == 'aho':
+        # https://plueckthun.bioc.uzh.ch/antibody/Numbering/NumFrame.html
+        breakpoint = {
+            'fwr1': [1, 26],
+            'cdr1': [27, 40],
+            'fwr2': [41, 57],
+            'cdr2': [58, 68],
+            'fwr3': [69, 106],
+            'cdr3': [107, 138],
+            'fwr4': [139, 149] if chain == 'H' else [139, 148]
+        }
+    elif scheme.lower() == 'chothia':
+        # AbM uses Martin numbering with Chothia CDR index ranges
+        breakpoint = {
+            'fwr1': [1, 25] if chain == 'H' else [1, 23],
+            'cdr1': [26, 32] if chain == 'H' else [24, 34],
+            'fwr2': [33, 51] if chain == 'H' else [35, 49],
+            'cdr2': [52, 56] if chain == 'H' else [50, 56],
+            'fwr3': [57, 94] if chain == 'H' else [57, 88],
+            'cdr3': [95, 102] if chain == 'H' else [89, 97],
+            'fwr4': [103, 113] if chain == 'H' else [98, 109]
+        }
+    elif scheme.lower() == 'kabat':
+        breakpoint = {
+            'fwr1': [1, 30] if chain == 'H' else [1, 23],
+            'cdr1': [31, 35] if chain == 'H' else [24, 34],
+            'fwr2': [36, 49] if chain == 'H' else [35, 49],
+            'cdr2': [50, 65] if chain == 'H' else [50, 56],
+            'fwr3': [66, 94] if chain == 'H' else [57, 88],
+            'cdr3': [95, 102] if chain == 'H' else [89, 97],
+            'fwr4': [103, 113] if chain == 'H' else [98, 109]
+        }
+    elif scheme.lower() in ('abm', "martin"):
+        breakpoint = {
+            'fwr1': [1, 25] if chain == 'H' else [1, 23],
+            'cdr1': [26, 35] if chain == 'H' else [24, 34],
+            'fwr2': [36, 49] if chain == 'H' else [35, 49],
+            'cdr2': [50, 58] if chain == 'H' else [50, 56],
+            'fwr3': [59, 94] if chain == 'H' else [57, 88],
+            'cdr3': [95, 102] if chain == 'H' else [89, 97],
+            'fwr4': [103, 113] if chain == 'H' else [98, 110]
+        }
+    else:
+        raise ValueError('Invalid numbering scheme')
+    return breakpoint
+
+
+def region_chain(chain_type: str) -> str:
+    """The region chain ('H' or 'L') of an anarci chain type (H, K or L)."""
+    return 'H' if chain_type == 'H' else 'L'
+
+
+class RegionTable(NamedTuple):
+    """
+    Precompiled region lookup for one scheme and chain.
+
+    ``lookup[number]`` is the index into ``keys`` of the region holding
+    position ``number`` (insertions share the region of their position),
+    or ``NO_REGION``.
+    """
+    keys: Tuple[str, ...]
+    lookup: Tuple[int, ...]
+    array: np.ndarray
+
+
+@lru_cache(maxsize=None)
+def _region_table(scheme: str, chain: str) -> RegionTable:
+    breakpoint = _breakpoints(scheme, chain)
+    prefix = 'vh' if chain == 'H' else 'vl'
+    keys = tuple(f'{prefix}_{name}' for name in breakpoint)
+    lookup = [NO_REGION] * (max(end for _, end in breakpoint.values()) + 1)
+    # Ranges are scanned in order, so the first matching region wins exactly
+    # as in a linear scan over the breakpoints.
+    for index, (start, end) in reversed(list(enumerate(breakpoint.values()))):
+        lookup[start:end + 1] = [index] * (end - start + 1)
+    array = np.array(lookup, dtype=np.int8)
+    array.setflags(write=False)
+    return RegionTable(keys, tuple(lookup), array)
+
+
+def region_table(scheme: str, chain: str) -> RegionTable:
+    """
+    The ``RegionTable`` of a scheme and chain, built once and reused.
+
+    Raises:
+        ValueError: If the scheme is not supported.
+    """
+    return _region_table(scheme.lower(), chain)
+
+
+@instrumentation.timed('regions')
+def regions_from_numbering(numbered, scheme: str, chain: str) -> Dict[str, str]:
+    """
+    Split an anarci numbered domain (a list of ``((number, insertion), aa)``)
+    into framework and CDR regions.
+    """
+    table = region_table(scheme, chain)
+    lookup = table.lookup
+    size = len(lookup)
+    parts = [[] for _ in table.keys]
+    for (number, _), aa in numbered:
+        if 0 <= number < size:
+            index = lookup[number]
+            if index != NO_REGION:
+                parts[index].append(aa)
+    return {key: ''.join(part) for key, part in zip(table.keys, parts)}
+
+
+@instrumentation.timed('regions')
+def regions_from_numbering_batch(numbered_list: Sequence, scheme: str,
+                                 chain: str) -> List[Dict[str, str]]:
+    """
+    Batch version of ``regions_from_numbering``.
+
+    Positions of all domains are looked up in one vectorised pass and the
+    residues are grouped by (domain, region) with a single stable sort, so
+    each region string is a slice of one shared buffer.
+    """
+    table = region_table(scheme, chain)
+    n_regions = len(table.keys)
+    lengths = np.fromiter((len(numbered) for numbered in numbered_list),
+                          dtype=np.int64, count=len(numbered_list))
+    total = int(lengths.sum())
+    numbers = np.fromiter((number for numbered in numbered_list for (number, _), _ in numbered),
+                          dtype=np.int64, count=total)
+    residues = np.frombuffer(
+        ''.join([aa for numbered in numbered_list for _, aa in numbered]).encode('ascii'),
+        dtype=np.uint8)
+    in_table = (numbers >= 0) & (numbers < len(table.array))
+    region = np.full(total, NO_REGION, dtype=np.int64)
+    region[in_table] = table.array[numbers[in_table]]
+    keep = region != NO_REGION
+    group = np.repeat(np.arange(len(numbered_list)), lengths)[keep] * n_regions + region[keep]
+    order = np.argsort(group, kind='stable')
+    buffer = residues[keep][order].tobytes().decode('ascii')
+    ends = np.cumsum(np.bincount(group, minlength=len(numbered_list) * n_regions)).tolist()
+    results = []
+    start = 0
+    for i in range(len(numbered_list)):
+        regions = {}
+        for j, key in enumerate(table.keys):
+            end = ends[i * n_regions + j]
+            regions[key] = buffer[start:end]
+            start = end
+        results.append(regions)
+    return results
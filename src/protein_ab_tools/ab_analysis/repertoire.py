@@ -0,0 +1,272 @@
+"""
+Compact columnar store of numbered sequences (a numbering-based MSA).
+"""
+import json
+import os
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .positional import PositionalLibrary, _in_regions, _numbering
+from .regions import region_table
+
+Position = Tuple[int, str]
+
+_FORMAT_VERSION = 1
+GAP = ord('-')
+
+# IMGT places insertions symmetrically in the CDRs: at these positions the
+# insertions come before the position itself, in reverse order
+# (e.g. 111, 111A, 111B, 112B, 112A, 112).
+_REVERSED_INSERTIONS = {'imgt': {33, 61, 112}}
+
+METADATA_COLUMNS = ('name', 'chain_type', 'species', 'v_gene', 'v_identity',
+                    'j_gene', 'j_identity')
+
+
+def position_label(position: Position) -> str:
+    """``(111, 'A')`` -> ``'111A'``."""
+    number, insertion = position
+    return f'{number}{insertion.strip()}'
+
+
+def position_axis(positions: Iterable[Position], scheme: str = 'imgt',
+                  chain: str = 'H') -> List[Position]:
+    """
+    The sorted position axis of a scheme: every position of its regions
+    plus the given (observed) insertions, in numbering order.
+    """
+    scheme = scheme.lower()
+    table = region_table(scheme, chain)
+    insertions = {}
+    for number, insertion in positions:
+        if insertion != ' ':
+            insertions.setdefault(number, set()).add(insertion)
+    numbers = set(range(1, len(table.lookup))) | insertions.keys()
+    numbers |= {number for number, _ in positions}
+    reversed_at = _REVERSED_INSERTIONS.get(scheme, set())
+    axis = []
+    for number in sorted(numbers):
+        codes = sorted(insertions.get(number, ()), key=lambda code: (len(code), code))
+        if number in reversed_at:
+            axis.extend((number, code) for code in reversed(codes))
+            axis.append((number, ' '))
+        else:
+            axis.append((number, ' '))
+            axis.extend((number, code) for code in codes)
+    return axis
+
+
+def _on_axis(residues: np.ndarray, positions: Sequence[Position],
+             axis: List[Position]) -> np.ndarray:
+    """
+    Residue rows over ``positions`` placed in the columns of ``axis``.
+    Returned as is when the positions already are the axis.
+    """
+    if list(positions) == axis:
+        return residues
+    columns = {pos: j for j, pos in enumerate(axis)}
+    placed = np.zeros((len(residues), len(axis)), dtype=np.uint8)
+    placed[:, [columns[pos] for pos in positions]] = residues
+    return placed
+
+
+def _details_metadata(details: dict) -> Dict[str, object]:
+    row = {'chain_type': details.get('chain_type', ''), 'species': details.get('species', '')}
+    for segment in ('v', 'j'):
+        call, identity = details.get('germlines', {}).get(f'{segment}_gene', (None, None))
+        row[f'{segment}_gene'] = call[1] if call else ''
+        row[f'{segment}_identity'] = identity if identity is not None else np.nan
+    return row
+
+
+def _metadata_arrays(rows: List[Dict[str, object]]) -> Dict[str, np.ndarray]:
+    return {column: np.array([row[column] for row in rows],
+                             dtype=np.float64 if column.endswith('identity') else str)
+            for column in METADATA_COLUMNS}
+
+
+class Repertoire:
+    """
+    Numbered sequences of one scheme and chain, stored column-wise.
+
+    ``residues`` is a uint8 matrix (sequences x positions) of residue bytes
+    with 0 at gaps, over a fixed, ordered position axis ``positions`` that
+    includes insertion codes. ``metadata`` maps column names (see
+    ``METADATA_COLUMNS``) to one NumPy array per column. A repertoire takes
+    about one byte per position and sequence, against hundreds of bytes per
+    residue for anarci's nested tuples, and ``load`` memory-maps it so
+    large repertoires open without re-numbering or reading them into RAM.
+
+    Args:
+        residues: uint8 residue matrix.
+        positions: The ``(number, insertion)`` position of each column.
+        scheme: Numbering scheme.
+        chain: Chain type.
+        metadata: Per-sequence columns, each of length ``len(residues)``.
+    """
+
+    def __init__(self, residues: np.ndarray, positions: Sequence[Position],
+                 scheme: str = 'imgt', chain: str = 'H',
+                 metadata: Optional[Dict[str, np.ndarray]] = None):
+        if residues.shape[1] != len(positions):
+            raise ValueError('residues must have one column per position')
+        self.residues = residues
+        self.positions = [tuple(pos) for pos in positions]
+        self.scheme = scheme
+        self.chain = chain
+        self.metadata = dict(metadata or {})
+        for column, values in self.metadata.items():
+            if len(values) != len(residues):
+                raise ValueError(f'Metadata column {column!r} has the wrong length')
+
+    @classmethod
+    def from_numbering(cls, numbered_list: Iterable, scheme: str = 'imgt', chain: str = 'H',
+                       metadata: Optional[Dict[str, Sequence]] = None) -> 'Repertoire':
+        """
+        Build a repertoire from anarci numbered domains (or ``Annotation``
+        objects) numbered with ``scheme``.
+        """
+        numbered_list = [_numbering(item) for item in numbered_list]
+        positions = position_axis({pos for numbered in numbered_list for pos, _ in numbered},
+                                  scheme, chain)
+        columns = {pos: j for j, pos in enumerate(positions)}
+        residues = np.zeros((len(numbered_list), len(positions)), dtype=np.uint8)
+        rows, cols, values = [], [], []
+        for i, numbered in enumerate(numbered_list):
+            for pos, aa in numbered:
+                if aa != '-':
+                    rows.append(i)
+                    cols.append(columns[pos])
+                    values.append(ord(aa))
+        residues[rows, cols] = values
+        metadata = {column: np.asarray(values) for column, values in (metadata or {}).items()}
+        return cls(residues, positions, scheme=scheme, chain=chain, metadata=metadata)
+
+    @classmethod
+    def from_records(cls, records: Iterable, scheme: str = 'imgt',
+                     chain: str = 'H') -> 'Repertoire':
+        """
+        Build a repertoire from the ``NumberingRecord`` objects of
+        ``run_numbering_batch``, with anarci or ``NumberedChain``
+        (``as_chain=True``) results. Failed records are left out; the name,
+        chain type, species and (if assigned) germline calls are kept as
+        metadata.
+        """
+        numbered_list = []
+        rows = []
+        for record in records:
+            if not record.ok:
+                continue
+            result = record.result
+            if isinstance(result, tuple):
+                numbered, details = result[0][0][0][0], result[1][0][0]
+            else:
+                numbered, details = result.numbering, result.details
+            numbered_list.append(numbered)
+            rows.append({'name': record.name, **_details_metadata(details)})
+        return cls.from_numbering(numbered_list, scheme=scheme, chain=chain,
+                                  metadata=_metadata_arrays(rows))
+
+    @classmethod
+    def from_chains(cls, chains: Sequence) -> 'Repertoire':
+        """
+        Build a repertoire from ``NumberedChain`` objects of one scheme and
+        chain, over the same position axis as ``from_numbering``. Their
+        residue arrays are stacked directly when all chains share the same
+        positions, which is the common case.
+        """
+        chains = list(chains)
+        if not chains:
+            raise ValueError('At least one chain is required')
+        first = chains[0]
+        metadata = _metadata_arrays([{'name': c.details.get('query_name', ''),
+                                      **_details_metadata(c.details)} for c in chains])
+        if all(np.array_equal(c.numbers, first.numbers)
+               and np.array_equal(c.insertions, first.insertions) for c in chains):
+            positions = first.positions
+            axis = position_axis(positions, first.scheme, first.chain)
+            residues = _on_axis(np.stack([c.residues for c in chains]), positions, axis)
+            return cls(residues, axis, scheme=first.scheme, chain=first.chain,
+                       metadata=metadata)
+        return cls.from_numbering([c.numbering for c in chains], scheme=first.scheme,
+                                  chain=first.chain, metadata=metadata)
+
+    def __len__(self):
+        return self.residues.shape[0]
+
+    def __repr__(self):
+        return (f'Repertoire(size={len(self)}, positions={len(self.positions)}, '
+                f'scheme={self.scheme!r}, chain={self.chain!r})')
+
+    @property
+    def names(self) -> List[str]:
+        if 'name' in self.metadata:
+            return [str(name) for name in self.metadata['name']]
+        return [str(i) for i in range(len(self))]
+
+    def region_columns(self, regions: Optional[Sequence[str]] = None) -> np.ndarray:
+        """Boolean mask of the columns in ``regions`` (keys as in ``extract_regions``)."""
+        numbers = np.array([number for number, _ in self.positions], dtype=np.int64)
+        return _in_regions(numbers, regions, self.scheme, self.chain)
+
+    def numbering(self, i: int) -> List[Tuple[Position, str]]:
+        """The occupied positions of sequence ``i`` as an anarci numbered domain."""
+        row = self.residues[i]
+        return [(self.positions[j], chr(row[j])) for j in np.flatnonzero(row)]
+
+    def sequence(self, i: int) -> str:
+        """The ungapped sequence of ``i``."""
+        row = self.residues[i]
+        return row[row != 0].tobytes().decode('ascii')
+
+    def msa(self, regions: Optional[Sequence[str]] = None) -> List[str]:
+        """The gap-padded aligned sequences, optionally only ``regions`` columns."""
+        block = np.asarray(self.residues[:, self.region_columns(regions)])
+        block = np.where(block == 0, GAP, block).astype(np.uint8)
+        width = block.shape[1]
+        text = block.tobytes().decode('ascii')
+        return [text[i * width:(i + 1) * width] for i in range(len(self))]
+
+    def write_msa(self, path: str, regions: Optional[Sequence[str]] = None):
+        """Write the gap-padded alignment as aligned FASTA."""
+        with open(path, 'w') as handle:
+            for name, aligned in zip(self.names, self.msa(regions)):
+                handle.write(f'>{name}\n{aligned}\n')
+
+    def to_positional_library(self) -> PositionalLibrary:
+        """A ``PositionalLibrary`` sharing this repertoire's residue matrix."""
+        names = self.names if 'name' in self.metadata else None
+        return PositionalLibrary(self.residues, self.positions, names=names,
+                                 scheme=self.scheme, chain=self.chain)
+
+    def save(self, path: str):
+        """Write the repertoire to the directory ``path`` as ``.npy`` files."""
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, 'residues.npy'), np.asarray(self.residues))
+        for column, values in self.metadata.items():
+            np.save(os.path.join(path, f'meta_{column}.npy'), np.asarray(values))
+        meta = {
+            'format': _FORMAT_VERSION,
+            'scheme': self.scheme,
+            'chain': self.chain,
+            'positions': [list(pos) for pos in self.positions],
+            'metadata': list(self.metadata),
+        }
+        with open(os.path.join(path, 'repertoire.json'), 'w') as handle:
+            json.dump(meta, handle)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> 'Repertoire':
+        """Open a repertoire written by ``save``, memory-mapping it by default."""
+        with open(os.path.join(path, 'repertoire.json')) as handle:
+            meta = json.load(handle)
+        if meta.get('format') != _FORMAT_VERSION:
+            raise ValueError(f'Unsupported repertoire format: {meta.get("format")}')
+        mmap_mode = 'r' if mmap else None
+        residues = np.load(os.path.join(path, 'residues.npy'), mmap_mode=mmap_mode)
+        metadata = {column: np.load(os.path.join(path, f'meta_{column}.npy'),
+                                    mmap_mode=mmap_mode)
+                    for column in meta['metadata']}
+        return cls(residues, [tuple(pos) for pos in meta['positions']], scheme=meta['scheme'],
+                   chain=meta['chain'], metadata=metadata)
@@ -0,0 +1,355 @@
+"""
+Asyncio front-end for numbering and similarity with dynamic micro-batching.
+
+Requests that arrive concurrently are gathered for a few milliseconds and
+sent to a worker pool as one batch, so an async service gets the throughput
+of ``run_numbering_batch`` (one ANARCI call per batch) while each caller
+still awaits its own result.
+"""
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from .ab_analysis.cache import NumberingCache
+from .ab_analysis.numbering import _check_anarci, _normalize_seq, run_numbering_batch
+from .ab_analysis.prefilter import PREFILTER_ERROR, Prefilter
+from .align.sequence_align import calc_percent_similarity
+from .parallel import resolve_n_jobs
+
+
+class MicroBatcher:
+    """
+    Gather concurrently submitted items into batches for a blocking function.
+
+    The first item of a batch waits at most ``max_wait`` seconds for others
+    to join it, then the batch (at most ``max_batch_size`` items) is passed
+    to ``func`` on ``executor``. At most ``max_concurrency`` batches run at
+    once; while they do, new items wait in a queue of ``max_queue`` items,
+    and ``submit`` blocks once the queue is full, which pushes back on
+    callers instead of letting the backlog grow without bound.
+
+    Args:
+        func: A blocking callable taking a list of items and returning one
+            result per item, in order. Must be picklable for a process pool.
+        executor: Where ``func`` runs. None uses the event loop's default
+            thread pool.
+        max_batch_size: Largest batch passed to ``func``.
+        max_wait: Seconds the first item of a batch waits for more items.
+        max_queue: Items that may wait for a batch before ``submit`` blocks.
+        max_concurrency: Batches running at the same time.
+    """
+
+    def __init__(self, func: Callable[[List[Any]], Sequence[Any]],
+                 executor: Optional[Executor] = None, max_batch_size: int = 256,
+                 max_wait: float = 0.005, max_queue: int = 1024, max_concurrency: int = 1):
+        if max_batch_size < 1:
+            raise ValueError('max_batch_size must be at least 1')
+        if max_queue < 1:
+            raise ValueError('max_queue must be at least 1')
+        if max_concurrency < 1:
+            raise ValueError('max_concurrency must be at least 1')
+        self.func = func
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.max_concurrency = max_concurrency
+        self.n_items = 0
+        self.n_batches = 0
+        self._loop = None
+        self._queue = None
+        self._slots = None
+        self._collector = None
+        self._running = set()
+        self._closed = False
+
+    def __repr__(self):
+        return (f'MicroBatcher(max_batch_size={self.max_batch_size}, '
+                f'max_wait={self.max_wait}, max_concurrency={self.max_concurrency})')
+
+    async def submit(self, item: Any) -> Any:
+        """Queue ``item`` and wait for its result (or the exception of its batch)."""
+        if self._closed:
+            raise RuntimeError('MicroBatcher is closed')
+        loop = asyncio.get_running_loop()
+        if self._collector is None or self._loop is not loop:
+            # The queue and collector belong to one event loop; a batcher
+            # used from a new loop (e.g. another ``asyncio.run``) starts afresh.
+            self._loop = loop
+            self._queue = asyncio.Queue(self.max_queue)
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            self._collector = loop.create_task(self._collect())
+        future = loop.create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = []
+        try:
+            while True:
+                batch = [await self._queue.get()]
+                deadline = loop.time() + self.max_wait
+                while len(batch) < self.max_batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                        continue
+                    except asyncio.QueueEmpty:
+                        pass
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                await self._slots.acquire()
+                task = loop.create_task(self._dispatch(batch))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+                batch = []
+        except asyncio.CancelledError:
+            error = RuntimeError('MicroBatcher is closed')
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            raise
+
+    async def _dispatch(self, batch: List[Tuple[Any, asyncio.Future]]):
+        try:
+            # Callers that gave up (e.g. timed out) are not worth computing.
+            batch = [(item, future) for item, future in batch if not future.done()]
+            if not batch:
+                return
+            self.n_batches += 1
+            self.n_items += len(batch)
+            loop = asyncio.get_running_loop()
+            try:
+                results = await loop.run_in_executor(self.executor, self.func,
+                                                     [item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self._slots.release()
+
+    async def close(self):
+        """
+        Stop accepting items and finish the batches already running. Items
+        still waiting for a batch fail with ``RuntimeError``.
+        """
+        self._closed = True
+        if self._collector is None or self._loop is not asyncio.get_running_loop():
+            return
+        self._collector.cancel()
+        await asyncio.gather(self._collector, *self._running, return_exceptions=True)
+        self._collector = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+def _pool(n_jobs: Optional[int], initializer: Optional[Callable[[], None]] = None) -> Executor:
+    """One worker thread when serial (keeps the event loop free), else processes."""
+    n_jobs = resolve_n_jobs(n_jobs)
+    if n_jobs == 1:
+        return ThreadPoolExecutor(max_workers=1, initializer=initializer)
+    return ProcessPoolExecutor(max_workers=n_jobs, initializer=initializer)
+
+
+def _number_batch(items: List[Tuple[str, str]], scheme, chain, germline, species, cache,
+                  as_chain):
+    names, seqs = zip(*items)
+    return list(run_numbering_batch(list(seqs), names=list(names), scheme=scheme, chain=chain,
+                                    germline=germline, species=species,
+                                    chunk_size=len(seqs), cache=cache, as_chain=as_chain))
+
+
+def _similarity_batch(pairs: List[Tuple[str, str]], mode: str):
+    results = []
+    for seq1, seq2 in pairs:
+        try:
+            results.append(calc_percent_similarity(seq1, seq2, mode=mode))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+class AsyncNumberer:
+    """
+    Awaitable ``run_numbering`` whose concurrent calls share ANARCI calls.
+
+    Each batch is numbered with ``run_numbering_batch`` on a pool of
+    ``n_jobs`` workers (a single thread when ``n_jobs`` is 1), so HMMER and
+    numbering never block the event loop. Sequences rejected by
+    ``prefilter`` fail at once without being queued.
+
+    Args:
+        scheme: Numbering scheme.
+        chain: 'H', 'L' or 'auto'.
+        germline: Whether to assign germlines.
+        species: Species to consider (default human and mouse).
+        n_jobs: Worker processes (see ``resolve_n_jobs``); also the number
+            of batches numbered at once.
+        cache: Optional ``NumberingCache``, used inside the workers.
+        prefilter: Optional ``Prefilter`` run before queueing.
+        as_chain: Return ``NumberedChain`` objects.
+        max_batch_size: Sequences per ANARCI call.
+        max_wait: Seconds a request waits for others to share its batch.
+        max_queue: Requests that may wait before ``number`` blocks.
+        executor: Optional pool of ``n_jobs`` workers to share instead of
+            creating one; ``close`` leaves it running.
+    """
+
+    def __init__(self, scheme: str = 'imgt', chain: str = 'H', germline: bool = False,
+                 species: Optional[List[str]] = None, n_jobs: Optional[int] = 1,
+                 cache: Optional[NumberingCache] = None, prefilter: Optional[Prefilter] = None,
+                 as_chain: bool = False, max_batch_size: int = 256, max_wait: float = 0.005,
+                 max_queue: int = 1024, executor: Optional[Executor] = None):
+        _check_anarci()
+        self.scheme = scheme
+        self.chain = chain
+        self.prefilter = prefilter
+        self._owns_executor = executor is None
+        self._executor = _pool(n_jobs) if executor is None else executor
+        func = partial(_number_batch, scheme=scheme, chain=chain, germline=germline,
+                       species=species, cache=cache, as_chain=as_chain)
+        self.batcher = MicroBatcher(func, executor=self._executor,
+                                    max_batch_size=max_batch_size, max_wait=max_wait,
+                                    max_queue=max_queue, max_concurrency=resolve_n_jobs(n_jobs))
+
+    async def number(self, seq: str, name: Optional[str] = None):
+        """
+        Number one sequence. Returns what ``run_numbering`` returns and
+        raises ``ValueError`` for sequences that cannot be numbered.
+        """
+        seq = _normalize_seq(seq)
+        if name is None:
+            name = f'{self.chain}-{self.scheme}'
+        if self.prefilter is not None:
+            reason = self.prefilter.check(seq)
+            if reason is not None:
+                raise ValueError(f'Invalid sequence: {seq} ({PREFILTER_ERROR}: {reason})')
+        record = await self.batcher.submit((name, seq))
+        if not record.ok:
+            raise ValueError(record.error)
+        return record.result
+
+    async def close(self):
+        """Finish running batches and shut down the worker pool."""
+        await self.batcher.close()
+        if self._owns_executor:
+            self._executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+class AsyncSimilarity:
+    """
+    Awaitable ``calc_percent_similarity`` whose concurrent calls are
+    aligned in batches on a pool of ``n_jobs`` workers.
+
+    Args:
+        mode: The alignment mode.
+        n_jobs: Worker processes (a single thread when 1).
+        max_batch_size: Pairs per batch.
+        max_wait: Seconds a request waits for others to share its batch.
+        max_queue: Requests that may wait before ``similarity`` blocks.
+        executor: Optional pool of ``n_jobs`` workers to share instead of
+            creating one; ``close`` leaves it running.
+    """
+
+    def __init__(self, mode: str = 'blastp', n_jobs: Optional[int] = 1,
+                 max_batch_size: int = 1024, max_wait: float = 0.002, max_queue: int = 4096,
+                 executor: Optional[Executor] = None):
+        self.mode = mode
+        self._owns_executor = executor is None
+        self._executor = _pool(n_jobs) if executor is None else executor
+        self.batcher = MicroBatcher(partial(_similarity_batch, mode=mode),
+                                    executor=self._executor, max_batch_size=max_batch_size,
+                                    max_wait=max_wait, max_queue=max_queue,
+                                    max_concurrency=resolve_n_jobs(n_jobs))
+
+    async def similarity(self, seq1: str, seq2: str) -> float:
+        """Percent similarity of two sequences, as ``calc_percent_similarity``."""
+        result = await self.batcher.submit((seq1, seq2))
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def close(self):
+        await self.batcher.close()
+        if self._owns_executor:
+            self._executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+# Shared instances behind anumber/asimilarity, by event loop and parameters.
+_shared: Dict[asyncio.AbstractEventLoop, Dict[tuple, Any]] = {}
+
+
+def _shared_instance(key, factory):
+    # Instances of loops that have since closed (e.g. an earlier
+    # ``asyncio.run``) can no longer be awaited; only their pools are left.
+    for loop in [loop for loop in _shared if loop.is_closed()]:
+        for instance in _shared.pop(loop).values():
+            instance._executor.shutdown(wait=False)
+    instances = _shared.setdefault(asyncio.get_running_loop(), {})
+    if key not in instances:
+        instances[key] = factory()
+    return instances[key]
+
+
+async def aclose_shared():
+    """
+    Close the ``AsyncNumberer`` and ``AsyncSimilarity`` instances that
+    ``anumber`` and ``asimilarity`` created for the running event loop,
+    and their worker threads. Later calls create new ones.
+    """
+    for instance in _shared.pop(asyncio.get_running_loop(), {}).values():
+        await instance.close()
+
+
+async def anumber(seq: str, name: Optional[str] = None, scheme: str = 'imgt',
+                  chain: str = 'H', germline: bool = False,
+                  species: Optional[List[str]] = None):
+    """
+    Async ``run_numbering``. Calls made concurrently with the same
+    parameters are numbered together by a shared ``AsyncNumberer`` with one
+    worker thread, one per event loop (see ``aclose_shared``); create an
+    ``AsyncNumberer`` for a process pool, a cache or other batching
+    settings.
+    """
+    key = ('number', scheme, chain, germline, tuple(species) if species is not None else None)
+    numberer = _shared_instance(key, lambda: AsyncNumberer(scheme=scheme, chain=chain,
+                                                            germline=germline, species=species))
+    return await numberer.number(seq, name=name)
+
+
+async def asimilarity(seq1: str, seq2: str, mode: str = 'blastp') -> float:
+    """
+    Async ``calc_percent_similarity``; concurrent calls are aligned in
+    batches by a shared ``AsyncSimilarity``.
+    """
+    similarity = _shared_instance(('similarity', mode), lambda: AsyncSimilarity(mode=mode))
+    return await similarity.similarity(seq1, seq2)
@@ -1,6 +1,45 @@
 """
 Sequence alignment module.
+
+Names are imported from their submodules on first access, so importing the
+package does not load Biopython or NumPy until they are needed.
 """
-from .sequence_align import calc_percent_similarity
+import importlib
+
+_EXPORTS = {
+    'Hit': '.kmer_index',
+    'KmerIndex': '.kmer_index',
+    'calc_percent_similarity': '.sequence_align',
+    'is_similar': '.sequence_align',
+    'is_similar_batch': '.sequence_align',
+    'is_similar_matrix': '.similarity_matrix',
+    'similarity_matrix': '.similarity_matrix',
+}
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    imported = importlib.import_module(module, __name__)
+    # Bind every name of the submodule at once: importing it sets the
+    # attribute of the same name (``similarity_matrix``) to the submodule.
+    for export, source in _EXPORTS.items():
+        if source == module:
+            globals()[export] = getattr(imported, export)
+    return globals()[name]
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
+
 
-__all__ = ['calc_percent_similarity']
+__all__ = [
+    'calc_percent_similarity',
+    'is_similar',
+    'is_similar_batch',
+    'is_similar_matrix',
+    'similarity_matrix',
+    'KmerIndex',
+    'Hit',
+]
@@ -0,0 +1,209 @@
+"""
+K-mer inverted index for nearest-neighbour similarity search over large libraries.
+"""
+import json
+import os
+from typing import Iterable, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from .sequence_align import calc_percent_similarity
+
+AMINO_ACIDS = 'ACDEFGHIKLMNPQRSTVWY'
+# Every other residue (X, B, Z, ...) shares one code.
+_OTHER = len(AMINO_ACIDS)
+_ALPHABET_SIZE = len(AMINO_ACIDS) + 1
+# The k-mer offsets table has _ALPHABET_SIZE ** k + 1 int64 entries: 34 MB at k=5.
+MAX_K = 5
+
+_CODES = np.full(256, _OTHER, dtype=np.int64)
+for _code, _aa in enumerate(AMINO_ACIDS):
+    _CODES[ord(_aa)] = _code
+    _CODES[ord(_aa.lower())] = _code
+
+_FORMAT_VERSION = 1
+_ARRAYS = ('kmer_offsets', 'postings', 'n_kmers', 'seq_data', 'seq_offsets',
+           'name_data', 'name_offsets')
+
+
+class Hit(NamedTuple):
+    index: int
+    name: str
+    similarity: float
+    shared_kmers: int
+
+
+def _kmer_ids(seq: str, k: int) -> np.ndarray:
+    """Sorted unique k-mer ids of a sequence."""
+    data = np.frombuffer(seq.encode('ascii', 'replace'), dtype=np.uint8)
+    if len(data) < k:
+        return np.empty(0, dtype=np.int64)
+    codes = _CODES[data]
+    ids = np.zeros(len(data) - k + 1, dtype=np.int64)
+    for j in range(k):
+        ids = ids * _ALPHABET_SIZE + codes[j:len(codes) - k + 1 + j]
+    return np.unique(ids)
+
+
+def _pack(strings: Iterable[str]):
+    """Concatenated UTF-8 bytes of strings and their start offsets."""
+    encoded = [s.encode() for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    data = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    return data, offsets
+
+
+class KmerIndex:
+    """
+    Inverted index from k-mers to the library sequences that contain them.
+
+    A query first counts the k-mers it shares with every library sequence
+    (one ``bincount`` over the posting lists of its k-mers), keeps the
+    ``n_candidates`` best by shared k-mers relative to length, and only then
+    scores those candidates exactly with ``calc_percent_similarity``.
+    Similarities of returned hits are exact; a library sequence is only
+    missed if it shares too few k-mers to reach the candidate list.
+
+    The index can be built from full sequences or from CDRs (e.g. the
+    concatenated CDRs of ``extract_regions``). It is stored as plain
+    ``.npy`` arrays so ``load`` can memory-map libraries larger than RAM.
+
+    Use ``KmerIndex.build`` or ``KmerIndex.load`` to create an index.
+    """
+
+    def __init__(self, k: int, kmer_offsets: np.ndarray, postings: np.ndarray,
+                 n_kmers: np.ndarray, seq_data: np.ndarray, seq_offsets: np.ndarray,
+                 name_data: np.ndarray, name_offsets: np.ndarray):
+        self.k = k
+        self.kmer_offsets = kmer_offsets
+        self.postings = postings
+        self.n_kmers = n_kmers
+        self.seq_data = seq_data
+        self.seq_offsets = seq_offsets
+        self.name_data = name_data
+        self.name_offsets = name_offsets
+
+    @classmethod
+    def build(cls, seqs: Sequence[str], names: Optional[Sequence[str]] = None,
+              k: int = 3) -> 'KmerIndex':
+        """
+        Index a library of sequences.
+
+        Args:
+            seqs: Library sequences.
+            names: Optional names of the sequences. Defaults to their index.
+            k: K-mer length, 1 to ``MAX_K``. 3 suits full variable
+                domains; use 2 for short inputs such as single CDRs.
+
+        Returns:
+            KmerIndex: The index.
+        """
+        if not 1 <= k <= MAX_K:
+            raise ValueError(f'k must be between 1 and {MAX_K}, not {k}')
+        seqs = [seq.upper() for seq in seqs]
+        if names is None:
+            names = [str(i) for i in range(len(seqs))]
+        elif len(names) != len(seqs):
+            raise ValueError('names and seqs must have the same length')
+        kmers = [_kmer_ids(seq, k) for seq in seqs]
+        n_kmers = np.array([len(ids) for ids in kmers], dtype=np.int32)
+        all_ids = np.concatenate(kmers) if kmers else np.empty(0, dtype=np.int64)
+        seq_ids = np.repeat(np.arange(len(seqs), dtype=np.int32), n_kmers)
+        order = np.argsort(all_ids, kind='stable')
+        postings = seq_ids[order]
+        kmer_offsets = np.zeros(_ALPHABET_SIZE ** k + 1, dtype=np.int64)
+        np.cumsum(np.bincount(all_ids, minlength=_ALPHABET_SIZE ** k), out=kmer_offsets[1:])
+        seq_data, seq_offsets = _pack(seqs)
+        name_data, name_offsets = _pack(names)
+        return cls(k, kmer_offsets, postings, n_kmers, seq_data, seq_offsets,
+                   name_data, name_offsets)
+
+    def save(self, path: str):
+        """Write the index to the directory ``path``."""
+        os.makedirs(path, exist_ok=True)
+        for name in _ARRAYS:
+            np.save(os.path.join(path, f'{name}.npy'), getattr(self, name))
+        with open(os.path.join(path, 'index.json'), 'w') as handle:
+            json.dump({'format': _FORMAT_VERSION, 'k': self.k, 'size': len(self)}, handle)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> 'KmerIndex':
+        """Open an index written by ``save``, memory-mapping its arrays by default."""
+        with open(os.path.join(path, 'index.json')) as handle:
+            meta = json.load(handle)
+        if meta.get('format') != _FORMAT_VERSION:
+            raise ValueError(f'Unsupported index format: {meta.get("format")}')
+        arrays = {name: np.load(os.path.join(path, f'{name}.npy'),
+                                mmap_mode='r' if mmap else None)
+                  for name in _ARRAYS}
+        return cls(meta['k'], **arrays)
+
+    def __len__(self):
+        return len(self.n_kmers)
+
+    def __repr__(self):
+        return f'KmerIndex(k={self.k}, size={len(self)})'
+
+    def sequence(self, i: int) -> str:
+        return bytes(self.seq_data[self.seq_offsets[i]:self.seq_offsets[i + 1]]).decode()
+
+    def name(self, i: int) -> str:
+        return bytes(self.name_data[self.name_offsets[i]:self.name_offsets[i + 1]]).decode()
+
+    def shared_kmers(self, seq: str) -> np.ndarray:
+        """Number of distinct k-mers of ``seq`` in each library sequence."""
+        ids = _kmer_ids(seq.upper(), self.k)
+        starts = self.kmer_offsets[ids]
+        ends = self.kmer_offsets[ids + 1]
+        postings = [self.postings[s:e] for s, e in zip(starts, ends) if e > s]
+        if not postings:
+            return np.zeros(len(self), dtype=np.int64)
+        return np.bincount(np.concatenate(postings), minlength=len(self))
+
+    def search(self, seq: str, top_k: Optional[int] = 10, min_similarity: float = 0.0,
+               n_candidates: Optional[int] = None, mode: str = 'blastp') -> List[Hit]:
+        """
+        Library sequences most similar to ``seq``.
+
+        Args:
+            seq: Query sequence.
+            top_k: Maximum number of hits. None returns every candidate
+                reaching ``min_similarity``.
+            min_similarity: Minimum percent similarity of returned hits.
+            n_candidates: Number of prefiltered candidates to align exactly.
+                Defaults to ``max(100, 10 * top_k)``; raise it for better
+                recall at the cost of speed.
+            mode: The alignment mode passed to ``calc_percent_similarity``.
+
+        Returns:
+            list[Hit]: Hits sorted by decreasing similarity.
+        """
+        if top_k is not None and top_k < 1:
+            raise ValueError('top_k must be at least 1')
+        if n_candidates is not None and n_candidates < 1:
+            raise ValueError('n_candidates must be at least 1')
+        # Library sequences are stored uppercased.
+        seq = seq.upper()
+        if n_candidates is None:
+            n_candidates = max(100, 10 * top_k) if top_k is not None else len(self)
+        shared = self.shared_kmers(seq)
+        candidates = np.flatnonzero(shared)
+        if len(candidates) > n_candidates:
+            n_query = max(len(_kmer_ids(seq, self.k)), 1)
+            # Shared k-mers relative to the longer of the two, like identity
+            # relative to the alignment length.
+            score = shared[candidates] / np.maximum(self.n_kmers[candidates], n_query)
+            best = np.argpartition(-score, n_candidates - 1)[:n_candidates]
+            candidates = candidates[best]
+        hits = []
+        for i in candidates:
+            similarity = calc_percent_similarity(seq, self.sequence(i), mode=mode)
+            if similarity >= min_similarity:
+                hits.append(Hit(int(i), self.name(i), similarity, int(shared[i])))
+        hits.sort(key=lambda hit: (-hit.similarity, hit.index))
+        return hits[:top_k] if top_k is not None else hits
+
+    def search_many(self, seqs: Iterable[str], **kwargs) -> List[List[Hit]]:
+        """``search`` for each of ``seqs``; keyword arguments are passed through."""
+        return [self.search(seq, **kwargs) for seq in seqs]
@@ -1,6 +1,17 @@
+from collections import Counter
 from functools import lru_cache
 
-from Bio.Align import PairwiseAligner
+from .. import instrumentation
+
+
+def __getattr__(name):
+    # Biopython is slow to import, so PairwiseAligner is only imported when
+    # the first aligner is built.
+    if name == 'PairwiseAligner':
+        from Bio.Align import PairwiseAligner
+        globals()['PairwiseAligner'] = PairwiseAligner
+        return PairwiseAligner
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 
 @lru_cache(maxsize=None)
@@ -8,9 +19,11 @@ def _get_aligner(mode):
     """Aligner setup (substitution matrix, gap penalties) is identical for a
     given mode on every call, so build it once per mode and reuse it — this
     function runs in tight loops scoring millions of sequence pairs."""
-    return PairwiseAligner(mode)
+    aligner_class = globals().get('PairwiseAligner') or __getattr__('PairwiseAligner')
+    return aligner_class(mode)
 
 
+@instrumentation.timed('alignment')
 def calc_percent_similarity(seq1, seq2, mode='blastp'):
     """
     Calculate the percent similarity between two sequences.
@@ -32,6 +45,74 @@ def calc_percent_similarity(seq1, seq2, mode='blastp'):
     return identities / (identities + gaps + mismatches) * 100
 
 
+def identity_upper_bound(seq1, seq2):
+    """
+    Upper bound of ``calc_percent_similarity`` that needs no alignment.
+
+    The alignment is global, so it has at least max(len(seq1), len(seq2))
+    columns, and each identity pairs up one residue type in both sequences.
+    The identities are therefore at most the shared residue composition.
+
+    Args:
+        seq1 (str): The first sequence.
+        seq2 (str): The second sequence.
+
+    Returns:
+        float: The maximum percent similarity the two sequences can have.
+    """
+    longest = max(len(seq1), len(seq2))
+    if not longest:
+        return 0.0
+    shared = sum((Counter(seq1) & Counter(seq2)).values())
+    return shared / longest * 100
+
+
+def is_similar(seq1, seq2, min_identity=90.0, mode='blastp'):
+    """
+    Check whether two sequences have at least ``min_identity`` percent
+    similarity. Pairs whose length ratio or residue composition already
+    rule out the threshold are rejected without aligning them.
+
+    Args:
+        seq1 (str): The first sequence.
+        seq2 (str): The second sequence.
+        min_identity (float): Threshold in percent, as returned by
+            ``calc_percent_similarity``.
+        mode (str): The alignment mode. Default is 'blastp' for protein sequences.
+
+    Returns:
+        bool: True if ``calc_percent_similarity(seq1, seq2) >= min_identity``.
+    """
+    if not seq1 or not seq2:
+        return False
+    shortest, longest = sorted((len(seq1), len(seq2)))
+    if shortest / longest * 100 < min_identity:
+        return False
+    if identity_upper_bound(seq1, seq2) < min_identity:
+        return False
+    return calc_percent_similarity(seq1, seq2, mode=mode) >= min_identity
+
+
+def is_similar_batch(seqs1, seqs2, min_identity=90.0, mode='blastp'):
+    """
+    ``is_similar`` for each pair of ``seqs1`` and ``seqs2``.
+
+    Args:
+        seqs1 (list[str]): The first sequences.
+        seqs2 (list[str]): The second sequences, one per entry of ``seqs1``.
+        min_identity (float): Threshold in percent.
+        mode (str): The alignment mode. Default is 'blastp' for protein sequences.
+
+    Returns:
+        list[bool]: Whether each pair reaches ``min_identity``.
+    """
+    seqs1, seqs2 = list(seqs1), list(seqs2)
+    if len(seqs1) != len(seqs2):
+        raise ValueError('seqs1 and seqs2 must have the same length')
+    return [is_similar(seq1, seq2, min_identity=min_identity, mode=mode)
+            for seq1, seq2 in zip(seqs1, seqs2)]
+
+
 if __name__ == '__main__':
     seq1 = 'MALWMRLLPLLALLALWGPDPAAA'
     seq2 = 'MALWMRLLPLLALSSALWGPDPAAA'
@@ -0,0 +1,192 @@
+"""
+All-vs-all and query-vs-library percent similarity matrices.
+"""
+import os
+from functools import partial
+from typing import Iterator, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from ..parallel import imap_ordered
+from .sequence_align import calc_percent_similarity
+
+
+def _similarity_or_nan(seq1: str, seq2: str, mode: str) -> float:
+    if not seq1 or not seq2:
+        # Nothing to align: similarity is undefined.
+        return float('nan')
+    try:
+        return calc_percent_similarity(seq1, seq2, mode=mode)
+    except ZeroDivisionError:
+        return float('nan')
+
+
+def _score_tile(task, mode: str) -> Tuple[int, int, np.ndarray]:
+    """Score one tile. On diagonal tiles of a square matrix only j >= i is scored."""
+    i0, j0, rows, cols, upper_only = task
+    block = np.full((len(rows), len(cols)), np.nan, dtype=np.float32)
+    for i, seq1 in enumerate(rows):
+        start = i if upper_only else 0
+        for j in range(start, len(cols)):
+            block[i, j] = _similarity_or_nan(seq1, cols[j], mode)
+    return i0, j0, block
+
+
+def _composition(seqs: Sequence[str]) -> np.ndarray:
+    """Residue counts of each sequence, one column per byte value."""
+    counts = np.zeros((len(seqs), 256), dtype=np.int32)
+    for i, seq in enumerate(seqs):
+        counts[i] = np.bincount(np.frombuffer(seq.encode(), dtype=np.uint8), minlength=256)
+    return counts
+
+
+def _match_tile(task, mode: str, min_identity: float) -> Tuple[int, int, np.ndarray]:
+    """
+    Threshold one tile. Pairs are aligned only if their shared residue
+    composition (see ``identity_upper_bound``) can reach ``min_identity``.
+    """
+    i0, j0, rows, cols, upper_only = task
+    comp_rows, comp_cols = _composition(rows), _composition(cols)
+    used = (comp_rows.any(axis=0)) & (comp_cols.any(axis=0))
+    comp_rows, comp_cols = comp_rows[:, used], comp_cols[:, used]
+    shared = np.minimum(comp_rows[:, None, :], comp_cols[None, :, :]).sum(axis=2)
+    longest = np.maximum.outer([len(seq) for seq in rows], [len(seq) for seq in cols])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        bound = shared / longest * 100
+    candidates = (longest > 0) & (shared > 0) & (bound >= min_identity)
+    if upper_only:
+        candidates &= np.triu(np.ones(candidates.shape, dtype=bool))
+    block = np.zeros(candidates.shape, dtype=bool)
+    for i, j in zip(*np.nonzero(candidates)):
+        block[i, j] = calc_percent_similarity(rows[i], cols[j], mode=mode) >= min_identity
+    return i0, j0, block
+
+
+def _tiles(seqs: Sequence[str], library: Optional[Sequence[str]],
+           tile_size: int) -> Iterator[tuple]:
+    if library is None:
+        for i0 in range(0, len(seqs), tile_size):
+            for j0 in range(i0, len(seqs), tile_size):
+                yield (i0, j0, seqs[i0:i0 + tile_size], seqs[j0:j0 + tile_size], i0 == j0)
+    else:
+        for i0 in range(0, len(seqs), tile_size):
+            for j0 in range(0, len(library), tile_size):
+                yield (i0, j0, seqs[i0:i0 + tile_size], library[j0:j0 + tile_size], False)
+
+
+def _output(out, shape: Tuple[int, int], dtype) -> np.ndarray:
+    if out is None:
+        return np.empty(shape, dtype=dtype)
+    if isinstance(out, np.ndarray):
+        if out.shape != shape:
+            raise ValueError(f'out has shape {out.shape}, expected {shape}')
+        return out
+    return np.lib.format.open_memmap(os.fspath(out), mode='w+', dtype=dtype, shape=shape)
+
+
+def _fill(matrix: np.ndarray, tiles: Iterator[Tuple[int, int, np.ndarray]],
+          symmetric: bool) -> np.ndarray:
+    """Write scored tiles into ``matrix``, mirroring them if ``symmetric``."""
+    for i0, j0, block in tiles:
+        rows, cols = block.shape
+        if symmetric and i0 == j0:
+            upper = np.triu(np.ones(block.shape, dtype=bool))
+            block = np.where(upper, block, block.T)
+        matrix[i0:i0 + rows, j0:j0 + cols] = block
+        if symmetric and i0 != j0:
+            matrix[j0:j0 + cols, i0:i0 + rows] = block.T
+    if isinstance(matrix, np.memmap):
+        matrix.flush()
+    return matrix
+
+
+def similarity_matrix(
+    seqs: Sequence[str],
+    library: Optional[Sequence[str]] = None,
+    mode: str = 'blastp',
+    n_jobs: int = 1,
+    tile_size: int = 128,
+    out: Union[None, str, os.PathLike, np.ndarray] = None,
+    max_pending: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Percent similarity (``calc_percent_similarity``) between many sequences.
+
+    Without ``library`` the symmetric N x N matrix of ``seqs`` is computed,
+    scoring only the upper triangle and mirroring it. With ``library`` the
+    rectangular len(seqs) x len(library) query-vs-library matrix is computed.
+    The matrix is split into ``tile_size`` x ``tile_size`` tiles which are
+    scored on a process pool when ``n_jobs`` > 1.
+
+    Args:
+        seqs: Sequences (rows).
+        library: Optional library sequences (columns).
+        mode: The alignment mode passed to ``calc_percent_similarity``.
+        n_jobs: Number of worker processes; -1 uses all CPUs.
+        tile_size: Rows and columns per tile.
+        out: Where to write the matrix. None allocates an in-memory array;
+            a path creates a memory-mapped ``.npy`` file, for matrices that
+            do not fit in RAM; an existing float array of the right shape
+            is filled in place.
+        max_pending: Maximum number of tiles in flight on the pool.
+
+    Returns:
+        numpy.ndarray: float32 matrix of percent similarities (a
+        ``numpy.memmap`` when ``out`` is a path). Pairs with nothing to
+        align (empty sequences) are NaN.
+    """
+    if tile_size < 1:
+        raise ValueError('tile_size must be at least 1')
+    seqs = list(seqs)
+    library = list(library) if library is not None else None
+    shape = (len(seqs), len(seqs) if library is None else len(library))
+    matrix = _output(out, shape, np.float32)
+    tiles = imap_ordered(partial(_score_tile, mode=mode), _tiles(seqs, library, tile_size),
+                         n_jobs=n_jobs, max_pending=max_pending)
+    return _fill(matrix, tiles, symmetric=library is None)
+
+
+def is_similar_matrix(
+    seqs: Sequence[str],
+    library: Optional[Sequence[str]] = None,
+    min_identity: float = 90.0,
+    mode: str = 'blastp',
+    n_jobs: int = 1,
+    tile_size: int = 128,
+    out: Union[None, str, os.PathLike, np.ndarray] = None,
+    max_pending: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Boolean matrix of ``is_similar`` between many sequences.
+
+    Like ``similarity_matrix``, but each tile first computes the upper bound
+    of every pair from residue composition and length, and aligns only the
+    pairs that can reach ``min_identity``. For redundancy filtering, where
+    most pairs are far apart, this skips most alignments.
+
+    Args:
+        seqs: Sequences (rows).
+        library: Optional library sequences (columns).
+        min_identity: Threshold in percent, as returned by
+            ``calc_percent_similarity``.
+        mode: The alignment mode passed to ``calc_percent_similarity``.
+        n_jobs: Number of worker processes; -1 uses all CPUs.
+        tile_size: Rows and columns per tile.
+        out: None, a path for a memory-mapped ``.npy`` file, or an existing
+            array of the right shape.
+        max_pending: Maximum number of tiles in flight on the pool.
+
+    Returns:
+        numpy.ndarray: bool matrix, True where the similarity reaches
+        ``min_identity``. Pairs with an empty sequence are False.
+    """
+    if tile_size < 1:
+        raise ValueError('tile_size must be at least 1')
+    seqs = list(seqs)
+    library = list(library) if library is not None else None
+    shape = (len(seqs), len(seqs) if library is None else len(library))
+    matrix = _output(out, shape, bool)
+    tiles = imap_ordered(partial(_match_tile, mode=mode, min_identity=min_identity),
+                         _tiles(seqs, library, tile_size),
+                         n_jobs=n_jobs, max_pending=max_pending)
+    return _fill(matrix, tiles, symmetric=library is None)
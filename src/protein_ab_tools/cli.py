@@ -0,0 +1,106 @@
+"""
+Command-line entry point: ``pat-number``.
+"""
+import argparse
+import contextlib
+import sys
+from typing import List, Optional
+
+from .ab_analysis.cache import NumberingCache
+from .ab_analysis.prefilter import Prefilter
+from .pipeline import merge_shards, run_pipeline, run_sharded_pipeline
+from .seqio import INPUT_FORMATS, OUTPUT_FORMATS, format_from_path
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='pat-number',
+        description='Number antibody sequences and write regions, numbered '
+                    'sequences and species as a table.')
+    parser.add_argument('input', nargs='?', default='-',
+                        help="FASTA, FASTQ, CSV or TSV file (optionally gzipped); '-' for stdin")
+    parser.add_argument('-o', '--output', default='-',
+                        help="CSV, TSV or Parquet file; '-' for stdout (default)")
+    parser.add_argument('--input-format', choices=INPUT_FORMATS,
+                        help='input format (default: from extension or first line)')
+    parser.add_argument('--output-format', choices=OUTPUT_FORMATS,
+                        help='output format (default: from extension, else csv)')
+    parser.add_argument('--seq-column', default='sequence',
+                        help='sequence column of CSV/TSV input (default: sequence)')
+    parser.add_argument('--name-column',
+                        help='name column of CSV/TSV input (default: row number)')
+    parser.add_argument('-s', '--scheme', default='imgt',
+                        choices=['imgt', 'kabat', 'chothia', 'abm', 'martin', 'aho'])
+    parser.add_argument('-c', '--chain', default='H', choices=['H', 'L', 'auto'],
+                        help="chain to number; 'auto' detects heavy and light chains "
+                             "(default: H)")
+    parser.add_argument('--germline', action='store_true',
+                        help='also assign V and J germline genes')
+    parser.add_argument('--species', nargs='+',
+                        help='species allowed by ANARCI (default: human mouse)')
+    parser.add_argument('-b', '--batch-size', type=int,
+                        help='sequences numbered per batch (default: 1000 per worker)')
+    parser.add_argument('-j', '--n-jobs', type=int, default=1,
+                        help='worker processes; -1 for all CPUs (default: 1)')
+    parser.add_argument('--cache', help='SQLite numbering cache file')
+    parser.add_argument('--prefilter', action='store_true',
+                        help='reject sequences without V-domain length, alphabet and '
+                             'framework motif before numbering')
+    parser.add_argument('--min-length', type=int, default=70,
+                        help='shortest sequence kept by --prefilter (default: 70)')
+    parser.add_argument('--no-motif', action='store_true',
+                        help='do not require the Cys-Trp framework motif with --prefilter')
+    parser.add_argument('--shards', metavar='DIR',
+                        help='write the output to DIR as committed shards with a manifest; '
+                             'running the same command again resumes an interrupted job. '
+                             'With -o, the shards are also merged into that file')
+    parser.add_argument('--shard-size', type=int, default=100_000,
+                        help='sequences per shard with --shards (default: 100000)')
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    cache = NumberingCache(args.cache) if args.cache else None
+    prefilter = None
+    if args.prefilter:
+        prefilter = Prefilter(min_length=args.min_length, check_motif=not args.no_motif)
+    output = sys.stdout if args.output == '-' else args.output
+    options = dict(
+        input_format=args.input_format,
+        seq_column=args.seq_column,
+        name_column=args.name_column,
+        scheme=args.scheme,
+        chain=args.chain,
+        germline=args.germline,
+        species=args.species,
+        batch_size=args.batch_size,
+        n_jobs=args.n_jobs,
+        cache=cache,
+        prefilter=prefilter)
+    # anarci prints progress messages to stdout; keep them out of the table.
+    with contextlib.redirect_stdout(sys.stderr):
+        if args.shards:
+            shard_format = (args.output_format
+                            or (format_from_path(args.output) if args.output != '-' else None)
+                            or 'csv')
+            counts = run_sharded_pipeline(args.input, args.shards, shard_size=args.shard_size,
+                                          output_format=shard_format, **options)
+        else:
+            counts = run_pipeline(args.input, output, output_format=args.output_format,
+                                  **options)
+    if args.shards and args.output != '-':
+        merge_shards(args.shards, output, output_format=args.output_format)
+    print(f"numbered {counts['n_numbered']} of {counts['n_input']} sequences "
+          f"({counts['n_failed']} failed)", file=sys.stderr)
+    if prefilter is not None:
+        stats = prefilter.stats()
+        reasons = ', '.join(f'{reason}: {n}' for reason, n in stats.items()
+                            if reason not in ('n_checked', 'n_rejected') and n)
+        print(f"prefilter rejected {stats['n_rejected']} of {stats['n_checked']} distinct "
+              f"sequences" + (f' ({reasons})' if reasons else ''), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
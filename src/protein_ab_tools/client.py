@@ -0,0 +1,260 @@
+"""
+Client of the local numbering server (``pat-server``).
+
+``connect`` (or the ``PAT_SERVER`` environment variable) makes
+``run_numbering``, ``run_numbering_batch`` and the functions built on them
+send their work to a running server instead of loading anarci in this
+process. When no server answers, they number locally as usual.
+"""
+import http.client
+import json
+import os
+import socket
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+from .ab_analysis.numbering import NumberingRecord
+
+ENV_VAR = 'PAT_SERVER'
+
+# Seconds before an unreachable server is tried again.
+RETRY_INTERVAL = 5.0
+
+
+class ServerError(RuntimeError):
+    """The server failed to handle a request."""
+
+
+class ServerConnectionError(ConnectionError):
+    """The server's response was cut off or could not be read."""
+
+
+def default_socket_path() -> str:
+    """``$XDG_RUNTIME_DIR/pat-server.sock``, else a per-user path in /tmp."""
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return os.path.join(runtime_dir, 'pat-server.sock')
+    return f'/tmp/pat-server-{os.getuid()}.sock'
+
+
+def parse_address(address: str) -> Tuple[str, object]:
+    """
+    ``('tcp', (host, port))`` for ``'http://host:port'`` or ``'host:port'``,
+    otherwise ``('unix', path)``.
+    """
+    if address.startswith('http://'):
+        parts = urlsplit(address)
+        return 'tcp', (parts.hostname or '127.0.0.1', parts.port or 80)
+    host, _, port = address.rpartition(':')
+    if host and port.isdigit() and '/' not in address:
+        return 'tcp', (host, int(port))
+    return 'unix', address
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float):
+        super().__init__('localhost', timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.path)
+        self.sock = sock
+
+
+def _decode_numbering(numbering) -> list:
+    return [((number, insertion), aa) for (number, insertion), aa in numbering]
+
+
+def _decode_details(details: dict) -> dict:
+    details = dict(details)
+    if 'germlines' in details:
+        details['germlines'] = {segment: [tuple(call) if call is not None else None, identity]
+                                for segment, (call, identity) in details['germlines'].items()}
+    return details
+
+
+def decode_result(data) -> tuple:
+    """Turn a JSON-decoded numbering result back into ``run_numbering``'s tuples."""
+    numbered, details, hits = data
+    numbered = [[(_decode_numbering(n), start, end) for n, start, end in domains]
+                if domains is not None else None for domains in numbered]
+    details = [[_decode_details(d) for d in domains] if domains is not None else None
+               for domains in details]
+    return numbered, details, hits
+
+
+class NumberingClient:
+    """
+    Connection to a numbering server over a Unix socket or localhost HTTP.
+
+    One keep-alive connection is opened per process and reused; calls from
+    several threads are serialised.
+
+    Args:
+        address: Socket path, ``host:port`` or ``http://host:port``.
+        timeout: Seconds to wait for a response.
+    """
+
+    def __init__(self, address: str, timeout: float = 600.0):
+        self.address = address
+        self.timeout = timeout
+        self._kind, self._target = parse_address(address)
+        self._conn = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f'NumberingClient({self.address!r})'
+
+    def _connection(self) -> http.client.HTTPConnection:
+        if self._conn is None or self._pid != os.getpid():
+            if self._kind == 'unix':
+                self._conn = _UnixHTTPConnection(self._target, self.timeout)
+            else:
+                self._conn = http.client.HTTPConnection(*self._target, timeout=self.timeout)
+            self._pid = os.getpid()
+        return self._conn
+
+    def request(self, method: str, path: str, payload: Optional[dict] = None) -> dict:
+        """Send one request and return the decoded JSON response."""
+        body = json.dumps(payload).encode() if payload is not None else None
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        with self._lock:
+            for attempt in (0, 1):
+                conn = self._connection()
+                try:
+                    conn.request(method, path, body=body, headers=headers)
+                    response = conn.getresponse()
+                    data = json.loads(response.read() or b'{}')
+                    break
+                except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                    # The server closed an idle keep-alive connection.
+                    conn.close()
+                    self._conn = None
+                    if attempt:
+                        raise
+                except (OSError, http.client.HTTPException, ValueError) as e:
+                    conn.close()
+                    self._conn = None
+                    if isinstance(e, OSError):
+                        raise
+                    # An OSError, so callers need not import http.client to catch it.
+                    raise ServerConnectionError(
+                        f'Malformed response from {self.address}: {e!r}') from e
+        if response.status == 422:
+            raise ValueError(data.get('error'))
+        if response.status != 200:
+            raise ServerError(data.get('error', f'HTTP {response.status}'))
+        return data
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def ping(self) -> dict:
+        return self.request('GET', '/ping')
+
+    def stats(self) -> dict:
+        """Request counts, batching and cache statistics of the server."""
+        return self.request('GET', '/stats')
+
+    def number(self, seq: str, name: Optional[str] = None, scheme: str = 'imgt',
+               chain: str = 'H', germline: bool = False,
+               species: Optional[List[str]] = None) -> tuple:
+        """``run_numbering`` on the server."""
+        data = self.request('POST', '/number', {'seq': seq, 'name': name, 'scheme': scheme,
+                                                'chain': chain, 'germline': germline,
+                                                'species': species})
+        return decode_result(data['result'])
+
+    def number_records(self, items: Sequence[Tuple[str, str]], scheme: str = 'imgt',
+                       chain: str = 'H', germline: bool = False,
+                       species: Optional[List[str]] = None) -> List[NumberingRecord]:
+        """Number (name, seq) pairs on the server, one record per pair."""
+        data = self.request('POST', '/number_batch',
+                            {'items': [list(item) for item in items], 'scheme': scheme,
+                             'chain': chain, 'germline': germline, 'species': species})
+        return [NumberingRecord(name, seq, error=error,
+                                result=decode_result(result) if result is not None else None)
+                for (name, seq), (result, error) in zip(items, data['records'])]
+
+    def regions(self, seq: str, scheme: str = 'imgt', chain: str = 'H') -> Dict[str, str]:
+        """``extract_regions`` on the server."""
+        return self.request('POST', '/regions',
+                            {'seq': seq, 'scheme': scheme, 'chain': chain})['regions']
+
+    def similarity(self, seq1: str, seq2: str, mode: str = 'blastp') -> float:
+        """``calc_percent_similarity`` on the server."""
+        return self.request('POST', '/similarity',
+                            {'seq1': seq1, 'seq2': seq2, 'mode': mode})['similarity']
+
+
+_active = {'client': None, 'address': None, 'checked': None}
+_local = threading.local()
+
+
+def number_locally():
+    """
+    Never route calls made from the current thread to a server. Used by the
+    server's own workers, which must not send their work back to it.
+    """
+    _local.disabled = True
+
+
+def connect(address: Optional[str] = None) -> NumberingClient:
+    """
+    Route numbering calls of this process to the server at ``address``
+    (default: ``PAT_SERVER``, else ``default_socket_path()``). Raises
+    ``ConnectionError`` if the server does not answer.
+    """
+    address = address or os.environ.get(ENV_VAR) or default_socket_path()
+    client = NumberingClient(address)
+    try:
+        client.ping()
+    except OSError as e:
+        raise ConnectionError(f'No numbering server at {address}: {e}') from e
+    _active.update(client=client, address=address, checked=time.monotonic())
+    return client
+
+
+def disconnect():
+    """Number locally again."""
+    if _active['client'] is not None:
+        _active['client'].close()
+    _active.update(client=None, address=None, checked=None)
+
+
+def active_client() -> Optional[NumberingClient]:
+    """
+    The client numbering calls are routed to, or None to number locally.
+    With only ``PAT_SERVER`` set, the server is looked up on first use and
+    again every ``RETRY_INTERVAL`` seconds while it is not running.
+    """
+    if getattr(_local, 'disabled', False):
+        return None
+    if _active['client'] is not None:
+        return _active['client']
+    address = os.environ.get(ENV_VAR)
+    if not address:
+        return None
+    checked = _active['checked']
+    if (_active['address'] == address and checked is not None
+            and time.monotonic() - checked < RETRY_INTERVAL):
+        return None
+    try:
+        return connect(address)
+    except ConnectionError:
+        _active.update(client=None, address=address, checked=time.monotonic())
+        return None
+
+
+def release(client: NumberingClient):
+    """Stop routing to ``client`` after it failed, so calls fall back to local numbering."""
+    if _active['client'] is client:
+        client.close()
+        _active.update(client=None, checked=time.monotonic())
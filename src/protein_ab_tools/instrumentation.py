@@ -0,0 +1,325 @@
+"""
+Low-overhead instrumentation of the hot paths, off by default.
+
+Once ``enable()`` is called, or in processes started with the
+``PAT_INSTRUMENT`` environment variable set to 1, the package records
+per-stage timers and event counters in the current process:
+
+==========================  ==================================================
+Stage / counter             Recorded
+==========================  ==================================================
+``anarci``                  anarci calls (HMMER search and numbering)
+``germline``                batch germline assignment (``germline=True``)
+``numbering_batch``         ``run_numbering_batch`` numbering, wall time
+``server``                  requests routed to a numbering server
+``regions``                 region extraction from numbered domains
+``alignment``               ``calc_percent_similarity``; its calls are the
+                            alignments run
+``sequences_numbered``      sequences numbered successfully
+``numbering_failures``      sequences that could not be numbered
+``prefilter_rejections``    sequences rejected by a ``Prefilter``
+``cache_hits``              ``NumberingCache`` lookups found / not found
+``cache_misses``
+==========================  ==================================================
+
+Worker processes (``n_jobs`` > 1) keep their own records, so the
+``anarci`` stage only covers numbering done in this process; the
+``numbering_batch`` stage and the counters cover all of it.
+
+``stats()`` returns a snapshot, callbacks added with ``add_callback`` get a
+snapshot periodically (``PrometheusExporter`` writes one as Prometheus text),
+and ``profile()`` runs cProfile, or a sampling profiler, over one block.
+"""
+import atexit
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+ENV_VAR = 'PAT_INSTRUMENT'
+
+_enabled = os.environ.get(ENV_VAR, '') not in ('', '0')
+_lock = threading.Lock()
+# stage -> [calls, total seconds, max seconds]
+_timers: Dict[str, List[float]] = {}
+_counters: Counter = Counter()
+_started = time.time()
+# [callback, interval, next report time]
+_callbacks: List[list] = []
+
+
+def enable():
+    """Start recording timers and counters in this process."""
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    """Stop recording; what was recorded so far is kept."""
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset():
+    """Clear all timers and counters."""
+    global _started
+    with _lock:
+        _timers.clear()
+        _counters.clear()
+        _started = time.time()
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ('stage', 'start')
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+def timer(stage: str):
+    """
+    Context manager timing a block as ``stage``. When instrumentation is
+    off it returns a shared no-op, so timed hot paths cost one call.
+    """
+    return _Timer(stage) if _enabled else _NULL_TIMER
+
+
+def timed(stage: str):
+    """Decorator timing every call of the function as ``stage``."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(stage, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+def record(stage: str, seconds: float):
+    """Add one timed call of ``stage``."""
+    if not _enabled:
+        return
+    with _lock:
+        entry = _timers.get(stage)
+        if entry is None:
+            _timers[stage] = [1, seconds, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+            if seconds > entry[2]:
+                entry[2] = seconds
+    if _callbacks:
+        _maybe_report()
+
+
+def count(name: str, n: int = 1):
+    """Add ``n`` to the counter ``name``."""
+    if _enabled and n:
+        with _lock:
+            _counters[name] += n
+        if _callbacks:
+            _maybe_report()
+
+
+def stats() -> dict:
+    """
+    Snapshot of what has been recorded::
+
+        {'enabled': True, 'started': <unix time>, 'pid': ...,
+         'timers': {stage: {'calls', 'total_s', 'mean_s', 'max_s'}},
+         'counters': {name: value}}
+    """
+    with _lock:
+        timers = {stage: {'calls': int(calls), 'total_s': total, 'mean_s': total / calls,
+                          'max_s': longest}
+                  for stage, (calls, total, longest) in sorted(_timers.items())}
+        counters = dict(sorted(_counters.items()))
+    return {'enabled': _enabled, 'started': _started, 'pid': os.getpid(),
+            'timers': timers, 'counters': counters}
+
+
+def add_callback(callback: Callable[[dict], None], interval: float = 60.0):
+    """
+    Call ``callback(stats())`` at most every ``interval`` seconds while
+    timers or counters are recorded, and once at exit. Use ``report()`` to call it now.
+    """
+    with _lock:
+        _callbacks.append([callback, interval, time.monotonic() + interval])
+
+
+def remove_callback(callback: Callable[[dict], None]):
+    with _lock:
+        _callbacks[:] = [entry for entry in _callbacks if entry[0] is not callback]
+
+
+def report():
+    """Call every callback with the current snapshot."""
+    snapshot = stats()
+    for callback, _, _ in list(_callbacks):
+        callback(snapshot)
+
+
+def _maybe_report():
+    now = time.monotonic()
+    due = []
+    with _lock:
+        for entry in _callbacks:
+            if now >= entry[2]:
+                entry[2] = now + entry[1]
+                due.append(entry[0])
+    if due:
+        snapshot = stats()
+        for callback in due:
+            callback(snapshot)
+
+
+@atexit.register
+def _report_at_exit():
+    if _callbacks and (_timers or _counters):
+        report()
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus_text(snapshot: dict, prefix: str = 'pat') -> str:
+    """A ``stats()`` snapshot in the Prometheus text exposition format."""
+    lines = []
+    metrics = [
+        ('stage_calls_total', 'counter', 'Timed calls per stage.', 'calls'),
+        ('stage_seconds_total', 'counter', 'Seconds spent per stage.', 'total_s'),
+        ('stage_max_seconds', 'gauge', 'Longest call per stage.', 'max_s'),
+    ]
+    for name, kind, help_text, field in metrics:
+        lines += [f'# HELP {prefix}_{name} {help_text}', f'# TYPE {prefix}_{name} {kind}']
+        for stage, timer_stats in snapshot['timers'].items():
+            lines.append(f'{prefix}_{name}{{stage="{_escape(stage)}"}} {timer_stats[field]!r}')
+    for name, value in snapshot['counters'].items():
+        lines += [f'# TYPE {prefix}_{name}_total counter', f'{prefix}_{name}_total {value}']
+    return '\n'.join(lines) + '\n'
+
+
+class PrometheusExporter:
+    """
+    Metrics callback writing snapshots as Prometheus text to ``path``, e.g.
+    for the node_exporter textfile collector. The file is replaced
+    atomically, so scrapers never see a partial file.
+
+    Args:
+        path: File to write.
+        prefix: Prefix of the metric names.
+    """
+
+    def __init__(self, path: str, prefix: str = 'pat'):
+        self.path = path
+        self.prefix = prefix
+
+    def __repr__(self):
+        return f'PrometheusExporter({self.path!r})'
+
+    def __call__(self, snapshot: dict):
+        tmp_path = f'{self.path}.tmp{os.getpid()}'
+        with open(tmp_path, 'w') as f:
+            f.write(prometheus_text(snapshot, self.prefix))
+        os.replace(tmp_path, self.path)
+
+
+class _Sampler:
+    """Sample the stack of one thread every ``interval`` seconds."""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:'
+                             f'{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+@contextmanager
+def profile(path: Optional[str] = None, mode: str = 'cprofile',
+            interval: float = 0.001) -> Iterator[object]:
+    """
+    Profile the block. With ``mode='cprofile'`` it yields the
+    ``cProfile.Profile``, whose stats are saved to ``path`` for ``pstats``
+    or snakeviz. With ``mode='sample'`` the calling thread's stack is
+    sampled every ``interval`` seconds, which slows it down far less; it
+    yields a ``Counter`` of stacks, saved to ``path`` in the folded format
+    of flamegraph.pl and speedscope.
+    """
+    if mode == 'cprofile':
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield profiler
+        finally:
+            profiler.disable()
+            if path is not None:
+                profiler.dump_stats(path)
+    elif mode == 'sample':
+        sampler = _Sampler(threading.get_ident(), interval)
+        sampler.start()
+        try:
+            yield sampler.stacks
+        finally:
+            sampler.stop()
+            if path is not None:
+                with open(path, 'w') as f:
+                    for stack, samples in sampler.stacks.most_common():
+                        f.write(f'{stack} {samples}\n')
+    else:
+        raise ValueError(f"mode must be 'cprofile' or 'sample', not {mode!r}")
@@ -0,0 +1,102 @@
+"""
+Process-pool helpers shared by the batch APIs.
+"""
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Sequence
+
+# (n_jobs, executor) of the innermost active ``worker_pool`` block.
+_shared_pool = None
+
+
+def resolve_n_jobs(n_jobs: Optional[int]) -> int:
+    """
+    Turn an ``n_jobs`` argument into a worker count.
+
+    ``None`` or 1 means serial, -1 means one worker per CPU and other
+    negative values count back from the CPU count (-2 leaves one CPU free).
+    """
+    if n_jobs is None or n_jobs == 0:
+        return 1
+    if n_jobs < 0:
+        return max(1, (os.cpu_count() or 1) + 1 + n_jobs)
+    return n_jobs
+
+
+def chunked(items: Sequence, chunk_size: int) -> List[Sequence]:
+    """Split ``items`` into consecutive slices of at most ``chunk_size``."""
+    if chunk_size < 1:
+        raise ValueError('chunk_size must be at least 1')
+    return [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+
+@contextmanager
+def worker_pool(n_jobs: Optional[int]) -> Iterator[None]:
+    """
+    Run every ``imap_ordered`` call with ``n_jobs`` workers made inside the
+    block on one process pool, instead of starting a pool per call. Use it
+    around loops that process a stream in batches. Serial work (one
+    worker) and blocks nested in another ``worker_pool`` start no pool.
+    """
+    global _shared_pool
+    n_jobs = resolve_n_jobs(n_jobs)
+    if n_jobs == 1 or _shared_pool is not None:
+        yield
+        return
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        _shared_pool = (n_jobs, executor)
+        try:
+            yield
+        finally:
+            _shared_pool = None
+
+
+def _submit_ordered(executor, func, chunks, max_pending) -> Iterator[Any]:
+    pending = deque()
+    for chunk in chunks:
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+        pending.append(executor.submit(func, chunk))
+    while pending:
+        yield pending.popleft().result()
+
+
+def imap_ordered(
+    func: Callable[[Any], Any],
+    chunks: Iterable[Any],
+    n_jobs: Optional[int] = 1,
+    max_pending: Optional[int] = None,
+) -> Iterator[Any]:
+    """
+    Apply ``func`` to each chunk on a process pool, yielding results in input order.
+
+    Args:
+        func: A picklable callable taking one chunk.
+        chunks: Work items. Consumed lazily, so it may be a generator.
+        n_jobs: Number of worker processes (see ``resolve_n_jobs``).
+        max_pending: Upper bound on chunks submitted but not yet yielded.
+            Defaults to twice the number of workers, which keeps every
+            worker busy without queueing the whole input in memory.
+
+    Yields:
+        The result of ``func`` for each chunk, in the order of ``chunks``.
+
+    Inside a ``worker_pool`` block with the same number of workers, its
+    pool is used.
+    """
+    n_jobs = resolve_n_jobs(n_jobs)
+    if n_jobs == 1:
+        for chunk in chunks:
+            yield func(chunk)
+        return
+    if max_pending is None:
+        max_pending = 2 * n_jobs
+    if max_pending < 1:
+        raise ValueError('max_pending must be at least 1')
+    if _shared_pool is not None and _shared_pool[0] == n_jobs:
+        yield from _submit_ordered(_shared_pool[1], func, chunks, max_pending)
+        return
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        yield from _submit_ordered(executor, func, chunks, max_pending)
@@ -0,0 +1,345 @@
+"""
+Streaming numbering pipeline: sequences in, one annotation row per sequence out.
+
+Input is read lazily and numbered in batches of ``batch_size``, and each batch
+is written before the next one is read, so memory use does not depend on the
+size of the input. With ``n_jobs`` > 1 all batches are numbered on one process
+pool, started once for the whole stream.
+"""
+import json
+import os
+from dataclasses import fields
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Literal, Optional, Tuple
+
+from .ab_analysis.cache import NumberingCache
+from .ab_analysis.numbering import run_numbering_batch
+from .ab_analysis.prefilter import Prefilter
+from .ab_analysis.regions import region_chain, region_table, regions_from_numbering_batch
+from .parallel import resolve_n_jobs, worker_pool
+from .seqio import OUTPUT_FORMATS, TableWriter, format_from_path, read_rows, read_sequences
+
+
+# Default sequences per batch and worker: each worker gets one anarci call of
+# this size per batch.
+BATCH_SIZE = 1000
+
+
+def _batch_size(batch_size: Optional[int], n_jobs: int) -> int:
+    return batch_size if batch_size is not None else BATCH_SIZE * resolve_n_jobs(n_jobs)
+
+
+def batched(iterable: Iterable, size: int) -> Iterator[list]:
+    """Yield lists of up to ``size`` consecutive items."""
+    if size < 1:
+        raise ValueError('batch size must be at least 1')
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _region_chains(chain: str) -> List[str]:
+    return ['H', 'L'] if chain == 'auto' else [chain]
+
+
+def annotation_columns(scheme: str = 'imgt',
+                       chain: Literal['H', 'L', 'auto'] = 'H',
+                       germline: bool = False) -> List[str]:
+    """
+    Output columns of the pipeline for the given options. With
+    ``chain='auto'`` there are heavy and light region columns, and each row
+    fills those of its chain.
+    """
+    columns = ['name', 'sequence', 'chain_type', 'species']
+    if germline:
+        columns += ['v_gene', 'v_identity', 'j_gene', 'j_identity']
+    columns.append('numbered_seq')
+    for table_chain in _region_chains(chain):
+        columns += region_table(scheme, table_chain).keys
+    columns.append('error')
+    return columns
+
+
+def _germline_fields(details: dict) -> Dict[str, object]:
+    fields = {}
+    for segment in ('v', 'j'):
+        call, identity = details.get('germlines', {}).get(f'{segment}_gene', (None, None))
+        fields[f'{segment}_gene'] = call[1] if call else None
+        fields[f'{segment}_identity'] = round(identity, 4) if identity is not None else None
+    return fields
+
+
+def iter_annotation_rows(
+    records: Iterable[Tuple[str, str]],
+    scheme: str = 'imgt',
+    chain: Literal['H', 'L', 'auto'] = 'H',
+    germline: bool = False,
+    species: Optional[List[str]] = None,
+    batch_size: Optional[int] = None,
+    n_jobs: int = 1,
+    cache: Optional[NumberingCache] = None,
+    prefilter: Optional[Prefilter] = None,
+) -> Iterator[List[Dict[str, object]]]:
+    """
+    Number (name, sequence) pairs in batches and yield one list of rows per
+    batch. Rows have the keys of ``annotation_columns``; sequences that
+    could not be numbered, or were rejected by ``prefilter``, get a row
+    with only ``name``, ``sequence`` and ``error`` filled in.
+
+    ``batch_size`` defaults to ``BATCH_SIZE`` sequences per worker. All
+    batches share one pool of ``n_jobs`` worker processes.
+    """
+    for table_chain in _region_chains(chain):
+        region_table(scheme, table_chain)
+    with worker_pool(n_jobs):
+        for batch in batched(records, _batch_size(batch_size, n_jobs)):
+            yield _annotation_rows(batch, scheme, chain, germline, species, n_jobs, cache,
+                                   prefilter)
+
+
+def _annotation_rows(batch, scheme, chain, germline, species, n_jobs, cache,
+                     prefilter) -> List[Dict[str, object]]:
+    names = [name for name, _ in batch]
+    numbered = run_numbering_batch([seq for _, seq in batch], names=names, scheme=scheme,
+                                   chain=chain, germline=germline, species=species,
+                                   n_jobs=n_jobs, cache=cache, prefilter=prefilter)
+    ok = [record for record in numbered if record.ok]
+    chains = [chain if chain != 'auto' else region_chain(record.result[1][0][0]['chain_type'])
+              for record in ok]
+    # Heavy and light domains use different region tables.
+    ok_regions = [None] * len(ok)
+    for table_chain in _region_chains(chain):
+        indices = [i for i, c in enumerate(chains) if c == table_chain]
+        batch_regions = regions_from_numbering_batch(
+            [ok[i].result[0][0][0][0] for i in indices], scheme, table_chain)
+        for i, record_regions in zip(indices, batch_regions):
+            ok_regions[i] = record_regions
+    regions = iter(ok_regions)
+    rows = []
+    for record in numbered:
+        row = {'name': record.name, 'sequence': record.seq}
+        if record.ok:
+            details = record.result[1][0][0]
+            row['chain_type'] = details['chain_type']
+            row['species'] = details['species']
+            if germline:
+                row.update(_germline_fields(details))
+            row['numbered_seq'] = ''.join([aa for _, aa in record.result[0][0][0][0]])
+            row.update(next(regions))
+        else:
+            row['error'] = record.error
+        rows.append(row)
+    return rows
+
+
+def run_pipeline(
+    input_path: str = '-',
+    output_path='-',
+    input_format: Optional[str] = None,
+    output_format: Optional[str] = None,
+    seq_column: str = 'sequence',
+    name_column: Optional[str] = None,
+    scheme: str = 'imgt',
+    chain: Literal['H', 'L', 'auto'] = 'H',
+    germline: bool = False,
+    species: Optional[List[str]] = None,
+    batch_size: Optional[int] = None,
+    n_jobs: int = 1,
+    cache: Optional[NumberingCache] = None,
+    prefilter: Optional[Prefilter] = None,
+) -> Dict[str, int]:
+    """
+    Number every sequence of a FASTA/FASTQ/CSV/TSV file and write regions,
+    numbered sequences and species to a CSV/TSV/Parquet file.
+
+    ``'-'`` reads from stdin or writes to stdout, and ``output_path`` may
+    also be an open text stream. Formats are guessed from the file
+    extensions when not given.
+
+    Returns:
+        dict: Counts of sequences read, numbered and failed.
+    """
+    columns = annotation_columns(scheme, chain, germline)
+    records = read_sequences(input_path, fmt=input_format,
+                             seq_column=seq_column, name_column=name_column)
+    counts = {'n_input': 0, 'n_numbered': 0, 'n_failed': 0}
+    with TableWriter(output_path, columns, fmt=output_format) as writer:
+        for rows in iter_annotation_rows(records, scheme=scheme, chain=chain,
+                                         germline=germline, species=species,
+                                         batch_size=batch_size, n_jobs=n_jobs, cache=cache,
+                                         prefilter=prefilter):
+            writer.write_rows(rows)
+            failed = sum(1 for row in rows if row.get('error'))
+            counts['n_input'] += len(rows)
+            counts['n_failed'] += failed
+            counts['n_numbered'] += len(rows) - failed
+    return counts
+
+
+MANIFEST = 'manifest.json'
+_MANIFEST_VERSION = 1
+
+
+def _write_json_atomic(path: str, data: dict):
+    """Write ``data`` to a temporary file and rename it over ``path``."""
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as handle:
+        json.dump(data, handle, indent=1)
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(tmp, path)
+
+
+def _fsync(path: str):
+    with open(path, 'rb') as handle:
+        os.fsync(handle.fileno())
+
+
+def _job_spec(input_path: str, **options) -> dict:
+    """What identifies a sharded job: its input file and the options that change its output."""
+    stat = os.stat(input_path)
+    prefilter = options.pop('prefilter')
+    if prefilter is not None:
+        prefilter = {f.name: getattr(prefilter, f.name) for f in fields(prefilter) if f.init}
+    spec = {'input': {'path': os.path.abspath(input_path), 'size': stat.st_size,
+                      'mtime_ns': stat.st_mtime_ns},
+            'prefilter': prefilter, **options}
+    # Round-trip so the spec compares equal to one read back from a manifest.
+    return json.loads(json.dumps(spec))
+
+
+def _load_manifest(output_dir: str, job: dict) -> dict:
+    """
+    The manifest of a previous run of ``job`` in ``output_dir``, keeping
+    only the shards whose files still exist, or a new manifest.
+    """
+    path = os.path.join(output_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {'format': _MANIFEST_VERSION, 'job': job, 'complete': False, 'shards': []}
+    with open(path) as handle:
+        manifest = json.load(handle)
+    if manifest.get('format') != _MANIFEST_VERSION:
+        raise ValueError(f'Unsupported manifest format: {manifest.get("format")}')
+    if manifest['job'] != job:
+        raise ValueError(f'{output_dir} holds the output of a different job (input file or '
+                         'options changed); use a new output directory')
+    shards = []
+    for shard in manifest['shards']:
+        if not os.path.exists(os.path.join(output_dir, shard['file'])):
+            manifest['complete'] = False
+            break
+        shards.append(shard)
+    manifest['shards'] = shards
+    return manifest
+
+
+def _shard_counts(shards: List[dict]) -> Dict[str, int]:
+    return {key: sum(shard[key] for shard in shards)
+            for key in ('n_input', 'n_numbered', 'n_failed')}
+
+
+def run_sharded_pipeline(
+    input_path: str,
+    output_dir: str,
+    shard_size: int = 100_000,
+    output_format: str = 'csv',
+    input_format: Optional[str] = None,
+    seq_column: str = 'sequence',
+    name_column: Optional[str] = None,
+    scheme: str = 'imgt',
+    chain: Literal['H', 'L', 'auto'] = 'H',
+    germline: bool = False,
+    species: Optional[List[str]] = None,
+    batch_size: Optional[int] = None,
+    n_jobs: int = 1,
+    cache: Optional[NumberingCache] = None,
+    prefilter: Optional[Prefilter] = None,
+) -> Dict[str, int]:
+    """
+    ``run_pipeline`` for long jobs: the output is written to ``output_dir``
+    as numbered shard files of ``shard_size`` input sequences
+    (``part-00000.csv``, ...) plus a ``manifest.json`` listing the shards
+    that are complete.
+
+    Each shard is written to a temporary file and renamed into place once
+    complete, and only then added to the manifest, so an interrupted run
+    never leaves a partial shard behind. Running the same job again skips
+    the shards in the manifest and continues with the next one; the shards
+    are the same as those of an uninterrupted run. The manifest records the
+    input file (path, size and modification time) and the options that
+    change the output, and a run with a different input or options is
+    refused. Use ``merge_shards`` to combine the shards into one table.
+
+    All shards share one pool of ``n_jobs`` worker processes.
+
+    Returns:
+        dict: Counts of sequences read, numbered and failed over all shards.
+    """
+    if input_path == '-':
+        raise ValueError('A sharded job needs an input file to resume from, not stdin')
+    if shard_size < 1:
+        raise ValueError('shard_size must be at least 1')
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f'Unsupported output format: {output_format}')
+    job = _job_spec(input_path, input_format=input_format, seq_column=seq_column,
+                    name_column=name_column, scheme=scheme, chain=chain, germline=germline,
+                    species=species, shard_size=shard_size, output_format=output_format,
+                    prefilter=prefilter)
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = _load_manifest(output_dir, job)
+    manifest_path = os.path.join(output_dir, MANIFEST)
+    if not manifest['complete']:
+        columns = annotation_columns(scheme, chain, germline)
+        done = manifest['shards']
+        start = sum(shard['n_input'] for shard in done)
+        records = islice(read_sequences(input_path, fmt=input_format, seq_column=seq_column,
+                                        name_column=name_column), start, None)
+        shards = enumerate(batched(records, shard_size), start=len(done))
+        with worker_pool(n_jobs):
+            for index, shard_records in shards:
+                name = f'part-{index:05d}.{output_format}'
+                path = os.path.join(output_dir, name)
+                counts = {'n_input': 0, 'n_numbered': 0, 'n_failed': 0}
+                with TableWriter(f'{path}.tmp', columns, fmt=output_format) as writer:
+                    for rows in iter_annotation_rows(shard_records, scheme=scheme, chain=chain,
+                                                     germline=germline, species=species,
+                                                     batch_size=batch_size, n_jobs=n_jobs,
+                                                     cache=cache, prefilter=prefilter):
+                        writer.write_rows(rows)
+                        failed = sum(1 for row in rows if row.get('error'))
+                        counts['n_input'] += len(rows)
+                        counts['n_failed'] += failed
+                        counts['n_numbered'] += len(rows) - failed
+                _fsync(f'{path}.tmp')
+                os.replace(f'{path}.tmp', path)
+                done.append({'file': name, 'start': start, **counts})
+                start += counts['n_input']
+                _write_json_atomic(manifest_path, manifest)
+        manifest['complete'] = True
+        _write_json_atomic(manifest_path, manifest)
+    return _shard_counts(manifest['shards'])
+
+
+def merge_shards(output_dir: str, output_path='-', output_format: Optional[str] = None) -> int:
+    """
+    Concatenate the shards of a complete ``run_sharded_pipeline`` job into
+    one table, the same as ``run_pipeline`` would have written.
+
+    Returns:
+        int: Number of rows written.
+    """
+    with open(os.path.join(output_dir, MANIFEST)) as handle:
+        manifest = json.load(handle)
+    if not manifest['complete']:
+        raise ValueError(f'The job in {output_dir} is not complete; run it again to finish it')
+    job = manifest['job']
+    columns = annotation_columns(job['scheme'], job['chain'], job['germline'])
+    if output_format is None and output_path != '-' and not hasattr(output_path, 'write'):
+        output_format = format_from_path(output_path)
+    with TableWriter(output_path, columns, fmt=output_format) as writer:
+        for shard in manifest['shards']:
+            for rows in read_rows(os.path.join(output_dir, shard['file']),
+                                  fmt=job['output_format']):
+                writer.write_rows(rows)
+    return writer.rows_written
+
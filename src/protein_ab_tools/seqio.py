@@ -0,0 +1,253 @@
+"""
+Lazy sequence readers and incremental table writers for the streaming pipeline.
+"""
+import csv
+import gzip
+import importlib.util
+import os
+import sys
+from itertools import chain
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+PYARROW_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+
+INPUT_FORMATS = ('fasta', 'fastq', 'csv', 'tsv')
+OUTPUT_FORMATS = ('csv', 'tsv', 'parquet')
+
+_EXTENSIONS = {
+    '.fa': 'fasta', '.fasta': 'fasta', '.faa': 'fasta', '.fas': 'fasta',
+    '.fq': 'fastq', '.fastq': 'fastq',
+    '.csv': 'csv', '.tsv': 'tsv',
+    '.parquet': 'parquet', '.pq': 'parquet',
+}
+
+
+def _check_pyarrow():
+    """Check if pyarrow is available and raise helpful error if not."""
+    if not PYARROW_AVAILABLE:
+        raise ImportError(
+            "pyarrow is required for parquet output. "
+            "Please install it: pip install pyarrow"
+        )
+
+
+def format_from_path(path: str) -> Optional[str]:
+    """Guess a file format from its extension, ignoring a trailing ``.gz``."""
+    root, ext = os.path.splitext(os.fspath(path).lower())
+    if ext == '.gz':
+        ext = os.path.splitext(root)[1]
+    return _EXTENSIONS.get(ext)
+
+
+def _open_text(path: str, mode: str) -> IO[str]:
+    if path == '-':
+        return sys.stdin if 'r' in mode else sys.stdout
+    if os.fspath(path).endswith('.gz'):
+        return gzip.open(path, mode + 't', newline='')
+    return open(path, mode, newline='')
+
+
+def _header_name(header: str) -> str:
+    """First word of a FASTA/FASTQ header without its marker character."""
+    fields = header[1:].split(None, 1)
+    return fields[0] if fields else ''
+
+
+def read_fasta(lines: Iterable[str]) -> Iterator[Tuple[str, str]]:
+    """Yield (name, sequence) pairs from FASTA lines."""
+    name, parts = None, []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('>'):
+            if name is not None:
+                yield name, ''.join(parts)
+            name, parts = _header_name(line), []
+        elif name is None:
+            raise ValueError('FASTA input must start with a ">" header line')
+        else:
+            parts.append(line)
+    if name is not None:
+        yield name, ''.join(parts)
+
+
+def read_fastq(lines: Iterable[str]) -> Iterator[Tuple[str, str]]:
+    """Yield (name, sequence) pairs from FASTQ lines, ignoring qualities."""
+    lines = (line.rstrip('\r\n') for line in lines)
+    for header in lines:
+        if not header.strip():
+            continue
+        if not header.startswith('@'):
+            raise ValueError(f'Invalid FASTQ header: {header!r}')
+        seq = next(lines, None)
+        plus = next(lines, None)
+        quality = next(lines, None)
+        if seq is None or plus is None or quality is None or not plus.startswith('+'):
+            raise ValueError(f'Truncated FASTQ record: {header!r}')
+        yield _header_name(header), seq.strip()
+
+
+def read_table(lines: Iterable[str],
+               delimiter: str = ',',
+               seq_column: str = 'sequence',
+               name_column: Optional[str] = None) -> Iterator[Tuple[str, str]]:
+    """
+    Yield (name, sequence) pairs from CSV/TSV lines with a header row.
+    Without ``name_column`` the 0-based row number is used as the name.
+    """
+    reader = csv.DictReader(lines, delimiter=delimiter)
+    if reader.fieldnames is None:
+        return
+    for column in (seq_column, name_column):
+        if column is not None and column not in reader.fieldnames:
+            raise ValueError(f'Column {column!r} not found in {reader.fieldnames}')
+    for i, row in enumerate(reader):
+        name = row[name_column] if name_column is not None else str(i)
+        yield name, row[seq_column]
+
+
+def _sniff(lines: Iterator[str]) -> Tuple[str, Iterator[str]]:
+    """Guess the format of a stream from its first non-blank line."""
+    skipped = []
+    for line in lines:
+        skipped.append(line)
+        if line.strip():
+            break
+    first = skipped[-1].lstrip() if skipped else ''
+    if first.startswith('>'):
+        fmt = 'fasta'
+    elif first.startswith('@'):
+        fmt = 'fastq'
+    elif '\t' in first:
+        fmt = 'tsv'
+    else:
+        fmt = 'csv'
+    return fmt, chain(skipped, lines)
+
+
+def read_sequences(path: str = '-',
+                   fmt: Optional[str] = None,
+                   seq_column: str = 'sequence',
+                   name_column: Optional[str] = None) -> Iterator[Tuple[str, str]]:
+    """
+    Lazily yield (name, sequence) pairs from a FASTA, FASTQ, CSV or TSV file.
+
+    Args:
+        path: File path (optionally gzipped) or '-' for stdin.
+        fmt: One of ``INPUT_FORMATS``. Guessed from the extension, or from
+            the first line when reading stdin, if not given.
+        seq_column: Sequence column of CSV/TSV input.
+        name_column: Name column of CSV/TSV input. Defaults to the row number.
+    """
+    fmt = fmt or (format_from_path(path) if path != '-' else None)
+    if fmt is not None and fmt not in INPUT_FORMATS:
+        raise ValueError(f'Unsupported input format: {fmt}')
+    handle = _open_text(path, 'r')
+    try:
+        lines = iter(handle)
+        if fmt is None:
+            fmt, lines = _sniff(lines)
+        if fmt == 'fasta':
+            yield from read_fasta(lines)
+        elif fmt == 'fastq':
+            yield from read_fastq(lines)
+        else:
+            yield from read_table(lines, delimiter='\t' if fmt == 'tsv' else ',',
+                                  seq_column=seq_column, name_column=name_column)
+    finally:
+        if path != '-':
+            handle.close()
+
+
+def read_rows(path: str, fmt: Optional[str] = None,
+              batch_size: int = 10000) -> Iterator[List[Dict[str, Optional[str]]]]:
+    """
+    Lazily read a table written by ``TableWriter``, in lists of up to
+    ``batch_size`` rows. Values are strings; empty CSV/TSV cells and
+    Parquet nulls are None, as they were before writing.
+    """
+    fmt = fmt or format_from_path(path) or 'csv'
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f'Unsupported table format: {fmt}')
+    if fmt == 'parquet':
+        _check_pyarrow()
+        import pyarrow.parquet
+        for batch in pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=batch_size):
+            yield batch.to_pylist()
+        return
+    with _open_text(path, 'r') as handle:
+        reader = csv.DictReader(handle, delimiter='\t' if fmt == 'tsv' else ',')
+        rows = []
+        for row in reader:
+            rows.append({key: value if value != '' else None for key, value in row.items()})
+            if len(rows) == batch_size:
+                yield rows
+                rows = []
+        if rows:
+            yield rows
+
+
+class TableWriter:
+    """
+    Writes rows (dicts keyed by ``columns``) incrementally as CSV, TSV or
+    Parquet. Parquet output is written one row group per ``write_rows``
+    call, so memory use is bounded by the batch size.
+
+    ``path`` is a file path, '-' for stdout or an open text stream, which
+    is flushed but not closed.
+    """
+
+    def __init__(self, path, columns: List[str], fmt: Optional[str] = None):
+        is_stream = path == '-' or hasattr(path, 'write')
+        fmt = fmt or (format_from_path(path) if not is_stream else None) or 'csv'
+        if fmt not in OUTPUT_FORMATS:
+            raise ValueError(f'Unsupported output format: {fmt}')
+        self.path = path
+        self.columns = list(columns)
+        self.fmt = fmt
+        self.rows_written = 0
+        self._owns_handle = not is_stream
+        self._handle = None
+        self._writer = None
+        if fmt == 'parquet':
+            _check_pyarrow()
+            if is_stream:
+                raise ValueError('Parquet output must be written to a file')
+            import pyarrow
+            import pyarrow.parquet
+            self._schema = pyarrow.schema([(c, pyarrow.string()) for c in self.columns])
+            self._writer = pyarrow.parquet.ParquetWriter(path, self._schema)
+        else:
+            self._handle = path if hasattr(path, 'write') else _open_text(path, 'w')
+            self._writer = csv.DictWriter(self._handle, fieldnames=self.columns,
+                                          delimiter='\t' if fmt == 'tsv' else ',',
+                                          extrasaction='ignore', lineterminator='\n')
+            self._writer.writeheader()
+
+    def write_rows(self, rows: List[Dict[str, object]]):
+        if not rows:
+            return
+        if self.fmt == 'parquet':
+            import pyarrow
+            data = {c: [None if row.get(c) is None else str(row[c]) for row in rows]
+                    for c in self.columns}
+            self._writer.write_table(pyarrow.table(data, schema=self._schema))
+        else:
+            self._writer.writerows(rows)
+            self._handle.flush()
+        self.rows_written += len(rows)
+
+    def close(self):
+        if self.fmt == 'parquet':
+            self._writer.close()
+        elif self._owns_handle:
+            self._handle.close()
+        else:
+            self._handle.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,293 @@
+"""
+Long-running local numbering server: ``pat-server``.
+
+The server keeps anarci, its HMMs and a pool of workers loaded, and serves
+numbering, region-extraction and similarity requests as JSON over HTTP on a
+Unix socket (or a localhost TCP port). Concurrent requests from all clients
+are micro-batched into shared ANARCI calls and share one numbering cache.
+
+Endpoints::
+
+    GET  /ping           {"status": "ok", "pid": ...}
+    GET  /stats          request counts, batching and cache statistics
+    POST /number         {"seq", "name", "scheme", "chain", "germline", "species"}
+    POST /number_batch   {"items": [[name, seq], ...], "scheme", ...}
+    POST /regions        {"seq", "scheme", "chain"}
+    POST /similarity     {"seq1", "seq2", "mode"}
+
+Sequences that cannot be numbered get status 422 with an ``error`` message.
+Use ``protein_ab_tools.client`` to route the package's functions to it.
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+from collections import Counter
+from http import HTTPStatus
+from typing import List, Optional
+
+from . import instrumentation
+from .ab_analysis.cache import NumberingCache
+from .ab_analysis.numbering import Annotation
+from .aio import AsyncNumberer, AsyncSimilarity, _pool
+from .client import default_socket_path, number_locally, parse_address
+from .parallel import resolve_n_jobs
+
+_WARMUP_SEQ = ('QVQLVESGGGVVQPGRSLRLDCKASGITFSNSGMHWVRQAPGKGLEWVAVIWYDGSKRYYADSVKGRFTISRNSKNTLFL'
+               'QMNSLRAEDTAVYYCATNDDYWGQGTLVTTVSS')
+
+
+def _warm_up():
+    """Load anarci and its HMMs into a worker."""
+    from .ab_analysis.numbering import run_numbering
+    run_numbering(_WARMUP_SEQ)
+
+
+class NumberingServer:
+    """
+    Serve numbering requests from a warm worker pool.
+
+    Args:
+        n_jobs: Worker processes shared by all requests (a single thread
+            when 1).
+        cache: Optional ``NumberingCache`` shared by all clients.
+        max_batch_size: Sequences per ANARCI call.
+        max_wait: Seconds a request waits for others to share its batch.
+        max_queue: Requests that may wait for a batch, per parameter set,
+            before new ones are held back.
+    """
+
+    def __init__(self, n_jobs: Optional[int] = 1, cache: Optional[NumberingCache] = None,
+                 max_batch_size: int = 256, max_wait: float = 0.005, max_queue: int = 1024):
+        self.n_jobs = resolve_n_jobs(n_jobs)
+        self.cache = cache
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.counts = Counter()
+        self._executor = _pool(self.n_jobs, initializer=number_locally)
+        self._numberers = {}
+        self._similarity = {}
+        self._server = None
+        self._address = None
+        self._routes = {
+            ('GET', '/ping'): self._ping,
+            ('GET', '/stats'): self._stats,
+            ('POST', '/number'): self._number,
+            ('POST', '/number_batch'): self._number_batch,
+            ('POST', '/regions'): self._regions,
+            ('POST', '/similarity'): self._similarity_request,
+        }
+
+    def _numberer(self, scheme: str = 'imgt', chain: str = 'H', germline: bool = False,
+                  species: Optional[List[str]] = None) -> AsyncNumberer:
+        key = (scheme, chain, germline, tuple(species) if species is not None else None)
+        if key not in self._numberers:
+            self._numberers[key] = AsyncNumberer(
+                scheme=scheme, chain=chain, germline=germline, species=species,
+                n_jobs=self.n_jobs, cache=self.cache, max_batch_size=self.max_batch_size,
+                max_wait=self.max_wait, max_queue=self.max_queue, executor=self._executor)
+        return self._numberers[key]
+
+    async def warm_up(self):
+        """Load anarci in every worker so the first requests are not slowed down."""
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(self._executor, _warm_up)
+                               for _ in range(self.n_jobs)])
+
+    async def start(self, address: str):
+        """Listen on ``address`` (a socket path or ``host:port``)."""
+        kind, target = parse_address(address)
+        if kind == 'unix':
+            if os.path.exists(target):
+                os.unlink(target)
+            self._server = await asyncio.start_unix_server(self._handle, path=target)
+            os.chmod(target, 0o600)
+        else:
+            self._server = await asyncio.start_server(self._handle, *target)
+        self._address = (kind, target)
+
+    async def close(self):
+        """Stop listening, finish running batches and shut down the workers."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for numberer in self._numberers.values():
+            await numberer.close()
+        for similarity in self._similarity.values():
+            await similarity.close()
+        self._executor.shutdown(wait=False)
+        kind, target = self._address or (None, None)
+        if kind == 'unix' and os.path.exists(target):
+            os.unlink(target)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                try:
+                    method, path, _ = request_line.decode('latin-1').split(' ', 2)
+                except ValueError:
+                    await self._respond(writer, HTTPStatus.BAD_REQUEST,
+                                        {'error': 'Malformed request line'}, close=True)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    key, _, value = line.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                try:
+                    length = int(headers.get('content-length', 0))
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    # Without a length the body cannot be skipped, so the connection ends.
+                    await self._respond(writer, HTTPStatus.BAD_REQUEST,
+                                        {'error': 'Malformed Content-Length'}, close=True)
+                    break
+                body = await reader.readexactly(length) if length else b''
+                status, payload = await self._dispatch(method, path.split('?')[0], body)
+                close = headers.get('connection', '').lower() == 'close'
+                await self._respond(writer, status, payload, close=close)
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: HTTPStatus, payload: dict,
+                       close: bool = False):
+        data = json.dumps(payload).encode()
+        head = (f'HTTP/1.1 {status.value} {status.phrase}\r\n'
+                f'Content-Type: application/json\r\n'
+                f'Content-Length: {len(data)}\r\n'
+                f'Connection: {"close" if close else "keep-alive"}\r\n\r\n')
+        writer.write(head.encode('latin-1') + data)
+        await writer.drain()
+
+    async def _dispatch(self, method: str, path: str, body: bytes):
+        handler = self._routes.get((method, path))
+        if handler is None:
+            return HTTPStatus.NOT_FOUND, {'error': f'No endpoint {method} {path}'}
+        self.counts[path] += 1
+        try:
+            args = json.loads(body) if body else {}
+        except ValueError as e:
+            return HTTPStatus.BAD_REQUEST, {'error': f'Invalid JSON: {e}'}
+        if not isinstance(args, dict):
+            return HTTPStatus.BAD_REQUEST, {'error': 'Expected a JSON object'}
+        try:
+            return HTTPStatus.OK, await handler(**args)
+        except ValueError as e:
+            return HTTPStatus.UNPROCESSABLE_ENTITY, {'error': str(e)}
+        except TypeError as e:
+            return HTTPStatus.BAD_REQUEST, {'error': str(e)}
+        except Exception as e:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {'error': f'{type(e).__name__}: {e}'}
+
+    async def _ping(self):
+        return {'status': 'ok', 'pid': os.getpid()}
+
+    async def _stats(self):
+        batchers = [n.batcher for n in self._numberers.values()]
+        stats = {
+            'requests': dict(self.counts),
+            'n_jobs': self.n_jobs,
+            'n_sequences': sum(b.n_items for b in batchers),
+            'n_batches': sum(b.n_batches for b in batchers),
+        }
+        if self.cache is not None:
+            stats['cache'] = self.cache.stats()
+        if instrumentation.is_enabled():
+            stats['instrumentation'] = instrumentation.stats()
+        return stats
+
+    async def _number(self, seq: str, name: Optional[str] = None, scheme: str = 'imgt',
+                      chain: str = 'H', germline: bool = False,
+                      species: Optional[List[str]] = None):
+        numberer = self._numberer(scheme, chain, germline, species)
+        return {'result': await numberer.number(seq, name=name)}
+
+    async def _number_batch(self, items: List[List[str]], scheme: str = 'imgt',
+                            chain: str = 'H', germline: bool = False,
+                            species: Optional[List[str]] = None):
+        numberer = self._numberer(scheme, chain, germline, species)
+        results = await asyncio.gather(*[numberer.number(seq, name=name) for name, seq in items],
+                                       return_exceptions=True)
+        records = []
+        for result in results:
+            if isinstance(result, ValueError):
+                records.append([None, str(result)])
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                records.append([result, None])
+        return {'records': records}
+
+    async def _regions(self, seq: str, scheme: str = 'imgt', chain: str = 'H'):
+        result = await self._numberer(scheme, chain).number(seq)
+        return {'regions': Annotation(seq, scheme, chain, result).regions}
+
+    async def _similarity_request(self, seq1: str, seq2: str, mode: str = 'blastp'):
+        if mode not in self._similarity:
+            self._similarity[mode] = AsyncSimilarity(mode=mode, n_jobs=self.n_jobs,
+                                                     executor=self._executor)
+        return {'similarity': await self._similarity[mode].similarity(seq1, seq2)}
+
+
+async def serve(address: str, server: NumberingServer, warm_up: bool = True):
+    """Run ``server`` on ``address`` until SIGINT or SIGTERM."""
+    await server.start(address)
+    if warm_up:
+        await server.warm_up()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    print(f'pat-server listening on {address}', file=sys.stderr, flush=True)
+    try:
+        await stop.wait()
+    finally:
+        await server.close()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='pat-server',
+        description='Serve antibody numbering, regions and similarity from warm workers.')
+    parser.add_argument('address', nargs='?', default=None,
+                        help='Unix socket path or localhost host:port '
+                             f'(default: {default_socket_path()})')
+    parser.add_argument('-j', '--n-jobs', type=int, default=1,
+                        help='worker processes; -1 for all CPUs (default: 1)')
+    parser.add_argument('--cache', help='SQLite numbering cache file shared by all clients')
+    parser.add_argument('--max-batch-size', type=int, default=256,
+                        help='sequences per ANARCI call (default: 256)')
+    parser.add_argument('--max-wait', type=float, default=0.005,
+                        help='seconds a request waits for others to batch with (default: 0.005)')
+    parser.add_argument('--no-warm-up', action='store_true',
+                        help='do not load anarci in the workers at startup')
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    cache = NumberingCache(args.cache) if args.cache else None
+    server = NumberingServer(n_jobs=args.n_jobs, cache=cache, max_batch_size=args.max_batch_size,
+                             max_wait=args.max_wait)
+    asyncio.run(serve(args.address or default_socket_path(), server,
+                      warm_up=not args.no_warm_up))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
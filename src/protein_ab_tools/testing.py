@@ -0,0 +1,353 @@
+"""
+Synthetic antibodies and an ANARCI stand-in for tests and benchmarks.
+
+``synthetic_sequences`` builds realistic human VH, VK and VL domains from
+germline framework and CDR templates with seeded random mutations and CDR3s.
+``use_fake_anarci`` swaps anarci for ``fake_anarci``, a deterministic
+pure-Python numbering of such domains in the IMGT scheme, so numbering code
+paths can be exercised and timed without a bioconda install. The fake is
+not a substitute for ANARCI on real data: it numbers by locating the
+conserved Cys23, Trp41, Cys104 and J-motif anchors and does not align to
+HMMs.
+"""
+import contextlib
+import functools
+import random
+import re
+from typing import Iterator, List, Literal, NamedTuple, Optional, Tuple
+
+AMINO_ACIDS = 'ACDEFGHIKLMNPQRSTVWY'
+# Extra cysteines would compete with the conserved ones.
+_SUBSTITUTES = AMINO_ACIDS.replace('C', '')
+
+
+class Template(NamedTuple):
+    gene: str
+    chain_type: str
+    fwr1: str
+    cdr1: str
+    fwr2: str
+    cdr2: str
+    fwr3: str
+    cdr3_start: str
+
+
+# Human germline V genes split into IMGT regions (CDR3 holds the
+# germline-encoded start of CDR3 only).
+V_TEMPLATES = (
+    Template('IGHV3-23*01', 'H', 'EVQLLESGGGLVQPGGSLRLSCAAS', 'GFTFSSYA', 'MSWVRQAPGKGLEWVSA',
+             'ISGSGGST', 'YYADSVKGRFTISRDNSKNTLYLQMNSLRAEDTAVYYC', 'AK'),
+    Template('IGHV1-69*01', 'H', 'QVQLVQSGAEVKKPGSSVKVSCKAS', 'GGTFSSYA', 'ISWVRQAPGQGLEWMGG',
+             'IIPIFGTA', 'NYAQKFQGRVTITADESTSTAYMELSSLRSEDTAVYYC', 'AR'),
+    Template('IGHV4-34*01', 'H', 'QVQLQQWGAGLLKPSETLSLTCAVY', 'GGSFSGYY', 'WSWIRQPPGKGLEWIGE',
+             'INHSGST', 'NYNPSLKSRVTISVDTSKNQFSLKLSSVTAADTAVYYC', 'AR'),
+    Template('IGKV1-39*01', 'K', 'DIQMTQSPSSLSASVGDRVTITCRAS', 'QSISSY', 'LNWYQQKPGKAPKLLIY',
+             'AAS', 'SLQSGVPSRFSGSGSGTDFTLTISSLQPEDFATYYC', 'QQSYSTP'),
+    Template('IGKV3-20*01', 'K', 'EIVLTQSPGTLSLSPGERATLSCRAS', 'QSVSSSY', 'LAWYQQKPGQAPRLLIY',
+             'GAS', 'SRATGIPDRFSGSGSGTDFTLTISRLEPEDFAVYYC', 'QQYGSSP'),
+    Template('IGLV1-40*01', 'L', 'QSVLTQPPSVSGAPGQRVTISCTGS', 'SSNIGAGYD', 'VHWYQQLPGTAPKLLIY',
+             'GNS', 'NRPSGVPDRFSGSKSGTSASLAITGLQAEDEADYYC', 'QSYDSSLSG'),
+)
+
+# Framework 4 of human J genes, by chain type.
+J_TEMPLATES = {
+    'H': (('IGHJ4*01', 'WGQGTLVTVSS'), ('IGHJ6*01', 'WGQGTTVTVSS'),
+          ('IGHJ3*01', 'WGQGTMVTVSS')),
+    'K': (('IGKJ1*01', 'FGQGTKVEIK'), ('IGKJ4*01', 'FGGGTKVEIK')),
+    'L': (('IGLJ2*01', 'FGGGTKLTVL'), ('IGLJ3*01', 'FGGGTKLTVL')),
+}
+
+_CDR3_LENGTHS = {'H': (8, 20), 'K': (8, 11), 'L': (9, 12)}
+
+
+def _mutate(seq: str, rate: float, rng: random.Random, keep: Tuple[int, ...] = ()) -> str:
+    """Random substitutions (never to Cys) at ``rate``, except at the ``keep`` indices."""
+    return ''.join(rng.choice(_SUBSTITUTES) if rng.random() < rate and i not in keep else aa
+                   for i, aa in enumerate(seq))
+
+
+def synthetic_sequences(n: int, chain: Literal['H', 'L'] = 'H', seed: int = 0,
+                        mutation_rate: float = 0.03,
+                        cdr_mutation_rate: float = 0.15) -> List[str]:
+    """
+    ``n`` random but realistic variable domains of ``chain`` ('H' for VH,
+    'L' for VK and VL), the same for the same ``seed``.
+
+    Each domain is a germline V template with point mutations, more in
+    CDR1 and CDR2 than in the frameworks, a CDR3 of typical length made of
+    the germline CDR3 start and random residues, and a J framework 4.
+    """
+    rng = random.Random(seed)
+    chain_types = ('H',) if chain == 'H' else ('K', 'L')
+    templates = [t for t in V_TEMPLATES if t.chain_type in chain_types]
+    seqs = []
+    for _ in range(n):
+        t = rng.choice(templates)
+        low, high = _CDR3_LENGTHS[t.chain_type]
+        cdr3_length = rng.randint(low, high)
+        cdr3 = t.cdr3_start[:cdr3_length - 2]
+        cdr3 += ''.join(rng.choices(_SUBSTITUTES, k=cdr3_length - len(cdr3)))
+        _, fwr4 = rng.choice(J_TEMPLATES[t.chain_type])
+        # Keep the conserved Cys23, Trp41-Gln44 motif, Cys104, the J motif and
+        # the last residue of the J gene, which tell chain types apart.
+        seqs.append(''.join([
+            _mutate(t.fwr1, mutation_rate, rng, keep=(len(t.fwr1) - 4,)),
+            _mutate(t.cdr1, cdr_mutation_rate, rng),
+            _mutate(t.fwr2, mutation_rate, rng, keep=(2, 3, 5)),
+            _mutate(t.cdr2, cdr_mutation_rate, rng),
+            _mutate(t.fwr3, mutation_rate, rng, keep=(len(t.fwr3) - 1,)),
+            cdr3,
+            _mutate(fwr4, mutation_rate, rng, keep=(0, 1, 3, 4, len(fwr4) - 1)),
+        ]))
+    return seqs
+
+
+def _insertion_codes(n: int) -> List[str]:
+    return [chr(ord('A') + i) for i in range(n)]
+
+
+def _number_cdr(residues: str, start: int, end: int, left: int, right: int) -> list:
+    """
+    IMGT numbering of a CDR spanning positions ``start``-``end``: residues
+    fill the positions from both ends, leaving gaps in the middle, and a
+    CDR longer than its positions gets insertions after ``left`` and
+    (in reverse) before ``right``.
+    """
+    positions = list(range(start, end + 1))
+    extra = len(residues) - len(positions)
+    if extra <= 0:
+        n_left = (len(residues) + 1) // 2
+        aas = list(residues[:n_left]) + ['-'] * -extra + list(residues[n_left:])
+        return [((number, ' '), aa) for number, aa in zip(positions, aas)]
+    n_right = (extra + 1) // 2
+    codes = ([(left, code) for code in _insertion_codes(extra - n_right)]
+             + [(right, code) for code in reversed(_insertion_codes(n_right))])
+    keys = []
+    for number in positions:
+        keys.append((number, ' ') if number != right else None)
+        if number == left:
+            keys.extend(codes)
+            keys.append((right, ' '))
+    keys = [key for key in keys if key is not None]
+    return list(zip(keys, residues))
+
+
+def _number_framework(residues: str, start: int, end: int, gaps: Tuple[int, ...] = ()) -> list:
+    """
+    Number framework residues onto ``start``-``end``, leaving the ``gaps``
+    positions empty (most dispensable first) when there are fewer residues
+    than positions.
+    """
+    positions = list(range(start, end + 1))
+    n_gaps = max(len(positions) - len(residues), 0)
+    gapped = set(gaps[:n_gaps])
+    numbered, i = [], 0
+    for number in positions:
+        if number in gapped or i >= len(residues):
+            numbered.append(((number, ' '), '-'))
+        else:
+            numbered.append(((number, ' '), residues[i]))
+            i += 1
+    return numbered
+
+
+_W41_MOTIF = re.compile(r'W[VIYF].Q')
+_J_MOTIF = re.compile(r'[WF]G.GT')
+
+
+def _find(pattern: re.Pattern, seq: str, start: int, end: int,
+          last: bool = False) -> Optional[int]:
+    """Index of the first (or last) match of ``pattern`` within ``seq[start:end]``."""
+    matches = list(pattern.finditer(seq, start, end))
+    if not matches:
+        return None
+    return matches[-1 if last else 0].start()
+
+
+def _fake_number(seq: str, allow):
+    """Numbering, details and hits of one sequence, or None if it is not a V domain."""
+    # The anchors: Cys23, Trp41 (in W-[VIYF]-x-Q), Cys104 and the first
+    # residue of the J motif, each searched where the previous one implies.
+    c23 = seq.find('C', 18, 26)
+    if c23 < 0:
+        return None
+    w41 = _find(_W41_MOTIF, seq, c23 + 10, c23 + 24)
+    if w41 is None:
+        return None
+    c104 = seq.find('C', w41 + 50, w41 + 66)
+    if c104 < 0:
+        return None
+    j118 = _find(_J_MOTIF, seq, c104 + 3, c104 + 40, last=True)
+    if j118 is None:
+        return None
+    chain_type = 'H' if seq[j118] == 'W' else ('K' if seq[j118 + 9:j118 + 10] == 'K' else 'L')
+    if chain_type not in allow:
+        return None
+    fwr3_length = 38 if chain_type == 'H' else 36
+    start = max(c23 - 22, 0)
+    end = min(j118 + 10, len(seq) - 1)
+    numbering = (
+        _number_framework(seq[start:c23].rjust(21, '-'), 1, 22, gaps=(10,))
+        + _number_framework(seq[c23:c23 + 4], 23, 26)
+        + _number_cdr(seq[c23 + 4:w41 - 2], 27, 38, 32, 33)
+        + _number_framework(seq[w41 - 2:w41 + 15], 39, 55)
+        + _number_cdr(seq[w41 + 15:c104 - fwr3_length + 1], 56, 65, 60, 61)
+        + _number_framework(seq[c104 - fwr3_length + 1:c104 + 1], 66, 104, gaps=(73, 81, 82))
+        + _number_cdr(seq[c104 + 1:j118], 105, 117, 111, 112)
+        + _number_framework(seq[j118:end + 1], 118, 118 + end - j118)
+    )
+    # Leading gaps of a short framework 1 are not numbered, as in anarci.
+    while numbering and numbering[0][1] == '-' and numbering[0][0][0] < 23:
+        numbering.pop(0)
+    hit_id = f'human_{chain_type}'
+    details = {'id': hit_id, 'description': '', 'evalue': 1e-50, 'bitscore': 160.0,
+               'bias': 0.5, 'query_start': start, 'query_end': end + 1, 'species': 'human',
+               'chain_type': chain_type, 'scheme': 'imgt'}
+    hits = [['id', 'description', 'evalue', 'bitscore', 'bias', 'query_start', 'query_end'],
+            [hit_id, '', 1e-50, 160.0, 0.5, start, end + 1]]
+    return (numbering, start, end), details, hits
+
+
+def _state_vector(numbering: list, start: int) -> list:
+    """An anarci state vector with the IMGT positions of ``numbering`` as HMM states."""
+    state_vector, index = [], start
+    for (number, code), aa in numbering:
+        if aa == '-':
+            state_vector.append(((number, 'd'), None))
+        else:
+            state_vector.append(((number, 'm' if code == ' ' else 'i'), index))
+            index += 1
+    return state_vector
+
+
+# The stand-in's germline reference lists the templates under anarci's
+# default species, so that the default ``allowed_species`` are known to it.
+_GERMLINE_SPECIES = ('human', 'mouse')
+
+
+def fake_germlines() -> dict:
+    """
+    The V and J templates as a germline reference shaped like anarci's
+    ``all_germlines``, aligned to the 128 IMGT positions.
+    """
+    def states(seq: str, first: int, last: int) -> str:
+        (numbering, _, _), _, _ = _fake_number(seq, {'H', 'K', 'L'})
+        aligned = ['-'] * 128
+        for (number, code), aa in numbering:
+            if code == ' ' and first <= number <= last:
+                aligned[number - 1] = aa
+        return ''.join(aligned)
+
+    germlines = {'V': {}, 'J': {}}
+    for t in V_TEMPLATES:
+        v_domain = t.fwr1 + t.cdr1 + t.fwr2 + t.cdr2 + t.fwr3 + t.cdr3_start + 'DY'
+        for j_gene, fwr4 in J_TEMPLATES[t.chain_type]:
+            germlines['V'].setdefault(t.chain_type, {}).setdefault(
+                t.gene, states(v_domain + fwr4, 1, 104))
+            germlines['J'].setdefault(t.chain_type, {}).setdefault(
+                j_gene, states(v_domain + fwr4, 118, 128))
+    return {segment: {chain_type: {species: genes for species in _GERMLINE_SPECIES}
+                      for chain_type, genes in chains.items()}
+            for segment, chains in germlines.items()}
+
+
+@functools.lru_cache(maxsize=None)
+def _fake_germline_db():
+    from .ab_analysis.germline import GermlineDB
+    return GermlineDB(fake_germlines())
+
+
+def fake_anarci(sequences, scheme: str = 'imgt', allow=('H', 'K', 'L'),
+                assign_germline: bool = False, allowed_species=None, ncpu=None, **kwargs):
+    """
+    Drop-in replacement for ``anarci.anarci`` on the domains of
+    ``synthetic_sequences`` (IMGT only). Returns the same nested
+    ``(numbered, details, hits)`` structure, with None for sequences that
+    are not recognised as a variable domain of an allowed chain type.
+    Germlines are assigned from ``fake_germlines()``.
+    """
+    if scheme != 'imgt':
+        raise AssertionError(f'The ANARCI stand-in only numbers IMGT, not {scheme!r}')
+    numbered, details, hits = [], [], []
+    for name, seq in sequences:
+        result = _fake_number(seq, set(allow))
+        if result is None:
+            numbered.append(None)
+            details.append(None)
+            hits.append([])
+            continue
+        domain, domain_details, domain_hits = result
+        domain_details = dict(domain_details, query_name=name)
+        if assign_germline:
+            from .ab_analysis.germline import state_codes
+            states = state_codes(_state_vector(domain[0], domain[1]), seq)
+            domain_details['germlines'], = _fake_germline_db().assign(
+                states[None], [domain_details['chain_type']], allowed_species)
+        numbered.append([domain])
+        details.append([domain_details])
+        hits.append(domain_hits)
+    return numbered, details, hits
+
+
+def fake_run_hmmer(sequence_list, hmmer_species=None, **kwargs) -> list:
+    """
+    Replacement for ``anarci.run_hmmer``: ``(hits, state_vectors, details)``
+    of each sequence, with IMGT positions as HMM states.
+    """
+    alignments = []
+    for _, seq in sequence_list:
+        result = _fake_number(seq, {'H', 'K', 'L'})
+        if result is None:
+            alignments.append(([['id', 'description', 'evalue', 'bitscore', 'bias',
+                                 'query_start', 'query_end']], [], []))
+            continue
+        (numbering, start, _), details, hits = result
+        alignments.append((hits, [_state_vector(numbering, start)], [details]))
+    return alignments
+
+
+def fake_number_sequences_from_alignment(sequences, alignments, scheme: str = 'imgt',
+                                         allow=('H', 'K', 'L'), assign_germline: bool = False,
+                                         allowed_species=None):
+    """Replacement for ``anarci.number_sequences_from_alignment``."""
+    return fake_anarci(sequences, scheme=scheme, allow=allow, assign_germline=assign_germline,
+                       allowed_species=allowed_species)
+
+
+def _fake_check_for_j(sequences, alignments, scheme):
+    """The stand-in finds J regions of any CDR3 length already."""
+
+
+_MISSING = object()
+
+
+@contextlib.contextmanager
+def use_fake_anarci() -> Iterator[None]:
+    """
+    Number with ``fake_anarci`` instead of anarci inside the block, whether
+    or not anarci is installed. ``anarci``, the alignment functions used by
+    batch germline assignment and multi-scheme numbering, and the germline
+    reference are replaced. Only the current process is affected: use
+    ``n_jobs=1`` (or fork-started workers).
+    """
+    from .ab_analysis import germline, numbering
+    names = ('ANARCI_AVAILABLE', *numbering._ANARCI_NAMES)
+    saved = {name: numbering.__dict__.get(name, _MISSING) for name in names}
+    saved_db = germline._db
+    numbering.ANARCI_AVAILABLE = True
+    numbering.anarci = fake_anarci
+    numbering.run_hmmer = fake_run_hmmer
+    numbering.check_for_j = _fake_check_for_j
+    numbering.number_sequences_from_alignment = fake_number_sequences_from_alignment
+    numbering.scheme_short_to_long = {'imgt': 'imgt'}
+    germline._db = _fake_germline_db()
+    try:
+        yield
+    finally:
+        germline._db = saved_db
+        for name, value in saved.items():
+            if value is _MISSING:
+                # Not imported yet; leave it to be imported on first use.
+                del numbering.__dict__[name]
+            else:
+                setattr(numbering, name, value)
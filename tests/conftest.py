@@ -23,6 +23,7 @@ def pytest_collection_modifyitems(config, items):
     if not anarci_available:
         skip_anarci = pytest.mark.skip(reason="anarci not installed (install via conda)")
         for item in items:
-            # Skip all tests in test_numbering.py as they require anarci
-            if "test_numbering" in item.nodeid:
+            # Skip all tests in test_numbering.py as they require anarci,
+            # as well as tests elsewhere marked with requires_anarci
+            if "test_numbering" in item.nodeid or "requires_anarci" in item.keywords:
                 item.add_marker(skip_anarci)
@@ -0,0 +1,194 @@
+"""
+Tests for the asyncio numbering and similarity API.
+"""
+import asyncio
+import threading
+
+import pytest
+from protein_ab_tools import aio
+from protein_ab_tools.aio import AsyncNumberer, AsyncSimilarity, MicroBatcher, anumber, asimilarity
+from protein_ab_tools.ab_analysis.numbering import run_numbering
+from protein_ab_tools.ab_analysis.prefilter import PREFILTER_ERROR, Prefilter
+from protein_ab_tools.align import calc_percent_similarity
+
+HEAVY_CHAIN_SEQ = 'QVQLVESGGGVVQPGRSLRLDCKASGITFSNSGMHWVRQAPGKGLEWVAVIWYDGSKRYYADSVKGRFTISRNSKNTLFLQMNSLRAEDTAVYYCATNDDYWGQGTLVTTVSS'
+LIGHT_CHAIN_SEQ = 'EIVLTQSPATLSLSPGERATLSCRASQSVSGYLAWYQQKPGQAPRLLIYDASNRATGIPARFSGSGSGTDFTLTISSLEPEDFAVYYCQQSSNWPRTFGQGTKVEIK'
+
+
+class TestMicroBatcher:
+    """Test MicroBatcher."""
+
+    def test_concurrent_items_share_a_batch(self):
+        """Items submitted together are passed to func as one batch, in order."""
+        batches = []
+
+        def double(items):
+            batches.append(list(items))
+            return [2 * item for item in items]
+
+        async def main():
+            async with MicroBatcher(double, max_wait=0.05) as batcher:
+                return await asyncio.gather(*[batcher.submit(i) for i in range(10)])
+
+        assert asyncio.run(main()) == [2 * i for i in range(10)]
+        assert batches == [list(range(10))]
+
+    def test_max_batch_size(self):
+        """Batches never exceed max_batch_size."""
+        sizes = []
+
+        def identity(items):
+            sizes.append(len(items))
+            return items
+
+        async def main():
+            async with MicroBatcher(identity, max_batch_size=4, max_wait=0.05) as batcher:
+                return await asyncio.gather(*[batcher.submit(i) for i in range(10)])
+
+        assert asyncio.run(main()) == list(range(10))
+        assert sizes == [4, 4, 2]
+
+    def test_backpressure(self):
+        """submit blocks once max_queue items wait behind a running batch."""
+        release = threading.Event()
+
+        def blocked(items):
+            release.wait(5)
+            return items
+
+        async def main():
+            batcher = MicroBatcher(blocked, max_batch_size=1, max_wait=0, max_queue=2)
+            first = asyncio.ensure_future(batcher.submit(0))
+            await asyncio.sleep(0.05)
+            # The first batch is running; two more items fit in the queue.
+            waiting = [asyncio.ensure_future(batcher.submit(i)) for i in (1, 2, 3)]
+            await asyncio.sleep(0.05)
+            assert batcher._queue.full()
+            release.set()
+            results = await asyncio.gather(first, *waiting)
+            await batcher.close()
+            return results
+
+        assert asyncio.run(main()) == [0, 1, 2, 3]
+
+    def test_batch_exception(self):
+        """An exception of func is raised to every caller of the batch."""
+        def fail(items):
+            raise KeyError('boom')
+
+        async def main():
+            async with MicroBatcher(fail, max_wait=0.01) as batcher:
+                return await asyncio.gather(batcher.submit(1), batcher.submit(2),
+                                            return_exceptions=True)
+
+        results = asyncio.run(main())
+        assert all(isinstance(result, KeyError) for result in results)
+
+    def test_closed(self):
+        """A closed batcher refuses new items."""
+        async def main():
+            batcher = MicroBatcher(list)
+            await batcher.close()
+            with pytest.raises(RuntimeError):
+                await batcher.submit(1)
+
+        asyncio.run(main())
+
+    def test_invalid_arguments(self):
+        """Sizes must be positive."""
+        with pytest.raises(ValueError):
+            MicroBatcher(list, max_batch_size=0)
+        with pytest.raises(ValueError):
+            MicroBatcher(list, max_concurrency=0)
+
+
+class TestAsyncSimilarity:
+    """Test asimilarity and AsyncSimilarity."""
+
+    def test_matches_calc_percent_similarity(self):
+        """Results equal the blocking function, for many concurrent calls."""
+        pairs = [(HEAVY_CHAIN_SEQ, LIGHT_CHAIN_SEQ), ('ACDEFGHIK', 'ACDEFGHIR'),
+                 (HEAVY_CHAIN_SEQ, HEAVY_CHAIN_SEQ)]
+
+        async def main():
+            return await asyncio.gather(*[asimilarity(a, b) for a, b in pairs])
+
+        assert asyncio.run(main()) == [calc_percent_similarity(a, b) for a, b in pairs]
+
+    def test_errors_are_per_pair(self):
+        """A failing pair does not fail the other pairs of its batch."""
+        async def main():
+            async with AsyncSimilarity(max_wait=0.05) as similarity:
+                return await asyncio.gather(similarity.similarity('', 'ACD'),
+                                            similarity.similarity('ACD', 'ACD'),
+                                            return_exceptions=True)
+
+        error, result = asyncio.run(main())
+        assert isinstance(error, ValueError)
+        assert result == 100.0
+
+
+@pytest.mark.requires_anarci
+class TestAsyncNumbering:
+    """Test anumber and AsyncNumberer."""
+
+    def test_matches_run_numbering(self):
+        """anumber returns what run_numbering returns."""
+        async def main():
+            return await asyncio.gather(anumber(HEAVY_CHAIN_SEQ, name='h'),
+                                        anumber(LIGHT_CHAIN_SEQ, chain='L'))
+
+        heavy, light = asyncio.run(main())
+        assert heavy == run_numbering(HEAVY_CHAIN_SEQ, name='h')
+        assert light == run_numbering(LIGHT_CHAIN_SEQ, chain='L')
+
+    def test_separate_event_loops(self):
+        """Each asyncio.run gets its own shared numberer; closed loops' pools are shut down."""
+        async def main():
+            result = await anumber(HEAVY_CHAIN_SEQ, name='h')
+            return result, aio._shared[asyncio.get_running_loop()]
+
+        first, first_instances = asyncio.run(main())
+        second, second_instances = asyncio.run(main())
+        assert first == second == run_numbering(HEAVY_CHAIN_SEQ, name='h')
+        numberer, = first_instances.values()
+        assert numberer is not next(iter(second_instances.values()))
+        assert numberer._executor._shutdown
+
+    def test_aclose_shared(self):
+        """aclose_shared closes the running loop's shared instances."""
+        async def main():
+            await anumber(HEAVY_CHAIN_SEQ)
+            loop = asyncio.get_running_loop()
+            numberer, = aio._shared[loop].values()
+            await aio.aclose_shared()
+            return numberer, loop in aio._shared
+
+        numberer, registered = asyncio.run(main())
+        assert not registered
+        assert numberer.batcher._closed and numberer._executor._shutdown
+
+    def test_one_anarci_call_per_batch(self):
+        """Concurrent requests are numbered in a single batch."""
+        async def main():
+            async with AsyncNumberer(max_wait=0.05, as_chain=True) as numberer:
+                chains = await asyncio.gather(*[numberer.number(HEAVY_CHAIN_SEQ, name=str(i))
+                                                for i in range(5)])
+                return chains, numberer.batcher.n_batches
+
+        chains, n_batches = asyncio.run(main())
+        assert n_batches == 1
+        assert [chain.details['query_name'] for chain in chains] == ['0', '1', '2', '3', '4']
+        assert chains[0].sequence == HEAVY_CHAIN_SEQ
+
+    def test_errors(self):
+        """Invalid and prefiltered sequences raise ValueError."""
+        async def main():
+            async with AsyncNumberer(prefilter=Prefilter(check_motif=False)) as numberer:
+                with pytest.raises(ValueError, match='Invalid sequence'):
+                    await numberer.number('A' * 100)
+                with pytest.raises(ValueError, match=PREFILTER_ERROR):
+                    await numberer.number('INVALID')
+                return numberer.batcher.n_items
+
+        assert asyncio.run(main()) == 1
@@ -0,0 +1,113 @@
+"""
+Tests for the HMM search backends.
+"""
+import copy
+
+import pytest
+from protein_ab_tools.ab_analysis import backends, numbering
+from protein_ab_tools.ab_analysis.backends import check_for_j, get_backend, register_backend
+from protein_ab_tools.ab_analysis.numbering import run_numbering, run_numbering_batch
+from protein_ab_tools.testing import fake_run_hmmer, synthetic_sequences, use_fake_anarci
+
+HEAVY_V = ('QVQLVQSGAEVKKPGASVKVSCKASGYTFTSYGISWVRQAPGQGLEWMGWISAYNGNTNYAQKLQGRVTMTTDTSTSTAYME'
+           'LRSLRSDDTAVYYCAR')
+LONG_CDR3 = HEAVY_V + 'DGYCSSTSCYTGYYYYSGWYDPDYYYGDGYCSSTSMDVWGQGTTVTVSS'
+
+
+class _CountingBackend:
+    """A backend that counts its searches, numbering with the ANARCI stand-in."""
+
+    def __init__(self):
+        self.n_calls = 0
+
+    def run_hmmer(self, sequence_list, bit_score_threshold=80, hmmer_species=None):
+        self.n_calls += 1
+        return fake_run_hmmer(sequence_list, hmmer_species=hmmer_species)
+
+
+class TestRegistry:
+    """Test register_backend and get_backend."""
+
+    def test_names(self):
+        """Named backends are created once per process."""
+        register_backend('counting', _CountingBackend)
+        try:
+            backend = get_backend('counting')
+            assert isinstance(backend, _CountingBackend) and get_backend('counting') is backend
+        finally:
+            backends._factories.pop('counting')
+            backends._instances.pop('counting')
+        assert isinstance(get_backend('hmmscan'), backends.HmmscanBackend)
+
+    def test_invalid(self):
+        """Unknown names and objects without run_hmmer are rejected."""
+        with pytest.raises(ValueError, match='Unknown backend'):
+            get_backend('blast')
+        with pytest.raises(TypeError, match='run_hmmer'):
+            get_backend(object())
+
+    def test_backend_object(self):
+        """Numbering searches with a backend object and is otherwise unchanged."""
+        seqs = synthetic_sequences(10, seed=1)
+        backend = _CountingBackend()
+        with use_fake_anarci():
+            default = run_numbering_batch(seqs + ['INVALID'], germline=True)
+            records = run_numbering_batch(seqs + ['INVALID'], germline=True, chunk_size=4,
+                                          backend=backend)
+            single = run_numbering(seqs[0], name='H-imgt-0', germline=True, backend=backend)
+        assert backend.n_calls == 4
+        assert [r.result for r in records] == [r.result for r in default]
+        assert records[-1].error == default[-1].error
+        assert single == default[0].result
+
+
+@pytest.mark.requires_anarci
+class TestCheckForJ:
+    """Test the ported check_for_j."""
+
+    def test_same_as_anarci(self):
+        """A long CDR3 gets its J region back, as with anarci's check_for_j."""
+        seqs = [('long', LONG_CDR3), ('short', synthetic_sequences(1, seed=2)[0])]
+        alignments = numbering.run_hmmer(seqs, hmmer_species=['human', 'mouse'])
+        before = copy.deepcopy(alignments)
+        expected = copy.deepcopy(alignments)
+        numbering.check_for_j(seqs, expected, None)
+        check_for_j(seqs, alignments, get_backend('hmmscan').run_hmmer)
+        assert alignments == expected
+        assert alignments[0] != before[0] and alignments[1] == before[1]
+
+
+@pytest.mark.requires_anarci
+class TestPyhmmerBackend:
+    """Test that the pyhmmer backend numbers as hmmscan does."""
+
+    @pytest.fixture(autouse=True)
+    def _pyhmmer(self):
+        pytest.importorskip('pyhmmer')
+
+    @pytest.mark.parametrize('chain', ['H', 'L'])
+    def test_batch(self, chain):
+        """Numbering, alignment details, hits, germlines and failures are identical."""
+        seqs = synthetic_sequences(30, chain, seed=3, mutation_rate=0.1, cdr_mutation_rate=0.3)
+        seqs += ['INVALID', LONG_CDR3]
+        for germline in (False, True):
+            expected = run_numbering_batch(seqs, chain=chain, germline=germline)
+            records = run_numbering_batch(seqs, chain=chain, germline=germline,
+                                          backend='pyhmmer')
+            assert [r.result for r in records] == [r.result for r in expected]
+            assert [r.error for r in records] == [r.error for r in expected]
+
+    def test_single(self):
+        """run_numbering gives the same result, in one or several schemes."""
+        assert run_numbering(LONG_CDR3, germline=True, backend='pyhmmer') == \
+            run_numbering(LONG_CDR3, germline=True)
+        schemes = ['imgt', 'kabat']
+        assert run_numbering(LONG_CDR3, scheme=schemes, backend='pyhmmer') == \
+            run_numbering(LONG_CDR3, scheme=schemes)
+
+    def test_n_jobs(self):
+        """Workers use their own copy of the backend."""
+        seqs = synthetic_sequences(12, seed=4)
+        expected = run_numbering_batch(seqs)
+        records = run_numbering_batch(seqs, n_jobs=2, backend='pyhmmer')
+        assert [r.result for r in records] == [r.result for r in expected]
@@ -0,0 +1,38 @@
+"""
+Smoke tests for the benchmark suite in benchmarks/run_benchmarks.py.
+"""
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+SCRIPT = Path(__file__).resolve().parent.parent / 'benchmarks' / 'run_benchmarks.py'
+
+
+def _run(*args) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, str(SCRIPT), '--quick', *args],
+                          capture_output=True, text=True)
+
+
+class TestRunBenchmarks:
+    """Test the benchmark runner end to end with the ANARCI stand-in."""
+
+    def test_results_and_regressions(self, tmp_path):
+        """Results are saved as JSON; slower runs than the baseline fail."""
+        output = tmp_path / 'results.json'
+        run = _run('-o', str(output))
+        assert run.returncode == 0, run.stderr
+        results = json.loads(output.read_text())
+        assert results['meta']['anarci'] == 'fake'
+        assert {'import_time', 'run_numbering', 'run_numbering_batch', 'extract_regions',
+                'calc_percent_similarity', 'similarity_matrix'} <= set(results['results'])
+        assert results['results']['run_numbering']['p95_ms'] > 0
+        assert all(result['ops_per_s'] > 0 for result in results['results'].values())
+
+        for result in results['results'].values():
+            result['ops_per_s'] *= 100
+        baseline = tmp_path / 'baseline.json'
+        baseline.write_text(json.dumps(results))
+        run = _run('--baseline', str(baseline))
+        assert run.returncode == 1
+        assert 'REGRESSION run_numbering:' in run.stderr
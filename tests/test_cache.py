@@ -0,0 +1,100 @@
+"""
+Tests for the persistent numbering cache.
+"""
+import multiprocessing
+import pickle
+
+import pytest
+from protein_ab_tools.ab_analysis.cache import NumberingCache
+
+RESULT = (
+    [[([((1, ' '), 'Q'), ((2, ' '), 'V')], 0, 1)]],
+    [[{'species': 'human', 'chain_type': 'H', 'query_name': 'original'}]],
+    [[['id', 'description']]],
+)
+
+
+def _put_from_worker(args):
+    cache, i = args
+    cache.put(cache.key(f'SEQ{i}', 'imgt', 'H', False, ['human']), RESULT)
+    return i
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = NumberingCache(tmp_path / 'numbering.sqlite')
+    yield cache
+    cache.close()
+
+
+class TestNumberingCache:
+    """Test the NumberingCache class."""
+
+    def test_round_trip(self, cache):
+        """Stored results are returned unchanged."""
+        key = cache.key('QVQ', 'imgt', 'H', False, ['human', 'mouse'])
+        assert cache.get(key) is None
+        cache.put(key, RESULT)
+        assert cache.get(key) == RESULT
+
+    def test_key_depends_on_parameters(self, cache):
+        """Every numbering parameter is part of the key."""
+        base = cache.key('QVQ', 'imgt', 'H', False, ['human', 'mouse'])
+        assert base == cache.key('QVQ', 'IMGT', 'H', False, ['mouse', 'human'])
+        assert base != cache.key('QVK', 'imgt', 'H', False, ['human', 'mouse'])
+        assert base != cache.key('QVQ', 'kabat', 'H', False, ['human', 'mouse'])
+        assert base != cache.key('QVQ', 'imgt', 'L', False, ['human', 'mouse'])
+        assert base != cache.key('QVQ', 'imgt', 'H', True, ['human', 'mouse'])
+        assert base != cache.key('QVQ', 'imgt', 'H', False, ['human'])
+
+    def test_get_named_renames_copies(self, cache):
+        """Duplicate keys get independent results with their own names."""
+        key = cache.key('QVQ', 'imgt', 'H', False, ['human'])
+        cache.put(key, RESULT)
+        found = cache.get_named([key, 'missing', key], ['a', 'b', 'c'])
+        assert sorted(found) == [0, 2]
+        assert found[0][1][0][0]['query_name'] == 'a'
+        assert found[2][1][0][0]['query_name'] == 'c'
+
+    def test_stats(self, cache):
+        """Hits and misses are counted."""
+        key = cache.key('QVQ', 'imgt', 'H', False, ['human'])
+        cache.get(key)
+        cache.put(key, RESULT)
+        cache.get(key)
+        stats = cache.stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 1
+        assert stats['hit_rate'] == 0.5
+        assert stats['entries'] == 1
+        assert stats['size_bytes'] > 0
+
+    def test_persistent(self, tmp_path):
+        """Entries survive reopening the cache file."""
+        path = tmp_path / 'numbering.sqlite'
+        first = NumberingCache(path)
+        key = first.key('QVQ', 'imgt', 'H', False, ['human'])
+        first.put(key, RESULT)
+        first.close()
+        assert NumberingCache(path).get(key) == RESULT
+
+    def test_size_eviction(self, tmp_path):
+        """Least recently used entries are evicted beyond max_size."""
+        entry_size = len(pickle.dumps(RESULT, protocol=pickle.HIGHEST_PROTOCOL))
+        cache = NumberingCache(tmp_path / 'numbering.sqlite', max_size=3 * entry_size)
+        keys = [cache.key(f'SEQ{i}', 'imgt', 'H', False, ['human']) for i in range(3)]
+        for key in keys:
+            cache.put(key, RESULT)
+        cache.get(keys[0])
+        cache.put(cache.key('SEQ3', 'imgt', 'H', False, ['human']), RESULT)
+        stats = cache.stats()
+        assert stats['size_bytes'] <= 3 * entry_size
+        assert cache.get(keys[0]) is not None
+        assert cache.get(keys[1]) is None
+
+    def test_multiple_processes(self, cache):
+        """Concurrent writers from several processes share one file."""
+        with multiprocessing.get_context('spawn').Pool(2) as pool:
+            done = pool.map(_put_from_worker, [(cache, i) for i in range(8)])
+        assert sorted(done) == list(range(8))
+        assert cache.stats()['entries'] == 8
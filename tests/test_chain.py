@@ -0,0 +1,96 @@
+"""
+Tests for the compact NumberedChain result type.
+"""
+import pickle
+
+import numpy as np
+import pytest
+from protein_ab_tools.ab_analysis.chain import NumberedChain
+from protein_ab_tools.ab_analysis.regions import regions_from_numbering
+from protein_ab_tools.ab_analysis.repertoire import Repertoire, position_axis
+
+NUMBERED = [((1, ' '), 'Q'), ((2, ' '), 'V'), ((3, ' '), '-'), ((27, ' '), 'G'),
+            ((111, ' '), 'A'), ((111, 'A'), 'R'), ((112, 'AA'), 'W'), ((112, ' '), 'Y')]
+DETAILS = {'species': 'human', 'chain_type': 'H', 'query_name': 'x',
+           'germlines': {'v_gene': [('human', 'IGHV3-33*01'), 0.9],
+                         'j_gene': [('human', 'IGHJ4*01'), 0.95]}}
+RESULT = ([[(NUMBERED, 0, 6)]], [[DETAILS]], [['hit table']])
+
+
+class TestNumberedChain:
+    """Test NumberedChain conversions and accessors."""
+
+    def test_round_trip(self):
+        chain = NumberedChain.from_result(RESULT)
+        assert chain.numbering == NUMBERED
+        assert chain.to_result() == RESULT
+        assert chain.residues.dtype == np.uint8
+        assert len(chain) == len(NUMBERED)
+
+    def test_accessors(self):
+        chain = NumberedChain.from_result(RESULT)
+        assert chain.numbered_seq == 'QV-GARWY'
+        assert chain.sequence == 'QVGARWY'
+        assert chain.species == 'human'
+        assert chain.chain_type == 'H'
+        assert chain.germline['j_gene'][1] == 0.95
+        assert chain.positions[6] == (112, 'AA')
+
+    @pytest.mark.parametrize('scheme', ['imgt', 'kabat', 'aho'])
+    def test_regions_match_extract_regions(self, scheme):
+        chain = NumberedChain.from_result(RESULT, scheme=scheme)
+        assert chain.regions == regions_from_numbering(NUMBERED, scheme, 'H')
+
+    def test_slots(self):
+        chain = NumberedChain.from_result(RESULT)
+        assert not hasattr(chain, '__dict__')
+        with pytest.raises(AttributeError):
+            chain.extra = 1
+
+    def test_pickle(self):
+        chain = NumberedChain.from_result(RESULT)
+        restored = pickle.loads(pickle.dumps(chain))
+        assert restored == chain
+        assert restored.to_result() == RESULT
+
+    def test_renamed_shares_arrays(self):
+        chain = NumberedChain.from_result(RESULT)
+        renamed = chain.renamed('y')
+        assert renamed.details['query_name'] == 'y'
+        assert chain.details['query_name'] == 'x'
+        assert renamed.residues is chain.residues
+
+    def test_to_repertoire_is_a_view(self):
+        """A chain spanning the whole position axis is not copied."""
+        axis = position_axis([pos for pos, _ in NUMBERED])
+        chain = NumberedChain.from_numbering(
+            [(pos, dict(NUMBERED).get(pos, '-')) for pos in axis])
+        repertoire = chain.to_repertoire()
+        assert np.shares_memory(repertoire.residues, chain.residues)
+        assert repertoire.msa() == [chain.numbered_seq]
+
+    def test_truncated_to_repertoire(self):
+        """A truncated chain is placed on the axis of Repertoire.from_numbering."""
+        chain = NumberedChain.from_result(RESULT)
+        repertoire = chain.to_repertoire()
+        expected = Repertoire.from_numbering([NUMBERED])
+        assert repertoire.positions == expected.positions
+        assert repertoire.msa() == expected.msa()
+        assert not np.shares_memory(repertoire.residues, chain.residues)
+
+    def test_repertoire_from_chains(self):
+        same = [NumberedChain.from_result(RESULT), NumberedChain.from_result(RESULT).renamed('y')]
+        repertoire = Repertoire.from_chains(same)
+        expected = Repertoire.from_numbering([NUMBERED, NUMBERED])
+        assert repertoire.positions == expected.positions
+        assert repertoire.msa() == expected.msa()
+        assert repertoire.names == ['x', 'y']
+        assert list(repertoire.metadata['v_gene']) == ['IGHV3-33*01'] * 2
+        other = NumberedChain.from_numbering(NUMBERED[:3], details={'query_name': 'z'})
+        mixed = Repertoire.from_chains(same + [other])
+        assert [mixed.sequence(i) for i in range(3)] == ['QVGARWY', 'QVGARWY', 'QV']
+
+    def test_auto_chain(self):
+        """With chain='auto' the chain follows the detected chain type."""
+        result = (RESULT[0], [[dict(DETAILS, chain_type='K')]], RESULT[2])
+        assert NumberedChain.from_result(result, chain='auto').chain == 'L'
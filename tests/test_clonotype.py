@@ -0,0 +1,163 @@
+"""
+Tests for CDR3 clonotype clustering.
+"""
+import random
+
+import numpy as np
+import pytest
+from protein_ab_tools.ab_analysis import clonotype
+from protein_ab_tools.ab_analysis.clonotype import (cluster_annotations, cluster_clonotypes,
+                                                    max_mismatches)
+from protein_ab_tools.ab_analysis.numbering import annotate_batch
+from protein_ab_tools.testing import synthetic_sequences, use_fake_anarci
+
+
+def _brute_force(cdr3s, v_genes, j_genes, min_identity):
+    """Single-linkage labels from comparing every pair, ignoring alleles."""
+    v_genes = [gene.split('*')[0] for gene in v_genes]
+    j_genes = [gene.split('*')[0] for gene in j_genes]
+    n = len(cdr3s)
+    parent = list(range(n))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a in range(n):
+        for b in range(a + 1, n):
+            if (v_genes[a] != v_genes[b] or j_genes[a] != j_genes[b]
+                    or len(cdr3s[a]) != len(cdr3s[b])):
+                continue
+            mismatches = sum(x != y for x, y in zip(cdr3s[a], cdr3s[b]))
+            if mismatches <= max_mismatches(len(cdr3s[a]), min_identity):
+                parent[find(a)] = find(b)
+    return [find(a) for a in range(n)]
+
+
+def _same_partition(labels, reference):
+    return len(set(zip(labels, reference))) == len(set(labels)) == len(set(reference))
+
+
+def _family_cdr3s(n, seed=0):
+    """CDR3s drawn from a few parents with a few point mutations each."""
+    rng = random.Random(seed)
+    parents = [''.join(rng.choice('ACDEGKLNRSTVY') for _ in range(length))
+               for length in (8, 10, 10, 12, 15)]
+    cdr3s = []
+    for _ in range(n):
+        cdr3 = list(rng.choice(parents))
+        for _ in range(rng.randint(0, 4)):
+            cdr3[rng.randrange(len(cdr3))] = rng.choice('ACDEGKLNRSTVY')
+        cdr3s.append(''.join(cdr3))
+    v_genes = [rng.choice(['IGHV3-23*01', 'IGHV3-23*04', 'IGHV1-69*01']) for _ in range(n)]
+    j_genes = [rng.choice(['IGHJ4*02', 'IGHJ6*01']) for _ in range(n)]
+    return cdr3s, v_genes, j_genes
+
+
+class TestMaxMismatches:
+    """Test max_mismatches."""
+
+    def test_values(self):
+        """Mismatches allowed at a minimum identity, without float drift."""
+        assert max_mismatches(10, 80) == 2
+        assert max_mismatches(10, 100) == 0
+        assert max_mismatches(10, 0) == 10
+        assert max_mismatches(15, 80) == 3
+        assert max_mismatches(14, 80) == 2
+
+
+class TestClusterClonotypes:
+    """Test cluster_clonotypes."""
+
+    def test_buckets(self):
+        """Clonotypes need the same V, J and CDR3 length and enough identity."""
+        cdr3s = ['ARDYYGMDV', 'ARDYYGMDV', 'ARDYWGMDV', 'ARDYYGMDVA', 'ARDYYGMDV',
+                 'ARDYYGMDV', 'KKKKKKKKK']
+        v_genes = ['IGHV3-23*01', 'IGHV3-23*04', 'IGHV3-23*01', 'IGHV3-23*01', 'IGHV1-69*01',
+                   'IGHV3-23*01', 'IGHV3-23*01']
+        j_genes = ['IGHJ4*02'] * 5 + ['IGHJ6*01', 'IGHJ4*02']
+        labels = cluster_clonotypes(cdr3s, v_genes, j_genes, min_identity=80)
+        assert labels.tolist() == [0, 0, 0, 1, 2, 3, 4]
+        labels = cluster_clonotypes(cdr3s, v_genes, j_genes, min_identity=80, allele=True)
+        assert labels.tolist() == [0, 1, 0, 2, 3, 4, 5]
+        labels = cluster_clonotypes(cdr3s, min_identity=80)
+        assert labels.tolist() == [0, 0, 0, 1, 0, 0, 2]
+
+    def test_missing_cdr3(self):
+        """Sequences without a CDR3 get -1; labels follow first appearance."""
+        labels = cluster_clonotypes([None, 'CARW', '', 'AAAA', 'CARW'], min_identity=100)
+        assert labels.dtype == np.int64
+        assert labels.tolist() == [-1, 0, -1, 1, 0]
+        assert cluster_clonotypes([]).tolist() == []
+
+    def test_gene_tuples(self):
+        """Genes may be given as anarci's (species, gene) pairs."""
+        labels = cluster_clonotypes(['CARW', 'CARW'], [('human', 'IGHV3-23*01'),
+                                                       ('human', 'IGHV3-23*04')])
+        assert labels.tolist() == [0, 0]
+
+    @pytest.mark.parametrize('min_identity', [70, 80, 90, 100])
+    def test_matches_brute_force(self, monkeypatch, min_identity):
+        """Single linkage equals comparing every pair, on both search paths."""
+        cdr3s, v_genes, j_genes = _family_cdr3s(400)
+        reference = _brute_force(cdr3s, v_genes, j_genes, min_identity)
+        labels = cluster_clonotypes(cdr3s, v_genes, j_genes, min_identity=min_identity)
+        assert _same_partition(labels.tolist(), reference)
+        monkeypatch.setattr(clonotype, '_ALL_PAIRS_SIZE', 4)
+        monkeypatch.setattr(clonotype, '_OFFSET_GROUP_SIZE', 4)
+        labels = cluster_clonotypes(cdr3s, v_genes, j_genes, min_identity=min_identity)
+        assert _same_partition(labels.tolist(), reference)
+
+    def test_greedy(self):
+        """Greedy centroids split chains that single linkage joins."""
+        # AAAAA-AAAAC-AAACC: each step is one mismatch, the ends are two apart.
+        cdr3s = ['AAAAA', 'AAAAC', 'AAACC', 'AAAAA']
+        assert cluster_clonotypes(cdr3s, min_identity=80).tolist() == [0, 0, 0, 0]
+        greedy = cluster_clonotypes(cdr3s, min_identity=80, method='greedy')
+        assert greedy.tolist() == [0, 0, 1, 0]
+        # With the middle CDR3 the most frequent, it is the centroid of all.
+        greedy = cluster_clonotypes(cdr3s + ['AAAAC'] * 2, min_identity=80, method='greedy')
+        assert len(set(greedy.tolist())) == 1
+
+    def test_greedy_refines_single(self):
+        """Every greedy clonotype lies within one single-linkage clonotype."""
+        cdr3s, v_genes, j_genes = _family_cdr3s(400, seed=1)
+        single = cluster_clonotypes(cdr3s, v_genes, j_genes, min_identity=80).tolist()
+        greedy = cluster_clonotypes(cdr3s, v_genes, j_genes, min_identity=80,
+                                    method='greedy').tolist()
+        assert len(set(zip(greedy, single))) == len(set(greedy)) >= len(set(single))
+
+    def test_n_jobs(self, monkeypatch):
+        """Worker processes give the same labels."""
+        monkeypatch.setattr(clonotype, '_CHUNK_SIZE', 20)
+        cdr3s, v_genes, j_genes = _family_cdr3s(300, seed=2)
+        serial = cluster_clonotypes(cdr3s, v_genes, j_genes)
+        assert cluster_clonotypes(cdr3s, v_genes, j_genes, n_jobs=2).tolist() == serial.tolist()
+
+    def test_invalid(self):
+        """Bad arguments raise ValueError."""
+        with pytest.raises(ValueError, match='method'):
+            cluster_clonotypes(['CARW'], method='average')
+        with pytest.raises(ValueError, match='min_identity'):
+            cluster_clonotypes(['CARW'], min_identity=101)
+        with pytest.raises(ValueError, match='one call per CDR3'):
+            cluster_clonotypes(['CARW', 'CARW'], v_genes=['IGHV3-23*01'])
+
+
+class TestClusterAnnotations:
+    """Test cluster_annotations."""
+
+    def test_annotations(self):
+        """Annotations are clustered by their CDR3 and germline genes."""
+        seqs = synthetic_sequences(30, seed=3)
+        with use_fake_anarci():
+            annotations = annotate_batch(seqs + ['INVALID'], chain='H', germline=True)
+        labels = cluster_annotations(annotations, min_identity=70)
+        assert labels[-1] == -1 and (labels[:-1] >= 0).all()
+        cdr3s = [a.regions['vh_cdr3'].replace('-', '') for a in annotations[:-1]]
+        v_genes = [a.germline['v_gene'][0] for a in annotations[:-1]]
+        j_genes = [a.germline['j_gene'][0] for a in annotations[:-1]]
+        expected = cluster_clonotypes(cdr3s, v_genes, j_genes, min_identity=70)
+        assert labels[:-1].tolist() == expected.tolist()
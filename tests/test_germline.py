@@ -0,0 +1,126 @@
+"""
+Tests for batch germline assignment.
+"""
+import numpy as np
+import pytest
+from protein_ab_tools.ab_analysis import germline, numbering
+from protein_ab_tools.ab_analysis.germline import (GermlineCall, GermlineDB,
+                                                   assign_germlines_batch, germline_db,
+                                                   state_codes)
+from protein_ab_tools.ab_analysis.numbering import run_numbering_batch
+from protein_ab_tools.testing import fake_germlines, synthetic_sequences, use_fake_anarci
+
+
+def _states(aligned: str) -> np.ndarray:
+    return np.frombuffer(aligned.encode('ascii'), dtype=np.uint8)[None]
+
+
+class TestGermlineDB:
+    """Test GermlineDB.assign."""
+
+    def setup_method(self):
+        self.germlines = fake_germlines()
+        self.db = GermlineDB(self.germlines)
+
+    def test_germline_matches_itself(self):
+        """A germline is assigned to itself with identity 1."""
+        for gene in ('IGHV1-69*01', 'IGHV4-34*01'):
+            aligned = self.germlines['V']['H']['human'][gene]
+            assigned, = self.db.assign(_states(aligned), ['H'], ['human'])
+            assert assigned['v_gene'] == [('human', gene), 1.0]
+
+    def test_identity(self):
+        """Identity is the fraction of the germline's residues matched."""
+        aligned = self.germlines['V']['K']['human']['IGKV1-39*01']
+        n_residues = len(aligned.replace('-', ''))
+        mutated = 'W' * 5 + aligned[5:]
+        assigned, = self.db.assign(_states(mutated), ['K'])
+        assert assigned['v_gene'] == [('human', 'IGKV1-39*01'), (n_residues - 5) / n_residues]
+        assert assigned['j_gene'][1] == 0.0
+
+    def test_ties_and_species(self):
+        """Ties go to the first species and gene listed, as in anarci."""
+        aligned = self.germlines['J']['L']['human']['IGLJ2*01']
+        assigned, = self.db.assign(_states(aligned), ['L'], ['mouse', 'human'])
+        assert assigned['j_gene'] == [('mouse', 'IGLJ2*01'), 1.0]
+        assert self.db.assign(_states(aligned), ['L'], ['rat']) == [{}]
+        assert self.db.assign(_states(aligned), ['A']) == [
+            {'v_gene': [None, None], 'j_gene': [None, None]}]
+
+    def test_read_only(self):
+        """The encoded reference cannot be modified."""
+        codes = self.db._sets['V', 'H'].codes
+        with pytest.raises(ValueError):
+            codes[0, 0] = 0
+
+    def test_state_codes(self):
+        """Match states take residues; insertions and deletions do not."""
+        codes = state_codes([((1, 'm'), 0), ((2, 'd'), None), ((2, 'i'), 1), ((3, 'm'), 2)],
+                            'qvk')
+        assert codes[:4].tobytes() == b'Q-K-'
+        assert len(codes) == 128
+
+
+class TestAssignGermlinesBatch:
+    """Test assign_germlines_batch on the ANARCI stand-in."""
+
+    def test_calls(self):
+        """Unmutated domains get their templates; failures get an error."""
+        seqs = synthetic_sequences(10, 'L', seed=4, mutation_rate=0, cdr_mutation_rate=0)
+        with use_fake_anarci():
+            calls = assign_germlines_batch(seqs + ['INVALID'], chain='L')
+        assert all(isinstance(call, GermlineCall) for call in calls)
+        assert [call.ok for call in calls] == [True] * 10 + [False]
+        for call in calls[:-1]:
+            assert call.species == 'human'
+            assert call.v_gene[:4] in ('IGKV', 'IGLV') and call.v_identity == 1.0
+            assert call.j_gene[:4] == call.v_gene[:3] + 'J'
+            assert call.j_identity == 1.0
+        assert calls[-1].v_gene is None and 'INVALID' in calls[-1].error
+
+    def test_same_as_single(self):
+        """Batch calls are those of run_numbering, one sequence at a time."""
+        seqs = synthetic_sequences(20, seed=5)
+        with use_fake_anarci():
+            calls = assign_germlines_batch(seqs, names=[f's{i}' for i in range(20)])
+            single = [numbering.run_numbering(seq, germline=True) for seq in seqs]
+        for call, result in zip(calls, single):
+            assert call == GermlineCall.from_details(call.name, result[1][0][0])
+        assert calls[3].name == 's3'
+
+    def test_shared_reference(self):
+        """The reference is built once per process; the stand-in's is removed after use."""
+        before = germline._db
+        with use_fake_anarci():
+            db = germline_db()
+            assert db is germline_db() and db is not before
+        assert germline._db is before
+
+
+@pytest.mark.requires_anarci
+class TestAgainstAnarci:
+    """Test that batch germline assignment is anarci's."""
+
+    def test_reference(self):
+        """GermlineDB gives anarci's calls and identities, state vector by state vector."""
+        from anarci.anarci import run_germline_assignment
+        seqs = [(str(i), seq) for i, seq in
+                enumerate(synthetic_sequences(20, 'L', seed=6, mutation_rate=0.1))]
+        alignments = numbering.run_hmmer(seqs, hmmer_species=['human', 'mouse'])
+        for (_, seq), (_, state_vectors, details) in zip(seqs, alignments):
+            state_vector, chain_type = state_vectors[0], details[0]['chain_type']
+            for species in (['human', 'mouse'], None):
+                expected = run_germline_assignment(state_vector, seq, chain_type, species)
+                assert germline_db().assign(state_codes(state_vector, seq)[None],
+                                            [chain_type], species) == [expected]
+
+    @pytest.mark.parametrize('chain', ['H', 'L'])
+    def test_batch(self, chain):
+        """run_numbering_batch(germline=True) returns what anarci does."""
+        seqs = synthetic_sequences(30, chain, seed=8, mutation_rate=0.08, cdr_mutation_rate=0.3)
+        allow = ['H'] if chain == 'H' else ['K', 'L']
+        _, details, _ = numbering.anarci([(str(i), seq) for i, seq in enumerate(seqs)],
+                                         scheme='imgt', allow=allow, assign_germline=True)
+        records = run_numbering_batch(seqs, chain=chain, germline=True)
+        assert [r.result[1][0][0]['germlines'] for r in records] == \
+            [d[0]['germlines'] for d in details]
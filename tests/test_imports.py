@@ -0,0 +1,94 @@
+"""
+Tests for package import time and lazy loading of heavy dependencies.
+"""
+import importlib.util
+import json
+import subprocess
+import sys
+
+import protein_ab_tools
+
+# Generous bound on the cumulative import time of ``import protein_ab_tools``;
+# it takes a few milliseconds when nothing heavy is imported eagerly, and
+# over 200 ms when anarci, Biopython and NumPy are.
+IMPORT_BUDGET_US = 100_000
+
+# The same for the modules every ``pat-number`` run and pipeline worker imports.
+# They take about 180 ms, mostly NumPy; an eager pyarrow import alone adds 160 ms.
+CLI_IMPORT_BUDGET_US = 300_000
+
+
+def _run(code: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                          capture_output=True, text=True, check=True)
+
+
+def _loaded(code: str, modules=('anarci', 'Bio', 'numpy')) -> dict:
+    """Which of ``modules`` are imported after running ``code`` in a fresh interpreter."""
+    check = f'import json, sys\n{code}\nprint(json.dumps({{m: m in sys.modules for m in {list(modules)!r}}}))'
+    return json.loads(_run(check).stdout.strip().splitlines()[-1])
+
+
+def _cumulative_us(stderr: str, module: str) -> int:
+    """Cumulative import time of ``module`` from ``-X importtime`` output."""
+    for line in stderr.splitlines():
+        parts = [part.strip() for part in line.split('|')]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[1])
+    raise AssertionError(f'{module} not in importtime output')
+
+
+class TestLazyImports:
+    """Test that heavy dependencies are imported on first use only."""
+
+    def test_import_package(self):
+        """Importing the package loads neither anarci, Biopython nor NumPy."""
+        assert _loaded('import protein_ab_tools') == {'anarci': False, 'Bio': False,
+                                                      'numpy': False}
+
+    def test_anarci_available(self):
+        """ANARCI_AVAILABLE is known without importing anarci."""
+        loaded = _loaded('import protein_ab_tools\n'
+                         'assert protein_ab_tools.ANARCI_AVAILABLE in (True, False)')
+        assert not loaded['anarci']
+        assert protein_ab_tools.ANARCI_AVAILABLE == (importlib.util.find_spec('anarci') is not None)
+
+    def test_subsystems(self):
+        """Numbering does not load Biopython's aligner; alignment does not load anarci."""
+        assert not _loaded('from protein_ab_tools import run_numbering')['anarci']
+        assert not _loaded('from protein_ab_tools import calc_percent_similarity')['Bio']
+        assert not _loaded('from protein_ab_tools.align import similarity_matrix')['anarci']
+
+    def test_cli_and_pipeline(self):
+        """pat-number and the pipeline load neither pyarrow nor the server client."""
+        for module in ('protein_ab_tools.cli', 'protein_ab_tools.pipeline'):
+            assert _loaded(f'import {module}', modules=('pyarrow', 'http.client')) == \
+                {'pyarrow': False, 'http.client': False}, module
+
+    def test_submodule_names(self):
+        """Functions named like their submodule resolve to the function."""
+        check = _run('from protein_ab_tools.align import is_similar_matrix, similarity_matrix\n'
+                     'print(callable(similarity_matrix))')
+        assert check.stdout.strip() == 'True'
+
+    def test_public_names(self):
+        """Every name in __all__ resolves."""
+        for package in (protein_ab_tools, protein_ab_tools.ab_analysis, protein_ab_tools.align):
+            for name in package.__all__:
+                assert getattr(package, name) is not None or name == 'ANARCI_AVAILABLE'
+            assert set(package.__all__) <= set(dir(package))
+
+
+class TestImportTime:
+    """Catch regressions in package import time."""
+
+    def test_import_time(self):
+        """import protein_ab_tools stays within its time budget."""
+        elapsed = _cumulative_us(_run('import protein_ab_tools').stderr, 'protein_ab_tools')
+        assert elapsed < IMPORT_BUDGET_US, f'import protein_ab_tools took {elapsed} us'
+
+    def test_cli_import_time(self):
+        """The CLI and pipeline modules stay within their time budget."""
+        for module in ('protein_ab_tools.cli', 'protein_ab_tools.pipeline'):
+            elapsed = _cumulative_us(_run(f'import {module}').stderr, module)
+            assert elapsed < CLI_IMPORT_BUDGET_US, f'import {module} took {elapsed} us'
@@ -0,0 +1,126 @@
+"""
+Tests for the hot-path timers, counters and profiling hooks.
+"""
+import pstats
+import time
+
+import pytest
+from protein_ab_tools import instrumentation
+from protein_ab_tools.ab_analysis.cache import NumberingCache
+from protein_ab_tools.ab_analysis.numbering import extract_regions_batch, run_numbering
+from protein_ab_tools.align import calc_percent_similarity
+from protein_ab_tools.testing import synthetic_sequences, use_fake_anarci
+
+
+@pytest.fixture(autouse=True)
+def recording():
+    """Record from a clean state and switch instrumentation off afterwards."""
+    instrumentation.reset()
+    instrumentation.enable()
+    yield
+    instrumentation.disable()
+    instrumentation.reset()
+    for callback, _, _ in list(instrumentation._callbacks):
+        instrumentation.remove_callback(callback)
+
+
+def _busy(seconds: float):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        sum(range(100))
+
+
+class TestRecording:
+    """Test timers and counters."""
+
+    def test_off(self):
+        """Nothing is recorded while instrumentation is off."""
+        instrumentation.disable()
+        with instrumentation.timer('stage'):
+            pass
+        instrumentation.count('events')
+        calc_percent_similarity('ACDEF', 'ACDEG')
+        assert instrumentation.stats()['timers'] == {}
+        assert instrumentation.stats()['counters'] == {}
+
+    def test_timer_and_count(self):
+        """Timers accumulate calls, total and maximum time."""
+        for seconds in (0.001, 0.003):
+            instrumentation.record('stage', seconds)
+        instrumentation.count('events', 2)
+        stats = instrumentation.stats()
+        assert stats['timers']['stage']['calls'] == 2
+        assert stats['timers']['stage']['total_s'] == pytest.approx(0.004)
+        assert stats['timers']['stage']['max_s'] == 0.003
+        assert stats['counters'] == {'events': 2}
+
+    def test_hot_paths(self, tmp_path):
+        """Numbering, region extraction, caching and alignment are recorded."""
+        seqs = synthetic_sequences(5)
+        with use_fake_anarci():
+            extract_regions_batch(seqs + ['INVALID'])
+            cache = NumberingCache(str(tmp_path / 'cache.sqlite'))
+            run_numbering(seqs[0], cache=cache)
+            run_numbering(seqs[0], cache=cache)
+        calc_percent_similarity(seqs[0], seqs[1])
+        stats = instrumentation.stats()
+        assert {'anarci', 'numbering_batch', 'regions', 'alignment'} <= set(stats['timers'])
+        assert stats['timers']['alignment']['calls'] == 1
+        assert stats['counters'] == {'sequences_numbered': 6, 'numbering_failures': 1,
+                                     'cache_hits': 1, 'cache_misses': 1}
+
+
+class TestExport:
+    """Test callbacks and the Prometheus exporter."""
+
+    def test_prometheus_exporter(self, tmp_path):
+        """Due callbacks are called as timers are recorded."""
+        path = tmp_path / 'pat.prom'
+        instrumentation.add_callback(instrumentation.PrometheusExporter(str(path)), interval=0)
+        instrumentation.count('sequences_numbered', 3)
+        instrumentation.record('anarci', 0.5)
+        text = path.read_text()
+        assert 'pat_stage_seconds_total{stage="anarci"} 0.5' in text
+        assert 'pat_sequences_numbered_total 3' in text
+
+    def test_counters_only(self):
+        """Counting alone also calls due callbacks."""
+        snapshots = []
+        instrumentation.add_callback(snapshots.append, interval=0)
+        instrumentation.count('cache_hits', 2)
+        assert snapshots[-1]['counters'] == {'cache_hits': 2}
+
+    def test_interval(self):
+        """Callbacks are not called before their interval has passed."""
+        snapshots = []
+        instrumentation.add_callback(snapshots.append, interval=3600)
+        instrumentation.record('anarci', 0.1)
+        assert snapshots == []
+        instrumentation.report()
+        assert snapshots[0]['timers']['anarci']['calls'] == 1
+
+
+class TestProfile:
+    """Test the profiling context manager."""
+
+    def test_cprofile(self, tmp_path):
+        """cProfile stats are saved for pstats."""
+        path = tmp_path / 'run.prof'
+        with instrumentation.profile(str(path)):
+            _busy(0.01)
+        functions = {name for _, _, name in pstats.Stats(str(path)).stats}
+        assert '_busy' in functions
+
+    def test_sample(self, tmp_path):
+        """Sampled stacks are saved in the folded format."""
+        path = tmp_path / 'run.folded'
+        with instrumentation.profile(str(path), mode='sample', interval=0.001) as stacks:
+            _busy(0.1)
+        assert any('_busy' in stack for stack in stacks)
+        stack, samples = path.read_text().splitlines()[0].rsplit(' ', 1)
+        assert int(samples) > 0 and ';' in stack
+
+    def test_bad_mode(self):
+        with pytest.raises(ValueError):
+            with instrumentation.profile(mode='perf'):
+                pass
@@ -0,0 +1,129 @@
+"""
+Tests for the k-mer similarity search index.
+"""
+import random
+
+import numpy as np
+import pytest
+from protein_ab_tools.align.kmer_index import Hit, KmerIndex, _kmer_ids
+from protein_ab_tools.align.sequence_align import calc_percent_similarity
+
+VH = 'QVQLVESGGGVVQPGRSLRLDCKASGITFSNSGMHWVRQAPGKGLEWVAVIWYDGSKRYYADSVKGRFTISRNSKNTLFLQMNSLRAEDTAVYYCATNDDYWGQGTLVTTVSS'
+AMINO_ACIDS = 'ACDEFGHIKLMNPQRSTVWY'
+
+
+def _mutants(seq, n, rate, seed=0):
+    rng = random.Random(seed)
+    return [''.join(rng.choice(AMINO_ACIDS) if rng.random() < rate else aa for aa in seq)
+            for _ in range(n)]
+
+
+@pytest.fixture(scope='module')
+def library():
+    rng = random.Random(1)
+    unrelated = [''.join(rng.choice(AMINO_ACIDS) for _ in range(len(VH))) for _ in range(50)]
+    return _mutants(VH, 30, 0.1) + unrelated
+
+
+class TestKmerIds:
+    """Test k-mer encoding."""
+
+    def test_unique_and_sorted(self):
+        ids = _kmer_ids('AAAA', 2)
+        assert list(ids) == [0]
+
+    def test_short_sequence_has_no_kmers(self):
+        assert len(_kmer_ids('AC', 3)) == 0
+
+    def test_case_insensitive(self):
+        np.testing.assert_array_equal(_kmer_ids('acdw', 3), _kmer_ids('ACDW', 3))
+
+
+class TestKmerIndex:
+    """Test building, searching and persisting a KmerIndex."""
+
+    def test_build(self, library):
+        index = KmerIndex.build(library, k=3)
+        assert len(index) == len(library)
+        assert index.sequence(5) == library[5]
+        assert index.name(5) == '5'
+        assert index.kmer_offsets[-1] == len(index.postings) == index.n_kmers.sum()
+
+    def test_shared_kmers_matches_sets(self, library):
+        index = KmerIndex.build(library, k=3)
+        shared = index.shared_kmers(VH)
+        query = set(_kmer_ids(VH, 3))
+        expected = [len(query & set(_kmer_ids(seq, 3))) for seq in library]
+        assert list(shared) == expected
+
+    def test_top_k_matches_brute_force(self, library):
+        """With the default candidate list the top hits equal exhaustive scoring."""
+        index = KmerIndex.build(library)
+        hits = index.search(VH, top_k=5)
+        brute = sorted(((calc_percent_similarity(VH, seq), i) for i, seq in enumerate(library)),
+                       key=lambda x: (-x[0], x[1]))[:5]
+        assert [hit.index for hit in hits] == [i for _, i in brute]
+        assert [hit.similarity for hit in hits] == [s for s, _ in brute]
+        assert all(isinstance(hit, Hit) for hit in hits)
+
+    def test_prefilter_limits_alignments(self, library, monkeypatch):
+        """Only n_candidates sequences are aligned, and they are the related ones."""
+        from protein_ab_tools.align import kmer_index
+        calls = []
+        real = kmer_index.calc_percent_similarity
+
+        def counting(seq1, seq2, mode='blastp'):
+            calls.append(seq2)
+            return real(seq1, seq2, mode=mode)
+
+        monkeypatch.setattr(kmer_index, 'calc_percent_similarity', counting)
+        hits = KmerIndex.build(library).search(VH, top_k=3, n_candidates=10)
+        assert len(calls) == 10
+        assert all(seq in library[:30] for seq in calls)
+        assert len(hits) == 3
+
+    def test_min_similarity(self, library):
+        index = KmerIndex.build(library)
+        hits = index.search(VH, top_k=None, min_similarity=70)
+        assert hits
+        assert all(hit.similarity >= 70 for hit in hits)
+        assert {hit.index for hit in hits} <= set(range(30))
+
+    def test_names(self, library):
+        names = [f'ab{i}' for i in range(len(library))]
+        index = KmerIndex.build(library, names=names)
+        assert index.search(library[3], top_k=1)[0].name == 'ab3'
+        with pytest.raises(ValueError):
+            KmerIndex.build(library, names=names[:2])
+
+    def test_invalid_arguments(self, library):
+        """k is bounded so the offsets table stays small; counts must be positive."""
+        for k in (0, 6):
+            with pytest.raises(ValueError, match='k must be between'):
+                KmerIndex.build(library, k=k)
+        index = KmerIndex.build(library)
+        with pytest.raises(ValueError, match='n_candidates'):
+            index.search(VH, n_candidates=0)
+        with pytest.raises(ValueError, match='top_k'):
+            index.search(VH, top_k=-1)
+
+    def test_lowercase_query(self, library):
+        """A lowercase query is scored against the uppercased library as is."""
+        index = KmerIndex.build(library)
+        assert index.search(VH.lower(), top_k=5) == index.search(VH, top_k=5)
+
+    def test_no_shared_kmers(self, library):
+        assert KmerIndex.build(library).search('') == []
+
+    def test_save_and_load_mmap(self, library, tmp_path):
+        index = KmerIndex.build(library, names=[f'ab{i}' for i in range(len(library))])
+        index.save(tmp_path / 'idx')
+        loaded = KmerIndex.load(tmp_path / 'idx')
+        assert isinstance(loaded.postings, np.memmap)
+        assert loaded.k == index.k
+        assert loaded.search(VH, top_k=5) == index.search(VH, top_k=5)
+
+    def test_search_many(self, library):
+        index = KmerIndex.build(library)
+        results = index.search_many(library[:2], top_k=1)
+        assert [hits[0].index for hits in results] == [0, 1]
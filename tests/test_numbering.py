@@ -2,11 +2,23 @@
 Tests for antibody numbering functionality.
 """
 import pytest
+from protein_ab_tools.ab_analysis import numbering
+from protein_ab_tools.ab_analysis.cache import NumberingCache
+from protein_ab_tools.ab_analysis.chain import NumberedChain
 from protein_ab_tools.ab_analysis.numbering import (
+    annotate,
+    annotate_batch,
+    annotate_domains,
+    annotate_domains_batch,
+    split_chains,
     run_numbering,
+    run_numbering_batch,
     get_numbered_seq,
+    get_numbered_seq_batch,
     extract_regions,
-    extract_species
+    extract_regions_batch,
+    extract_species,
+    extract_species_batch
 )
 
 
@@ -267,3 +279,332 @@ class TestInvalidScheme:
         """Test that invalid numbering scheme raises ValueError."""
         with pytest.raises(ValueError, match="Invalid numbering scheme"):
             extract_regions(HEAVY_CHAIN_SEQ, scheme='invalid', chain='H')
+
+    def test_numbering_helpers(self):
+        """Species and numbered sequences need no region table, so anarci reports bad schemes."""
+        for func in (extract_species, get_numbered_seq):
+            with pytest.raises(AssertionError, match='Unrecognised or unimplemented scheme'):
+                func(HEAVY_CHAIN_SEQ, scheme='invalid')
+        assert extract_species(HEAVY_CHAIN_SEQ, scheme='wolfguy') == 'human'
+        assert extract_species_batch([HEAVY_CHAIN_SEQ], scheme='wolfguy') == ['human']
+        assert get_numbered_seq_batch([HEAVY_CHAIN_SEQ], scheme='wolfguy') == \
+            [get_numbered_seq(HEAVY_CHAIN_SEQ, scheme='wolfguy')]
+
+
+class TestBatchNumbering:
+    """Test the batch numbering API."""
+
+    def test_batch_matches_single(self):
+        """Batch numbering gives the same numbering as run_numbering."""
+        records = run_numbering_batch([HEAVY_CHAIN_SEQ, HEAVY_CHAIN_SEQ[:-3]], chain='H')
+        assert len(records) == 2
+        assert all(r.ok for r in records)
+        single = run_numbering(HEAVY_CHAIN_SEQ, chain='H')
+        assert records[0].result[0][0][0][0] == single[0][0][0][0]
+
+    def test_failures_reported_per_sequence(self):
+        """An invalid sequence is reported without failing the batch."""
+        records = run_numbering_batch(
+            [HEAVY_CHAIN_SEQ, 'INVALID', HEAVY_CHAIN_SEQ],
+            names=['a', 'b', 'c'], chain='H')
+        assert [r.name for r in records] == ['a', 'b', 'c']
+        assert [r.ok for r in records] == [True, False, True]
+        assert 'Invalid sequence' in records[1].error
+        assert records[1].result is None
+
+    def test_chunking_preserves_order(self):
+        """Results come back in input order across chunk boundaries."""
+        seqs = [HEAVY_CHAIN_SEQ, LIGHT_CHAIN_SEQ, HEAVY_CHAIN_SEQ]
+        records = run_numbering_batch(seqs, chain='H', chunk_size=1)
+        assert [r.ok for r in records] == [True, False, True]
+
+    def test_parallel_matches_serial(self):
+        """n_jobs > 1 gives the same records, in order, as a serial run."""
+        seqs = [HEAVY_CHAIN_SEQ, 'INVALID', HEAVY_CHAIN_SEQ[:-2], HEAVY_CHAIN_SEQ[1:]]
+        serial = run_numbering_batch(seqs, chain='H')
+        parallel = run_numbering_batch(seqs, chain='H', n_jobs=2, chunk_size=1)
+        assert [r.name for r in parallel] == [r.name for r in serial]
+        assert [r.result for r in parallel] == [r.result for r in serial]
+
+    def test_names_length_mismatch(self):
+        """Mismatched names raise ValueError."""
+        with pytest.raises(ValueError):
+            run_numbering_batch([HEAVY_CHAIN_SEQ], names=['a', 'b'])
+
+    def test_batch_helpers(self):
+        """Batch helpers agree with their single-sequence versions."""
+        seqs = [LIGHT_CHAIN_SEQ, 'INVALID']
+        regions = extract_regions_batch(seqs, scheme='imgt', chain='L')
+        assert regions[0] == extract_regions(LIGHT_CHAIN_SEQ, scheme='imgt', chain='L')
+        assert regions[1] is None
+        numbered = get_numbered_seq_batch(seqs, chain='L')
+        assert numbered[0] == get_numbered_seq(LIGHT_CHAIN_SEQ, chain='L')
+        species = extract_species_batch(seqs, chain='L')
+        assert species[0] == extract_species(LIGHT_CHAIN_SEQ, chain='L')
+        assert species[1] is None
+
+    def test_batch_invalid_scheme(self):
+        """Invalid scheme raises before any numbering is done."""
+        with pytest.raises(ValueError, match="Invalid numbering scheme"):
+            extract_regions_batch([HEAVY_CHAIN_SEQ], scheme='invalid')
+
+
+class TestAnnotate:
+    """Test the single-pass annotate API."""
+
+    def test_matches_helpers(self):
+        """Annotation values agree with the individual helpers."""
+        annotation = annotate(HEAVY_CHAIN_SEQ, scheme='imgt', chain='H')
+        assert annotation.regions == extract_regions(HEAVY_CHAIN_SEQ, scheme='imgt', chain='H')
+        assert annotation.numbered_seq == get_numbered_seq(HEAVY_CHAIN_SEQ, scheme='imgt', chain='H')
+        assert annotation.species == extract_species(HEAVY_CHAIN_SEQ, scheme='imgt', chain='H')
+
+    def test_germline(self):
+        """Germline assignment is available from the same numbering run."""
+        annotation = annotate(HEAVY_CHAIN_SEQ, chain='H')
+        assert annotation.germline['v_gene'][0][1].startswith('IGHV')
+        assert annotate(HEAVY_CHAIN_SEQ, chain='H', germline=False).germline is None
+
+    def test_numbers_once(self, monkeypatch):
+        """All accessors share a single anarci call."""
+        calls = []
+        real_anarci = numbering.anarci
+
+        def counting_anarci(*args, **kwargs):
+            calls.append(args)
+            return real_anarci(*args, **kwargs)
+
+        monkeypatch.setattr(numbering, 'anarci', counting_anarci)
+        annotation = annotate(LIGHT_CHAIN_SEQ, scheme='kabat', chain='L')
+        annotation.regions, annotation.numbered_seq, annotation.species, annotation.germline
+        assert len(calls) == 1
+
+    def test_invalid_scheme(self):
+        """Invalid scheme raises ValueError."""
+        with pytest.raises(ValueError, match="Invalid numbering scheme"):
+            annotate(HEAVY_CHAIN_SEQ, scheme='invalid')
+
+    def test_batch(self):
+        """annotate_batch gives None for failed sequences."""
+        annotations = annotate_batch([HEAVY_CHAIN_SEQ, 'INVALID'], chain='H')
+        assert annotations[0].regions == extract_regions(HEAVY_CHAIN_SEQ, chain='H')
+        assert annotations[1] is None
+
+
+class TestNumberingCacheIntegration:
+    """Test numbering with a NumberingCache."""
+
+    def test_run_numbering_uses_cache(self, tmp_path, monkeypatch):
+        """A cached sequence is not numbered again."""
+        cache = NumberingCache(tmp_path / 'cache.sqlite')
+        first = run_numbering(HEAVY_CHAIN_SEQ, name='x', cache=cache)
+        monkeypatch.setattr(numbering, 'anarci', None)
+        second = run_numbering(' ' + HEAVY_CHAIN_SEQ + ' ', name='y', cache=cache)
+        assert second[0] == first[0]
+        assert second[1][0][0]['query_name'] == 'y'
+        assert cache.stats()['hits'] == 1
+
+    def test_batch_numbers_only_misses(self, tmp_path, monkeypatch):
+        """Batch numbering only sends cache misses to anarci."""
+        cache = NumberingCache(tmp_path / 'cache.sqlite')
+        run_numbering_batch([HEAVY_CHAIN_SEQ], chain='H', cache=cache)
+        sent = []
+        real_anarci = numbering.anarci
+
+        def recording_anarci(sequences, **kwargs):
+            sent.extend(seq for _, seq in sequences)
+            return real_anarci(sequences, **kwargs)
+
+        monkeypatch.setattr(numbering, 'anarci', recording_anarci)
+        records = run_numbering_batch([HEAVY_CHAIN_SEQ, HEAVY_CHAIN_SEQ[1:], 'INVALID'],
+                                      chain='H', cache=cache)
+        assert sent == [HEAVY_CHAIN_SEQ[1:], 'INVALID']
+        assert [r.ok for r in records] == [True, True, False]
+        assert cache.stats()['entries'] == 2
+
+
+class TestDeduplication:
+    """Test deduplication in batch numbering."""
+
+    def test_duplicates_numbered_once(self, monkeypatch):
+        """Identical normalised sequences are sent to anarci once."""
+        sent = []
+        real_anarci = numbering.anarci
+
+        def recording_anarci(sequences, **kwargs):
+            sent.extend(seq for _, seq in sequences)
+            return real_anarci(sequences, **kwargs)
+
+        monkeypatch.setattr(numbering, 'anarci', recording_anarci)
+        seqs = [HEAVY_CHAIN_SEQ, ' ' + HEAVY_CHAIN_SEQ, 'INVALID',
+                HEAVY_CHAIN_SEQ[:3] + '-' + HEAVY_CHAIN_SEQ[3:], 'INVALID']
+        batch = run_numbering_batch(seqs, names=list('abcde'), chain='H')
+        assert sent == [HEAVY_CHAIN_SEQ, 'INVALID']
+        assert [r.name for r in batch] == list('abcde')
+        assert [r.ok for r in batch] == [True, True, False, True, False]
+        assert [r.result[1][0][0]['query_name'] for r in batch if r.ok] == ['a', 'b', 'd']
+        assert batch[1].result[0] == batch[0].result[0]
+        assert batch.stats == {
+            'n_input': 5,
+            'n_unique': 2,
+            'n_duplicates': 3,
+            'duplicate_fraction': 0.6,
+            'n_failed': 2,
+        }
+
+    def test_deduplicate_off(self, monkeypatch):
+        """deduplicate=False numbers every copy."""
+        sent = []
+        real_anarci = numbering.anarci
+
+        def recording_anarci(sequences, **kwargs):
+            sent.extend(seq for _, seq in sequences)
+            return real_anarci(sequences, **kwargs)
+
+        monkeypatch.setattr(numbering, 'anarci', recording_anarci)
+        batch = run_numbering_batch([HEAVY_CHAIN_SEQ] * 2, chain='H', deduplicate=False)
+        assert len(sent) == 2
+        assert batch.stats['n_unique'] == 2
+
+
+class TestNumberedChainResults:
+    """Test numbering with as_chain=True."""
+
+    def test_run_numbering_as_chain(self):
+        result = run_numbering(HEAVY_CHAIN_SEQ, chain='H', germline=True)
+        chain = run_numbering(HEAVY_CHAIN_SEQ, chain='H', germline=True, as_chain=True)
+        assert isinstance(chain, NumberedChain)
+        assert chain.numbering == result[0][0][0][0]
+        assert chain.numbered_seq == get_numbered_seq(HEAVY_CHAIN_SEQ, chain='H')
+        assert chain.regions == extract_regions(HEAVY_CHAIN_SEQ, chain='H')
+        assert chain.species == extract_species(HEAVY_CHAIN_SEQ, chain='H')
+        assert chain.germline['v_gene'][0][1].startswith('IGHV')
+
+    def test_batch_as_chain(self):
+        seqs = [HEAVY_CHAIN_SEQ, 'INVALID', HEAVY_CHAIN_SEQ, HEAVY_CHAIN_SEQ[1:]]
+        tuples = run_numbering_batch(seqs, names=list('abcd'), chain='H')
+        chains = run_numbering_batch(seqs, names=list('abcd'), chain='H', n_jobs=2,
+                                     chunk_size=1, as_chain=True)
+        assert [r.ok for r in chains] == [r.ok for r in tuples]
+        for record, expected in zip(chains, tuples):
+            if record.ok:
+                assert isinstance(record.result, NumberedChain)
+                assert record.result.numbering == expected.result[0][0][0][0]
+                assert record.result.details['query_name'] == record.name
+
+    def test_batch_as_chain_with_cache(self, tmp_path):
+        """The cache keeps anarci's results; chains are built after caching."""
+        cache = NumberingCache(tmp_path / 'cache.sqlite')
+        run_numbering_batch([HEAVY_CHAIN_SEQ], chain='H', cache=cache, as_chain=True)
+        records = run_numbering_batch([HEAVY_CHAIN_SEQ], chain='H', cache=cache)
+        assert isinstance(records[0].result, tuple)
+        chained = run_numbering_batch([HEAVY_CHAIN_SEQ], chain='H', cache=cache, as_chain=True)
+        assert isinstance(chained[0].result, NumberedChain)
+        assert cache.stats()['hits'] == 2
+
+
+class TestMultipleSchemes:
+    """Test numbering in several schemes from one HMMER search."""
+
+    SCHEMES = ['imgt', 'kabat', 'chothia', 'abm', 'aho']
+
+    def test_matches_single_scheme(self):
+        results = run_numbering(HEAVY_CHAIN_SEQ, scheme=self.SCHEMES, chain='H', germline=True)
+        assert list(results) == self.SCHEMES
+        for scheme in self.SCHEMES:
+            single = run_numbering(HEAVY_CHAIN_SEQ, scheme=scheme, chain='H', germline=True)
+            assert results[scheme] == single
+
+    def test_hmmer_runs_once(self, monkeypatch):
+        calls = []
+        real_run_hmmer = numbering.run_hmmer
+
+        def counting_run_hmmer(*args, **kwargs):
+            calls.append(args)
+            return real_run_hmmer(*args, **kwargs)
+
+        monkeypatch.setattr(numbering, 'run_hmmer', counting_run_hmmer)
+        run_numbering(LIGHT_CHAIN_SEQ, scheme=self.SCHEMES, chain='L', germline=True)
+        assert len(calls) == 1
+
+    def test_extract_regions(self):
+        regions = extract_regions(HEAVY_CHAIN_SEQ, scheme=['imgt', 'kabat'], chain='H')
+        assert regions == {'imgt': extract_regions(HEAVY_CHAIN_SEQ, scheme='imgt', chain='H'),
+                           'kabat': extract_regions(HEAVY_CHAIN_SEQ, scheme='kabat', chain='H')}
+
+    def test_extract_regions_invalid_scheme(self):
+        with pytest.raises(ValueError, match='Invalid numbering scheme'):
+            extract_regions(HEAVY_CHAIN_SEQ, scheme=['imgt', 'invalid'], chain='H')
+
+    def test_invalid_sequence(self):
+        with pytest.raises(ValueError, match='Invalid sequence'):
+            run_numbering('INVALID', scheme=['imgt', 'kabat'])
+
+    def test_as_chain(self):
+        chains = run_numbering(HEAVY_CHAIN_SEQ, scheme=['imgt', 'kabat'], as_chain=True)
+        assert all(isinstance(chain, NumberedChain) for chain in chains.values())
+        assert chains['kabat'].regions == extract_regions(HEAVY_CHAIN_SEQ, scheme='kabat')
+
+    def test_cache(self, tmp_path, monkeypatch):
+        """Cached schemes are served from the cache; only the others are numbered."""
+        cache = NumberingCache(tmp_path / 'cache.sqlite')
+        imgt = run_numbering(HEAVY_CHAIN_SEQ, scheme='imgt', cache=cache)
+        schemes = []
+        real = numbering._number_schemes
+
+        def recording(sequences, schemes_, *args, **kwargs):
+            schemes.extend(schemes_)
+            return real(sequences, schemes_, *args, **kwargs)
+
+        monkeypatch.setattr(numbering, '_number_schemes', recording)
+        results = run_numbering(HEAVY_CHAIN_SEQ, scheme=['imgt', 'kabat'], cache=cache)
+        assert schemes == ['kabat']
+        assert results['imgt'] == imgt
+        again = run_numbering(HEAVY_CHAIN_SEQ, scheme=['imgt', 'kabat'], cache=cache)
+        assert schemes == ['kabat']
+        assert again == results
+
+
+class TestAutoChain:
+    """Test chain type detection with chain='auto'."""
+
+    SCFV = HEAVY_CHAIN_SEQ + 'GGGGSGGGGSGGGGS' + LIGHT_CHAIN_SEQ
+
+    def test_detects_chain(self):
+        heavy = annotate(HEAVY_CHAIN_SEQ, chain='auto', germline=False)
+        light = annotate(LIGHT_CHAIN_SEQ, chain='auto', germline=False)
+        assert (heavy.chain, heavy.chain_type) == ('H', 'H')
+        assert (light.chain, light.chain_type) == ('L', 'K')
+        assert light.regions == extract_regions(LIGHT_CHAIN_SEQ, chain='L')
+        assert extract_regions(HEAVY_CHAIN_SEQ, chain='auto') == extract_regions(HEAVY_CHAIN_SEQ)
+
+    def test_scfv_domains(self):
+        domains = annotate_domains(self.SCFV, germline=False)
+        assert [d.chain for d in domains] == ['H', 'L']
+        assert domains[0].regions == extract_regions(HEAVY_CHAIN_SEQ, chain='H')
+        assert domains[1].regions == extract_regions(LIGHT_CHAIN_SEQ, chain='L')
+
+    def test_one_anarci_call(self, monkeypatch):
+        calls = []
+        real_anarci = numbering.anarci
+
+        def recording_anarci(sequences, **kwargs):
+            calls.append(kwargs['allow'])
+            return real_anarci(sequences, **kwargs)
+
+        monkeypatch.setattr(numbering, 'anarci', recording_anarci)
+        annotate_domains(self.SCFV, germline=False)
+        assert calls == [['H', 'K', 'L']]
+
+    def test_batch(self):
+        seqs = [LIGHT_CHAIN_SEQ, HEAVY_CHAIN_SEQ, 'INVALID', self.SCFV]
+        domains = annotate_domains_batch(seqs, names=list('abcd'), germline=False)
+        assert [[d.chain for d in found] for found in domains] == [['L'], ['H'], [], ['H', 'L']]
+        assert extract_regions_batch(seqs[:2], chain='auto') == [
+            extract_regions(LIGHT_CHAIN_SEQ, chain='L'), extract_regions(HEAVY_CHAIN_SEQ)]
+
+    def test_split_chains(self):
+        seqs = [LIGHT_CHAIN_SEQ, HEAVY_CHAIN_SEQ, 'INVALID', self.SCFV]
+        groups = split_chains(seqs, names=list('abcd'), germline=False)
+        assert [a.name for a in groups['H']] == ['b', 'd']
+        assert [a.name for a in groups['L']] == ['a', 'd']
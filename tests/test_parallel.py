@@ -0,0 +1,99 @@
+"""
+Tests for the process-pool helpers.
+"""
+import os
+
+import pytest
+from protein_ab_tools.parallel import chunked, imap_ordered, resolve_n_jobs, worker_pool
+
+
+def _square_all(chunk):
+    return [x * x for x in chunk]
+
+
+def _worker_pid(_):
+    return os.getpid()
+
+
+class TestResolveNJobs:
+    """Test the resolve_n_jobs function."""
+
+    def test_serial_values(self):
+        """None, 0 and 1 all mean serial."""
+        assert resolve_n_jobs(None) == 1
+        assert resolve_n_jobs(0) == 1
+        assert resolve_n_jobs(1) == 1
+
+    def test_negative_counts_from_cpu_count(self):
+        """-1 means every CPU and never resolves below one worker."""
+        assert resolve_n_jobs(-1) == (os.cpu_count() or 1)
+        assert resolve_n_jobs(-10_000) == 1
+
+
+class TestChunked:
+    """Test the chunked function."""
+
+    def test_chunks_cover_input(self):
+        """Chunks are consecutive and cover the input."""
+        assert chunked(list(range(5)), 2) == [[0, 1], [2, 3], [4]]
+
+    def test_invalid_chunk_size(self):
+        """chunk_size must be positive."""
+        with pytest.raises(ValueError):
+            chunked([1], 0)
+
+
+class TestImapOrdered:
+    """Test the imap_ordered function."""
+
+    def test_serial(self):
+        """Serial execution applies func in order."""
+        chunks = chunked(list(range(10)), 3)
+        result = list(imap_ordered(_square_all, chunks, n_jobs=1))
+        assert sum(result, []) == [x * x for x in range(10)]
+
+    def test_parallel_preserves_order(self):
+        """Parallel execution yields results in input order."""
+        chunks = chunked(list(range(100)), 7)
+        result = list(imap_ordered(_square_all, chunks, n_jobs=2, max_pending=2))
+        assert sum(result, []) == [x * x for x in range(100)]
+
+    def test_parallel_uses_workers(self):
+        """Chunks run in worker processes, not the caller."""
+        pids = set(imap_ordered(_worker_pid, range(4), n_jobs=2))
+        assert os.getpid() not in pids
+
+    def test_lazy_input(self):
+        """A generator of chunks is accepted."""
+        chunks = ([i] for i in range(5))
+        result = list(imap_ordered(_square_all, chunks, n_jobs=2))
+        assert result == [[0], [1], [4], [9], [16]]
+
+    def test_invalid_max_pending(self):
+        """max_pending must be positive."""
+        with pytest.raises(ValueError):
+            list(imap_ordered(_square_all, [[1]], n_jobs=2, max_pending=0))
+
+
+class TestWorkerPool:
+    """Test the worker_pool context manager."""
+
+    def test_one_pool(self):
+        """imap_ordered calls inside the block share its workers."""
+        with worker_pool(2):
+            first = set(imap_ordered(_worker_pid, range(8), n_jobs=2))
+            second = set(imap_ordered(_worker_pid, range(8), n_jobs=2))
+            with worker_pool(2):
+                nested = set(imap_ordered(_worker_pid, range(8), n_jobs=2))
+        assert len(first | second | nested) <= 2
+        assert os.getpid() not in first
+        # Outside the block, each call starts its own pool again.
+        assert not set(imap_ordered(_worker_pid, range(4), n_jobs=2)) & first
+
+    def test_other_sizes(self):
+        """Calls with another number of workers, or serial ones, keep their own."""
+        with worker_pool(2):
+            assert list(imap_ordered(_square_all, [[3]], n_jobs=3)) == [[9]]
+            assert set(imap_ordered(_worker_pid, range(2), n_jobs=1)) == {os.getpid()}
+        with worker_pool(1):
+            assert list(imap_ordered(_square_all, [[2]], n_jobs=2)) == [[4]]
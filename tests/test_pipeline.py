@@ -0,0 +1,217 @@
+"""
+Tests for the streaming numbering pipeline and the pat-number command.
+"""
+import csv
+import io
+import json
+import os
+
+import pytest
+from protein_ab_tools import cli, pipeline, seqio
+from protein_ab_tools.ab_analysis.prefilter import Prefilter
+from protein_ab_tools.ab_analysis.numbering import extract_regions, get_numbered_seq
+from protein_ab_tools.pipeline import (MANIFEST, annotation_columns, batched, iter_annotation_rows,
+                                       merge_shards, run_pipeline, run_sharded_pipeline)
+
+pytestmark = pytest.mark.requires_anarci
+
+HEAVY_CHAIN_SEQ = 'QVQLVESGGGVVQPGRSLRLDCKASGITFSNSGMHWVRQAPGKGLEWVAVIWYDGSKRYYADSVKGRFTISRNSKNTLFLQMNSLRAEDTAVYYCATNDDYWGQGTLVTTVSS'
+LIGHT_CHAIN_SEQ = 'EIVLTQSPATLSLSPGERATLSCRASQSVSGYLAWYQQKPGQAPRLLIYDASNRATGIPARFSGSGSGTDFTLTISSLEPEDFAVYYCQQSSNWPRTFGQGTKVEIK'
+
+
+class TestBatched:
+    """Test the batched helper."""
+
+    def test_batches(self):
+        """Items are grouped into batches of the given size."""
+        assert list(batched(range(5), 2)) == [[0, 1], [2, 3], [4]]
+
+    def test_invalid_size(self):
+        """Batch size must be positive."""
+        with pytest.raises(ValueError):
+            list(batched([1], 0))
+
+
+class TestIterAnnotationRows:
+    """Test iter_annotation_rows."""
+
+    def test_rows(self):
+        """Rows hold the numbered sequence and regions, or the error."""
+        records = [('h', HEAVY_CHAIN_SEQ), ('bad', 'INVALID'), ('h2', HEAVY_CHAIN_SEQ)]
+        batches = list(iter_annotation_rows(records, batch_size=2, germline=True))
+        assert [len(rows) for rows in batches] == [2, 1]
+        rows = sum(batches, [])
+        assert rows[0]['numbered_seq'] == get_numbered_seq(HEAVY_CHAIN_SEQ)
+        assert {k: rows[0][k] for k in extract_regions(HEAVY_CHAIN_SEQ)} == extract_regions(HEAVY_CHAIN_SEQ)
+        assert rows[0]['v_gene'].startswith('IGHV')
+        assert rows[0]['species'] == 'human'
+        assert 'Invalid sequence' in rows[1]['error']
+        assert rows[2]['name'] == 'h2'
+        assert set(rows[0]) <= set(annotation_columns(germline=True))
+
+    def test_one_pool(self, monkeypatch):
+        """With n_jobs > 1 every batch is numbered on one process pool."""
+        from protein_ab_tools import parallel
+        started = []
+        real = parallel.ProcessPoolExecutor
+
+        def counting(*args, **kwargs):
+            started.append(kwargs.get('max_workers'))
+            return real(*args, **kwargs)
+
+        monkeypatch.setattr(parallel, 'ProcessPoolExecutor', counting)
+        records = [(f'h{i}', HEAVY_CHAIN_SEQ[:-i] if i else HEAVY_CHAIN_SEQ) for i in range(6)]
+        batches = list(iter_annotation_rows(records, batch_size=2, n_jobs=2))
+        assert started == [2]
+        assert [len(rows) for rows in batches] == [2, 2, 2]
+        assert [row['name'] for rows in batches for row in rows] == [name for name, _ in records]
+
+    def test_default_batch_size(self):
+        """Batches default to BATCH_SIZE sequences per worker."""
+        assert pipeline._batch_size(None, 1) == pipeline.BATCH_SIZE
+        assert pipeline._batch_size(None, 4) == 4 * pipeline.BATCH_SIZE
+        assert pipeline._batch_size(10, 4) == 10
+
+
+class TestRunPipeline:
+    """Test run_pipeline and the command-line entry point."""
+
+    def test_fasta_to_tsv(self, tmp_path):
+        """A FASTA file is written as a TSV table."""
+        fasta = tmp_path / 'in.fasta'
+        fasta.write_text(f'>h\n{HEAVY_CHAIN_SEQ}\n>bad\nINVALID\n')
+        out = tmp_path / 'out.tsv'
+        counts = run_pipeline(str(fasta), str(out), batch_size=1)
+        assert counts == {'n_input': 2, 'n_numbered': 1, 'n_failed': 1}
+        with open(out) as f:
+            rows = list(csv.DictReader(f, delimiter='\t'))
+        assert [row['name'] for row in rows] == ['h', 'bad']
+        assert rows[0]['vh_cdr3'] == 'ATN-------DDY'
+
+    def test_cli_stdin_to_stdout(self, monkeypatch, capsys):
+        """pat-number reads stdin and writes CSV to stdout."""
+        monkeypatch.setattr(seqio.sys, 'stdin', io.StringIO(f'id,sequence\nh,{HEAVY_CHAIN_SEQ}\n'))
+        assert cli.main(['--name-column', 'id', '--scheme', 'kabat']) == 0
+        captured = capsys.readouterr()
+        rows = list(csv.DictReader(io.StringIO(captured.out)))
+        assert rows[0]['name'] == 'h'
+        assert rows[0]['vh_fwr1']
+        assert 'numbered 1 of 1' in captured.err
+
+    def test_cli_prefilter(self, tmp_path, capsys):
+        """--prefilter reports rejected sequences by reason."""
+        fasta = tmp_path / 'in.fasta'
+        fasta.write_text(f'>h\n{HEAVY_CHAIN_SEQ}\n>short\nQVQLVESGG\n')
+        assert cli.main([str(fasta), '-o', str(tmp_path / 'out.tsv'), '--prefilter']) == 0
+        err = capsys.readouterr().err
+        assert 'numbered 1 of 2' in err
+        assert 'prefilter rejected 1 of 2 distinct sequences (too_short: 1)' in err
+
+    def test_cli_auto_chain(self, tmp_path, capsys):
+        """--chain auto numbers heavy and light chains, each with its own region columns."""
+        fasta = tmp_path / 'in.fasta'
+        fasta.write_text(f'>h\n{HEAVY_CHAIN_SEQ}\n>l\n{LIGHT_CHAIN_SEQ}\n')
+        out = tmp_path / 'out.csv'
+        assert cli.main([str(fasta), '-o', str(out), '--chain', 'auto']) == 0
+        with open(out) as f:
+            reader = csv.DictReader(f)
+            rows = list(reader)
+        assert reader.fieldnames == annotation_columns(chain='auto')
+        assert [row['chain_type'] for row in rows] == ['H', 'K']
+        heavy = extract_regions(HEAVY_CHAIN_SEQ, chain='H')
+        light = extract_regions(LIGHT_CHAIN_SEQ, chain='L')
+        assert {k: rows[0][k] for k in heavy} == heavy
+        assert {k: rows[1][k] for k in light} == light
+        assert rows[0]['vl_cdr3'] == rows[1]['vh_cdr3'] == ''
+
+
+class TestShardedPipeline:
+    """Test run_sharded_pipeline and merge_shards."""
+
+    @pytest.fixture
+    def fasta(self, tmp_path):
+        path = tmp_path / 'in.fasta'
+        seqs = [HEAVY_CHAIN_SEQ, 'INVALID', HEAVY_CHAIN_SEQ[:-2], HEAVY_CHAIN_SEQ,
+                HEAVY_CHAIN_SEQ[1:], HEAVY_CHAIN_SEQ[:-1], HEAVY_CHAIN_SEQ[2:]]
+        path.write_text(''.join(f'>s{i}\n{seq}\n' for i, seq in enumerate(seqs)))
+        return str(path)
+
+    def test_same_as_run_pipeline(self, fasta, tmp_path):
+        """Merged shards equal the output of an uninterrupted run."""
+        run_pipeline(fasta, str(tmp_path / 'whole.tsv'), germline=True)
+        counts = run_sharded_pipeline(fasta, str(tmp_path / 'job'), shard_size=3,
+                                      output_format='tsv', germline=True, batch_size=2)
+        assert counts == {'n_input': 7, 'n_numbered': 6, 'n_failed': 1}
+        assert sorted(os.listdir(tmp_path / 'job')) == [MANIFEST, 'part-00000.tsv',
+                                                        'part-00001.tsv', 'part-00002.tsv']
+        assert merge_shards(str(tmp_path / 'job'), str(tmp_path / 'merged.tsv')) == 7
+        assert (tmp_path / 'merged.tsv').read_text() == (tmp_path / 'whole.tsv').read_text()
+
+    def test_resume(self, fasta, tmp_path, monkeypatch):
+        """An interrupted job resumes after its last committed shard."""
+        job = str(tmp_path / 'job')
+        numbered = []
+        real_iter_annotation_rows = pipeline.iter_annotation_rows
+
+        def interrupted(records, **kwargs):
+            records = list(records)
+            if len(numbered) == 2:
+                raise KeyboardInterrupt
+            numbered.append([name for name, _ in records])
+            yield from real_iter_annotation_rows(records, **kwargs)
+
+        monkeypatch.setattr(pipeline, 'iter_annotation_rows', interrupted)
+        with pytest.raises(KeyboardInterrupt):
+            run_sharded_pipeline(fasta, job, shard_size=2)
+        with open(os.path.join(job, MANIFEST)) as f:
+            manifest = json.load(f)
+        assert not manifest['complete']
+        assert [shard['file'] for shard in manifest['shards']] == ['part-00000.csv',
+                                                                   'part-00001.csv']
+        # The interrupted shard was never renamed into place.
+        assert 'part-00002.csv' not in os.listdir(job)
+
+        monkeypatch.setattr(pipeline, 'iter_annotation_rows', real_iter_annotation_rows)
+        counts = run_sharded_pipeline(fasta, job, shard_size=2)
+        assert counts['n_input'] == 7
+        run_pipeline(fasta, str(tmp_path / 'whole.csv'))
+        merge_shards(job, str(tmp_path / 'merged.csv'))
+        assert (tmp_path / 'merged.csv').read_text() == (tmp_path / 'whole.csv').read_text()
+
+    def test_complete_job_is_skipped(self, fasta, tmp_path, monkeypatch):
+        """Running a complete job again numbers nothing."""
+        job = str(tmp_path / 'job')
+        first = run_sharded_pipeline(fasta, job, shard_size=4)
+        monkeypatch.setattr(pipeline, 'iter_annotation_rows', None)
+        assert run_sharded_pipeline(fasta, job, shard_size=4) == first
+
+    def test_missing_shard_is_redone(self, fasta, tmp_path):
+        """Shards from the first missing file onwards are written again."""
+        job = tmp_path / 'job'
+        run_sharded_pipeline(fasta, str(job), shard_size=2)
+        expected = (job / 'part-00002.csv').read_text()
+        os.remove(job / 'part-00002.csv')
+        run_sharded_pipeline(fasta, str(job), shard_size=2)
+        assert (job / 'part-00002.csv').read_text() == expected
+
+    def test_different_job_refused(self, fasta, tmp_path):
+        """Another input or other options cannot reuse the directory."""
+        job = str(tmp_path / 'job')
+        run_sharded_pipeline(fasta, job, shard_size=4)
+        with pytest.raises(ValueError, match='different job'):
+            run_sharded_pipeline(fasta, job, shard_size=4, scheme='kabat')
+        with pytest.raises(ValueError, match='different job'):
+            run_sharded_pipeline(fasta, job, shard_size=4, prefilter=Prefilter())
+        with pytest.raises(ValueError):
+            run_sharded_pipeline('-', str(tmp_path / 'stdin'))
+
+    def test_cli_shards(self, fasta, tmp_path, capsys):
+        """pat-number --shards writes shards and merges them into -o."""
+        out = tmp_path / 'out.csv'
+        args = [fasta, '-o', str(out), '--shards', str(tmp_path / 'job'), '--shard-size', '3']
+        assert cli.main(args) == 0
+        assert cli.main(args) == 0
+        assert 'numbered 6 of 7' in capsys.readouterr().err
+        run_pipeline(fasta, str(tmp_path / 'whole.csv'))
+        assert out.read_text() == (tmp_path / 'whole.csv').read_text()
+
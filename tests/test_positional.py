@@ -0,0 +1,112 @@
+"""
+Tests for alignment-free positional identity.
+"""
+import math
+
+import numpy as np
+import pytest
+from protein_ab_tools.ab_analysis.positional import PositionalLibrary, positional_identity
+
+HEAVY_CHAIN_SEQ = 'QVQLVESGGGVVQPGRSLRLDCKASGITFSNSGMHWVRQAPGKGLEWVAVIWYDGSKRYYADSVKGRFTISRNSKNTLFLQMNSLRAEDTAVYYCATNDDYWGQGTLVTTVSS'
+
+
+def _numbered(residues):
+    """Numbered domain from a {position: aa} dict, with gaps as '-'."""
+    return [(pos, aa) for pos, aa in residues.items()]
+
+
+# IMGT positions: 1-3 are FWR1, 27-28 CDR1 and 111/111A/112A/112 CDR3.
+CHAIN_A = _numbered({(1, ' '): 'Q', (2, ' '): 'V', (3, ' '): 'Q', (27, ' '): 'G',
+                     (28, ' '): 'F', (111, ' '): 'A', (111, 'A'): 'R', (112, ' '): 'Y'})
+CHAIN_B = _numbered({(1, ' '): 'Q', (2, ' '): 'V', (3, ' '): 'K', (27, ' '): 'G',
+                     (28, ' '): '-', (111, ' '): 'A', (112, 'A'): 'W', (112, ' '): 'Y'})
+CHAIN_C = _numbered({(1, ' '): 'E', (2, ' '): 'V', (3, ' '): 'Q', (27, ' '): 'S',
+                     (28, ' '): 'F', (111, ' '): 'A', (112, ' '): 'Y'})
+
+
+class TestPositionalIdentity:
+    """Test the pairwise positional_identity function."""
+
+    def test_identical(self):
+        assert positional_identity(CHAIN_A, CHAIN_A) == 100.0
+
+    def test_gaps_and_insertions(self):
+        """Occupied positions of either chain count; matches need the same residue."""
+        # Union of occupied positions: 1, 2, 3, 27, 28, 111, 111A, 112A, 112 = 9;
+        # matches at 1, 2, 27, 111, 112 = 5.
+        assert positional_identity(CHAIN_A, CHAIN_B) == pytest.approx(5 / 9 * 100)
+        assert positional_identity(CHAIN_B, CHAIN_A) == positional_identity(CHAIN_A, CHAIN_B)
+
+    def test_regions(self):
+        """CDR-only identity uses the region keys of extract_regions."""
+        # CDR1 and CDR3 positions: 27, 28, 111, 111A, 112A, 112 -> matches 27, 111, 112.
+        identity = positional_identity(CHAIN_A, CHAIN_B, regions=['vh_cdr1', 'vh_cdr3'])
+        assert identity == pytest.approx(3 / 6 * 100)
+        assert positional_identity(CHAIN_A, CHAIN_B, regions=['vh_fwr1']) == pytest.approx(
+            2 / 3 * 100)
+
+    def test_unknown_region(self):
+        with pytest.raises(ValueError):
+            positional_identity(CHAIN_A, CHAIN_B, regions=['vl_cdr1'])
+
+    def test_nothing_to_compare(self):
+        assert math.isnan(positional_identity(CHAIN_A, CHAIN_B, regions=['vh_fwr4']))
+
+
+class TestPositionalLibrary:
+    """Test the vectorised PositionalLibrary."""
+
+    CHAINS = [CHAIN_A, CHAIN_B, CHAIN_C]
+
+    def test_encoding(self):
+        library = PositionalLibrary.from_numbering(self.CHAINS, names=['a', 'b', 'c'])
+        assert library.matrix.dtype == np.uint8
+        assert library.matrix.shape == (3, 9)
+        assert len(library) == 3
+        row = dict(zip(library.positions, library.matrix[1]))
+        assert row[(28, ' ')] == 0
+        assert row[(112, 'A')] == ord('W')
+
+    @pytest.mark.parametrize('regions', [None, ['vh_cdr1', 'vh_cdr3'], ['vh_fwr1']])
+    def test_matrix_matches_pairwise(self, regions):
+        library = PositionalLibrary.from_numbering(self.CHAINS)
+        expected = [[positional_identity(a, b, regions=regions) for b in self.CHAINS]
+                    for a in self.CHAINS]
+        np.testing.assert_allclose(library.identity_matrix(regions=regions), expected)
+
+    def test_one_vs_many(self):
+        library = PositionalLibrary.from_numbering(self.CHAINS[1:])
+        expected = [positional_identity(CHAIN_A, b) for b in self.CHAINS[1:]]
+        np.testing.assert_allclose(library.identity(CHAIN_A), expected)
+
+    def test_query_positions_missing_from_library(self):
+        """Query residues at positions the library lacks count as mismatches."""
+        library = PositionalLibrary.from_numbering([CHAIN_C])
+        expected = [positional_identity(CHAIN_A, CHAIN_C)]
+        np.testing.assert_allclose(library.identity(CHAIN_A), expected)
+        np.testing.assert_allclose(library.identity(CHAIN_A, regions=['vh_cdr3']),
+                                   [positional_identity(CHAIN_A, CHAIN_C, regions=['vh_cdr3'])])
+
+    def test_blocks(self):
+        library = PositionalLibrary.from_numbering(self.CHAINS)
+        np.testing.assert_array_equal(library.identity_matrix(self.CHAINS, block_size=1),
+                                      library.identity_matrix())
+
+    def test_empty_comparison_is_nan(self):
+        library = PositionalLibrary.from_numbering(self.CHAINS)
+        assert np.isnan(library.identity_matrix(regions=['vh_fwr4'])).all()
+
+
+@pytest.mark.requires_anarci
+class TestWithNumbering:
+    """Positional identity of chains numbered by ANARCI."""
+
+    def test_annotations(self):
+        from protein_ab_tools.ab_analysis.numbering import annotate_batch
+        mutant = HEAVY_CHAIN_SEQ.replace('GITFSNSGMH', 'GFTFSSYAMH')
+        annotations = annotate_batch([HEAVY_CHAIN_SEQ, mutant], germline=False)
+        identity = positional_identity(*annotations)
+        assert 90 < identity < 100
+        assert positional_identity(*annotations, regions=['vh_fwr1', 'vh_fwr2']) == 100.0
+        library = PositionalLibrary.from_numbering(annotations)
+        assert library.identity(annotations[0])[1] == pytest.approx(identity)
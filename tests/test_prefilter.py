@@ -0,0 +1,103 @@
+"""
+Tests for the pre-numbering sequence screen.
+"""
+import pytest
+from protein_ab_tools.ab_analysis import numbering
+from protein_ab_tools.ab_analysis.prefilter import (INVALID_CHARACTERS, NO_V_MOTIF,
+                                                    PREFILTER_ERROR, TOO_LONG, TOO_SHORT,
+                                                    Prefilter)
+
+HEAVY_CHAIN_SEQ = 'QVQLVESGGGVVQPGRSLRLDCKASGITFSNSGMHWVRQAPGKGLEWVAVIWYDGSKRYYADSVKGRFTISRNSKNTLFLQMNSLRAEDTAVYYCATNDDYWGQGTLVTTVSS'
+LIGHT_CHAIN_SEQ = 'EIVLTQSPATLSLSPGERATLSCRASQSVSGYLAWYQQKPGQAPRLLIYDASNRATGIPARFSGSGSGTDFTLTISSLEPEDFAVYYCQQSSNWPRTFGQGTKVEIK'
+# Human serum albumin, residues 25-144: right length, no V-domain motif.
+NON_ANTIBODY_SEQ = ('DAHKSEVAHRFKDLGEENFKALVLIAFAQYLQQCPFEDHVKLVNEVTEFAKTCVADESAENCDKSLHTLFGDKLCTVA'
+                    'TLRETYGEMADCCAKQEPERNECFLQHKDDNPNLPRLVRPEV')
+
+
+class TestPrefilter:
+    """Test Prefilter.check and its reasons."""
+
+    def test_antibodies_pass(self):
+        """Heavy and light variable domains pass."""
+        prefilter = Prefilter()
+        assert prefilter.check(HEAVY_CHAIN_SEQ) is None
+        assert prefilter.check(LIGHT_CHAIN_SEQ) is None
+        assert prefilter.check(HEAVY_CHAIN_SEQ.lower()) is None
+
+    def test_reasons(self):
+        """Each failed check gives its own reason."""
+        prefilter = Prefilter()
+        assert prefilter.check('QVQLVESGG') == TOO_SHORT
+        assert prefilter.check(HEAVY_CHAIN_SEQ * 20) == TOO_LONG
+        assert prefilter.check(HEAVY_CHAIN_SEQ.replace('W', '*', 1)) == INVALID_CHARACTERS
+        assert prefilter.check(NON_ANTIBODY_SEQ) == NO_V_MOTIF
+
+    def test_truncated_before_cdr3(self):
+        """trp_cys_spacing=None keeps domains without Cys104."""
+        truncated = HEAVY_CHAIN_SEQ[:85]
+        assert Prefilter().check(truncated) == NO_V_MOTIF
+        assert Prefilter(trp_cys_spacing=None).check(truncated) is None
+
+    def test_no_motif(self):
+        """check_motif=False only checks length and alphabet."""
+        prefilter = Prefilter(check_motif=False)
+        assert prefilter.check(NON_ANTIBODY_SEQ) is None
+        assert prefilter.check('QVQLVESGG') == TOO_SHORT
+
+    def test_filter_and_stats(self):
+        """filter splits indices and stats counts the reasons."""
+        prefilter = Prefilter()
+        passed, rejected = prefilter.filter([HEAVY_CHAIN_SEQ, 'QVQ', NON_ANTIBODY_SEQ,
+                                             LIGHT_CHAIN_SEQ])
+        assert passed == [0, 3]
+        assert rejected == {1: TOO_SHORT, 2: NO_V_MOTIF}
+        stats = prefilter.stats()
+        assert stats['n_checked'] == 4
+        assert stats['n_rejected'] == 2
+        assert stats[TOO_SHORT] == 1 and stats[NO_V_MOTIF] == 1 and stats[TOO_LONG] == 0
+        prefilter.reset()
+        assert prefilter.stats()['n_checked'] == 0
+
+    @pytest.mark.requires_anarci
+    def test_germline_recall(self):
+        """Nearly every antibody germline V gene shipped with anarci passes."""
+        from anarci.germlines import all_germlines
+        genes = [seq.replace('-', '')
+                 for chain_type in 'HKL'
+                 for species in all_germlines['V'][chain_type].values()
+                 for seq in species.values()]
+        # Germline V genes end just after Cys104; pad them like a rearranged CDR3.
+        prefilter = Prefilter()
+        passed, _ = prefilter.filter(gene + 'ARDYWGQGTLVTVSS' for gene in genes)
+        assert len(passed) / len(genes) > 0.99
+
+
+@pytest.mark.requires_anarci
+class TestPrefilterNumbering:
+    """Test the prefilter ahead of run_numbering_batch and run_numbering."""
+
+    def test_rejected_sequences_skip_anarci(self, monkeypatch):
+        """Rejected sequences never reach anarci and are counted by reason."""
+        numbered = []
+        anarci = numbering.anarci
+
+        def spy(sequences, **kwargs):
+            numbered.extend(seq for _, seq in sequences)
+            return anarci(sequences, **kwargs)
+
+        monkeypatch.setattr(numbering, 'anarci', spy)
+        prefilter = Prefilter()
+        seqs = [HEAVY_CHAIN_SEQ, NON_ANTIBODY_SEQ, 'QVQ', NON_ANTIBODY_SEQ]
+        records = numbering.run_numbering_batch(seqs, chain='H', prefilter=prefilter)
+        assert numbered == [HEAVY_CHAIN_SEQ]
+        assert records[0].ok
+        assert records[1].error == f'{PREFILTER_ERROR}: {NO_V_MOTIF}'
+        assert records.rejections == {NO_V_MOTIF: 2, TOO_SHORT: 1}
+        # Duplicates are screened once.
+        assert prefilter.stats()['n_checked'] == 3
+        assert records.stats['n_failed'] == 3
+
+    def test_run_numbering(self):
+        """run_numbering raises for rejected sequences."""
+        with pytest.raises(ValueError, match=PREFILTER_ERROR):
+            numbering.run_numbering(NON_ANTIBODY_SEQ, prefilter=Prefilter())
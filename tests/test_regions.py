@@ -0,0 +1,99 @@
+"""
+Tests for region lookup tables and region extraction.
+"""
+import random
+
+import pytest
+from protein_ab_tools.ab_analysis.regions import (
+    NO_REGION,
+    _breakpoints,
+    region_table,
+    regions_from_numbering,
+    regions_from_numbering_batch,
+)
+
+SCHEMES = ['imgt', 'kabat', 'chothia', 'abm', 'martin', 'aho']
+
+
+def _linear_scan_regions(numbered, scheme, chain):
+    """Reference implementation: linear scan over the breakpoints."""
+    breakpoint = _breakpoints(scheme, chain)
+    prefix = 'vh' if chain == 'H' else 'vl'
+    regions = {f'{prefix}_{k}': '' for k in breakpoint}
+    for (number, _), aa in numbered:
+        region = next((k for k, v in breakpoint.items() if v[0] <= number <= v[1]), None)
+        if region is not None:
+            regions[f'{prefix}_{region}'] += aa
+    return regions
+
+
+def _random_numbering(rng, max_position=150):
+    numbered = []
+    for number in range(1, max_position + 1):
+        numbered.append(((number, ' '), rng.choice('ACDEFGHIKLMNPQRSTVWY-')))
+        if rng.random() < 0.05:
+            numbered.append(((number, 'A'), rng.choice('ACDEFGHIKLMNPQRSTVWY')))
+    return numbered
+
+
+class TestRegionTable:
+    """Test the region_table function."""
+
+    @pytest.mark.parametrize('scheme', SCHEMES)
+    @pytest.mark.parametrize('chain', ['H', 'L'])
+    def test_lookup_matches_breakpoints(self, scheme, chain):
+        """Every position maps to the region its breakpoint range defines."""
+        table = region_table(scheme, chain)
+        breakpoint = _breakpoints(scheme, chain)
+        for number in range(len(table.lookup)):
+            expected = next((i for i, (start, end) in enumerate(breakpoint.values())
+                             if start <= number <= end), NO_REGION)
+            assert table.lookup[number] == expected
+            assert table.array[number] == expected
+
+    def test_built_once(self):
+        """Tables are cached per scheme and chain."""
+        assert region_table('imgt', 'H') is region_table('IMGT', 'H')
+        assert region_table('imgt', 'H') is not region_table('imgt', 'L')
+
+    def test_read_only(self):
+        """The shared lookup array cannot be modified."""
+        with pytest.raises(ValueError):
+            region_table('imgt', 'H').array[1] = 0
+
+    def test_invalid_scheme(self):
+        """Unknown schemes raise ValueError."""
+        with pytest.raises(ValueError, match="Invalid numbering scheme"):
+            region_table('invalid', 'H')
+
+
+class TestRegionsFromNumbering:
+    """Test regions_from_numbering and its batch version."""
+
+    @pytest.mark.parametrize('scheme', SCHEMES)
+    @pytest.mark.parametrize('chain', ['H', 'L'])
+    def test_matches_linear_scan(self, scheme, chain):
+        """Results equal the linear scan over breakpoints."""
+        rng = random.Random(0)
+        numbered = _random_numbering(rng)
+        assert (regions_from_numbering(numbered, scheme, chain)
+                == _linear_scan_regions(numbered, scheme, chain))
+
+    @pytest.mark.parametrize('scheme', SCHEMES)
+    def test_batch_matches_single(self, scheme):
+        """The vectorised batch gives the same regions as one-by-one extraction."""
+        rng = random.Random(1)
+        numbered_list = [_random_numbering(rng, rng.randint(0, 150)) for _ in range(20)]
+        batch = regions_from_numbering_batch(numbered_list, scheme, 'L')
+        assert batch == [regions_from_numbering(n, scheme, 'L') for n in numbered_list]
+
+    def test_batch_empty(self):
+        """An empty batch gives an empty list."""
+        assert regions_from_numbering_batch([], 'imgt', 'H') == []
+
+    def test_out_of_range_positions_ignored(self):
+        """Positions outside every region are dropped."""
+        numbered = [((0, ' '), 'A'), ((1, ' '), 'Q'), ((500, ' '), 'W')]
+        regions = regions_from_numbering(numbered, 'imgt', 'H')
+        assert regions['vh_fwr1'] == 'Q'
+        assert regions_from_numbering_batch([numbered], 'imgt', 'H') == [regions]
@@ -0,0 +1,140 @@
+"""
+Tests for the columnar repertoire store.
+"""
+import numpy as np
+import pytest
+from protein_ab_tools.ab_analysis.numbering import NumberingRecord
+from protein_ab_tools.ab_analysis.positional import positional_identity
+from protein_ab_tools.ab_analysis.repertoire import Repertoire, position_axis, position_label
+
+HEAVY_CHAIN_SEQ = 'QVQLVESGGGVVQPGRSLRLDCKASGITFSNSGMHWVRQAPGKGLEWVAVIWYDGSKRYYADSVKGRFTISRNSKNTLFLQMNSLRAEDTAVYYCATNDDYWGQGTLVTTVSS'
+
+CHAIN_A = [((1, ' '), 'Q'), ((2, ' '), 'V'), ((3, ' '), '-'), ((111, ' '), 'A'),
+           ((111, 'A'), 'R'), ((112, 'A'), 'S'), ((112, ' '), 'Y')]
+CHAIN_B = [((1, ' '), 'E'), ((2, ' '), 'V'), ((3, ' '), 'K'), ((111, ' '), 'A'),
+           ((111, 'A'), 'R'), ((111, 'B'), 'G'), ((112, 'B'), 'T'), ((112, 'A'), 'S'),
+           ((112, ' '), 'Y')]
+
+
+def _record(name, numbered, species='human'):
+    details = {'chain_type': 'H', 'species': species,
+               'germlines': {'v_gene': [('human', 'IGHV3-33*01'), 0.9],
+                             'j_gene': [('human', 'IGHJ4*01'), 0.95]}}
+    return NumberingRecord(name, '', result=([[(numbered, 0, 0)]], [[details]], [None]))
+
+
+class TestPositionAxis:
+    """Test the scheme position axis."""
+
+    def test_imgt_cdr3_insertions(self):
+        """IMGT insertions at 112 come before 112, in reverse order."""
+        axis = position_axis([(111, 'A'), (111, 'B'), (112, 'A'), (112, 'B')], 'imgt', 'H')
+        labels = [position_label(pos) for pos in axis]
+        start = labels.index('110')
+        assert labels[start:start + 8] == ['110', '111', '111A', '111B', '112B', '112A', '112',
+                                           '113']
+
+    def test_covers_scheme(self):
+        axis = position_axis([], 'imgt', 'H')
+        assert axis[0] == (1, ' ')
+        assert axis[-1] == (128, ' ')
+        assert len(axis) == 128
+
+    def test_kabat_insertions_follow(self):
+        axis = position_axis([(82, 'A'), (82, 'B')], 'kabat', 'H')
+        labels = [position_label(pos) for pos in axis]
+        start = labels.index('82')
+        assert labels[start:start + 4] == ['82', '82A', '82B', '83']
+
+
+class TestRepertoire:
+    """Test building, exporting and persisting repertoires."""
+
+    def test_from_numbering(self):
+        repertoire = Repertoire.from_numbering([CHAIN_A, CHAIN_B])
+        assert repertoire.residues.dtype == np.uint8
+        assert repertoire.residues.shape == (2, 128 + 4)
+        assert repertoire.sequence(0) == 'QVARSY'
+        assert repertoire.numbering(1) == [pos for pos in CHAIN_B if pos[1] != '-']
+
+    def test_msa(self):
+        repertoire = Repertoire.from_numbering([CHAIN_A, CHAIN_B])
+        msa = repertoire.msa(regions=['vh_cdr3'])
+        # CDR3 is IMGT 105-117 plus the four insertions.
+        assert all(len(row) == 17 for row in msa)
+        assert msa[0].replace('-', '') == 'ARSY'
+        assert msa[1][6:12] == 'ARGTSY'
+        assert msa[0][6:12] == 'AR--SY'
+
+    def test_write_msa(self, tmp_path):
+        repertoire = Repertoire.from_numbering([CHAIN_A, CHAIN_B],
+                                               metadata={'name': ['a', 'b']})
+        repertoire.write_msa(tmp_path / 'msa.fasta')
+        lines = (tmp_path / 'msa.fasta').read_text().splitlines()
+        assert lines[0] == '>a' and lines[2] == '>b'
+        assert lines[1] == repertoire.msa()[0]
+
+    def test_from_records(self):
+        records = [_record('a', CHAIN_A), NumberingRecord('bad', 'XXX', error='Invalid'),
+                   _record('b', CHAIN_B, species='mouse')]
+        repertoire = Repertoire.from_records(records)
+        assert len(repertoire) == 2
+        assert repertoire.names == ['a', 'b']
+        assert list(repertoire.metadata['species']) == ['human', 'mouse']
+        assert list(repertoire.metadata['v_gene']) == ['IGHV3-33*01'] * 2
+        np.testing.assert_allclose(repertoire.metadata['j_identity'], [0.95, 0.95])
+
+    def test_from_chain_records(self):
+        """Records of run_numbering_batch(..., as_chain=True) give the same repertoire."""
+        from protein_ab_tools.ab_analysis.chain import NumberedChain
+        records = [_record('a', CHAIN_A), _record('b', CHAIN_B)]
+        chain_records = [NumberingRecord(r.name, r.seq, result=NumberedChain.from_result(r.result))
+                         for r in records]
+        expected = Repertoire.from_records(records)
+        repertoire = Repertoire.from_records(chain_records)
+        assert repertoire.positions == expected.positions
+        assert repertoire.msa() == expected.msa()
+        assert repertoire.names == ['a', 'b']
+        assert list(repertoire.metadata['j_gene']) == ['IGHJ4*01'] * 2
+
+    def test_save_and_load(self, tmp_path):
+        repertoire = Repertoire.from_records([_record('a', CHAIN_A), _record('b', CHAIN_B)])
+        repertoire.save(tmp_path / 'rep')
+        loaded = Repertoire.load(tmp_path / 'rep')
+        assert isinstance(loaded.residues, np.memmap)
+        assert isinstance(loaded.metadata['species'], np.memmap)
+        assert loaded.positions == repertoire.positions
+        assert loaded.msa() == repertoire.msa()
+        assert loaded.names == ['a', 'b']
+        assert (loaded.scheme, loaded.chain) == ('imgt', 'H')
+
+    def test_to_positional_library(self):
+        repertoire = Repertoire.from_numbering([CHAIN_A, CHAIN_B])
+        library = repertoire.to_positional_library()
+        assert library.identity(CHAIN_A)[1] == pytest.approx(
+            positional_identity(CHAIN_A, CHAIN_B))
+
+    def test_metadata_length_checked(self):
+        with pytest.raises(ValueError):
+            Repertoire.from_numbering([CHAIN_A], metadata={'name': ['a', 'b']})
+
+
+@pytest.mark.requires_anarci
+class TestRepertoireFromNumbering:
+    """Repertoires of sequences numbered by ANARCI."""
+
+    def test_round_trip(self, tmp_path):
+        from protein_ab_tools.ab_analysis.numbering import run_numbering_batch
+        records = run_numbering_batch([HEAVY_CHAIN_SEQ], names=['vh'], germline=True)
+        repertoire = Repertoire.from_records(records)
+        assert repertoire.sequence(0) == HEAVY_CHAIN_SEQ
+        assert repertoire.metadata['v_gene'][0].startswith('IGHV')
+        repertoire.save(tmp_path / 'rep')
+        assert Repertoire.load(tmp_path / 'rep').sequence(0) == HEAVY_CHAIN_SEQ
+
+    def test_as_chain_records(self):
+        from protein_ab_tools.ab_analysis.numbering import run_numbering_batch
+        records = run_numbering_batch([HEAVY_CHAIN_SEQ], names=['vh'], as_chain=True)
+        repertoire = Repertoire.from_records(records)
+        assert repertoire.sequence(0) == HEAVY_CHAIN_SEQ
+        assert repertoire.names == ['vh']
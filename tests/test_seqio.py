@@ -0,0 +1,158 @@
+"""
+Tests for the lazy sequence readers and table writers.
+"""
+import csv
+import gzip
+import io
+
+import pytest
+from protein_ab_tools import seqio
+from protein_ab_tools.seqio import (
+    TableWriter,
+    format_from_path,
+    read_fasta,
+    read_fastq,
+    read_rows,
+    read_sequences,
+    read_table,
+)
+
+
+class TestReaders:
+    """Test the FASTA, FASTQ and table readers."""
+
+    def test_fasta(self):
+        """Multi-line records are joined and names are the first header word."""
+        lines = ['>seq1 some description\n', 'QVQ\n', 'LVE\n', '\n', '>seq2\n', 'EIV\n']
+        assert list(read_fasta(lines)) == [('seq1', 'QVQLVE'), ('seq2', 'EIV')]
+
+    def test_fasta_without_header(self):
+        """Sequence data before a header is an error."""
+        with pytest.raises(ValueError):
+            list(read_fasta(['QVQ\n']))
+
+    def test_fastq(self):
+        """Qualities are skipped."""
+        lines = ['@r1 x\n', 'QVQ\n', '+\n', 'III\n', '@r2\n', 'EIV\n', '+r2\n', 'III\n']
+        assert list(read_fastq(lines)) == [('r1', 'QVQ'), ('r2', 'EIV')]
+
+    def test_fastq_truncated(self):
+        """A record missing lines is an error."""
+        with pytest.raises(ValueError, match='Truncated'):
+            list(read_fastq(['@r1\n', 'QVQ\n']))
+
+    def test_table(self):
+        """Sequence and name columns are selected by header."""
+        lines = ['id,sequence\n', 'a,QVQ\n', 'b,EIV\n']
+        assert list(read_table(lines, name_column='id')) == [('a', 'QVQ'), ('b', 'EIV')]
+        assert list(read_table(lines)) == [('0', 'QVQ'), ('1', 'EIV')]
+
+    def test_table_missing_column(self):
+        """A missing sequence column is reported."""
+        with pytest.raises(ValueError, match='not found'):
+            list(read_table(['id,seq\n', 'a,QVQ\n']))
+
+    def test_readers_are_lazy(self):
+        """Readers only consume the lines they need."""
+        consumed = []
+
+        def lines():
+            for i in range(1000):
+                consumed.append(i)
+                yield f'>s{i}\n'
+                yield 'QVQ\n'
+
+        first = next(read_fasta(lines()))
+        assert first == ('s0', 'QVQ')
+        assert len(consumed) <= 2
+
+
+class TestReadSequences:
+    """Test format detection in read_sequences."""
+
+    def test_format_from_path(self):
+        """Extensions, including gzipped ones, map to formats."""
+        assert format_from_path('x.fasta') == 'fasta'
+        assert format_from_path('x.FQ.gz') == 'fastq'
+        assert format_from_path('x.tsv') == 'tsv'
+        assert format_from_path('x.unknown') is None
+
+    def test_gzipped_file(self, tmp_path):
+        """Gzipped files are read transparently."""
+        path = tmp_path / 'seqs.fa.gz'
+        with gzip.open(path, 'wt') as f:
+            f.write('>a\nQVQ\n')
+        assert list(read_sequences(str(path))) == [('a', 'QVQ')]
+
+    @pytest.mark.parametrize('text, expected', [
+        ('>a\nQVQ\n', [('a', 'QVQ')]),
+        ('\n@a\nQVQ\n+\nIII\n', [('a', 'QVQ')]),
+        ('name\tsequence\na\tQVQ\n', [('0', 'QVQ')]),
+        ('name,sequence\na,QVQ\n', [('0', 'QVQ')]),
+    ])
+    def test_stdin_sniffing(self, monkeypatch, text, expected):
+        """The format of stdin is guessed from its first line."""
+        monkeypatch.setattr(seqio.sys, 'stdin', io.StringIO(text))
+        assert list(read_sequences('-')) == expected
+
+    def test_unsupported_format(self):
+        """Unknown input formats are rejected."""
+        with pytest.raises(ValueError):
+            list(read_sequences('-', fmt='genbank'))
+
+
+class TestTableWriter:
+    """Test the TableWriter class."""
+
+    def test_csv_incremental(self, tmp_path):
+        """Rows are appended batch by batch under one header."""
+        path = tmp_path / 'out.csv'
+        with TableWriter(str(path), ['name', 'seq']) as writer:
+            writer.write_rows([{'name': 'a', 'seq': 'QVQ'}])
+            writer.write_rows([{'name': 'b', 'seq': 'EIV', 'extra': 1}])
+        with open(path) as f:
+            assert list(csv.DictReader(f)) == [{'name': 'a', 'seq': 'QVQ'},
+                                               {'name': 'b', 'seq': 'EIV'}]
+
+    def test_tsv_stream(self):
+        """Streams are written to and left open."""
+        stream = io.StringIO()
+        with TableWriter(stream, ['name', 'seq'], fmt='tsv') as writer:
+            writer.write_rows([{'name': 'a', 'seq': 'QVQ'}])
+        assert stream.getvalue() == 'name\tseq\na\tQVQ\n'
+        assert writer.rows_written == 1
+
+    def test_parquet(self, tmp_path):
+        """Parquet output is written one row group per batch."""
+        parquet = pytest.importorskip('pyarrow.parquet')
+        path = tmp_path / 'out.parquet'
+        with TableWriter(str(path), ['name', 'seq']) as writer:
+            writer.write_rows([{'name': 'a', 'seq': 'QVQ'}])
+            writer.write_rows([{'name': 'b', 'seq': None}])
+        table = parquet.read_table(path)
+        assert table.to_pylist() == [{'name': 'a', 'seq': 'QVQ'}, {'name': 'b', 'seq': None}]
+        assert parquet.ParquetFile(path).num_row_groups == 2
+
+    def test_parquet_needs_file(self):
+        """Parquet cannot be streamed to stdout."""
+        pytest.importorskip('pyarrow')
+        with pytest.raises(ValueError):
+            TableWriter('-', ['name'], fmt='parquet')
+
+
+class TestReadRows:
+    """Test read_rows."""
+
+    @pytest.mark.parametrize('name', ['out.csv', 'out.tsv.gz', 'out.parquet'])
+    def test_round_trip(self, tmp_path, name):
+        """Rows written by TableWriter are read back in batches, with None for empty values."""
+        if name.endswith('.parquet'):
+            pytest.importorskip('pyarrow')
+        path = str(tmp_path / name)
+        rows = [{'name': str(i), 'seq': 'QVQ' if i % 2 else None} for i in range(5)]
+        with TableWriter(path, ['name', 'seq']) as writer:
+            writer.write_rows(rows)
+        batches = list(read_rows(path, batch_size=2))
+        assert [len(batch) for batch in batches] == [2, 2, 1]
+        assert sum(batches, []) == rows
+
@@ -1,9 +1,16 @@
 """
 Tests for sequence alignment functionality.
 """
+import random
+
 import pytest
 from protein_ab_tools.align import sequence_align
-from protein_ab_tools.align.sequence_align import calc_percent_similarity
+from protein_ab_tools.align.sequence_align import (
+    calc_percent_similarity,
+    identity_upper_bound,
+    is_similar,
+    is_similar_batch,
+)
 
 
 class TestCalcPercentSimilarity:
@@ -155,3 +162,58 @@ class TestCalcPercentSimilarity:
             calc_percent_similarity('MALWMRLLPLL', 'MALWMRLLPLL', mode='blastp')
 
         assert build_count == 1
+
+
+def _random_pairs(n, seed=0):
+    rng = random.Random(seed)
+    alphabet = 'ACDEFGHIKLMNPQRSTVWY'
+    pairs = []
+    for _ in range(n):
+        letters = alphabet[:rng.randint(2, 20)]
+        pairs.append(tuple(''.join(rng.choice(letters) for _ in range(rng.randint(1, 40)))
+                           for _ in range(2)))
+    return pairs
+
+
+class TestIsSimilar:
+    """Test threshold similarity with pruning."""
+
+    def test_upper_bound_holds(self):
+        """The composition bound is never below the aligned similarity."""
+        for seq1, seq2 in _random_pairs(500):
+            assert calc_percent_similarity(seq1, seq2) <= identity_upper_bound(seq1, seq2)
+
+    @pytest.mark.parametrize('min_identity', [0, 30, 60, 90, 100])
+    def test_matches_full_alignment(self, min_identity):
+        for seq1, seq2 in _random_pairs(300, seed=min_identity):
+            expected = calc_percent_similarity(seq1, seq2) >= min_identity
+            assert is_similar(seq1, seq2, min_identity) == expected
+
+    def test_readme_example(self):
+        seq1 = 'MALWMRLLPLLALLALWGPDPAAA'
+        seq2 = 'MALWMRLLPLLALSSALWGPDPAAA'
+        similarity = calc_percent_similarity(seq1, seq2)
+        assert is_similar(seq1, seq2, min_identity=similarity)
+        assert not is_similar(seq1, seq2, min_identity=similarity + 0.01)
+
+    def test_pruned_pairs_are_not_aligned(self, monkeypatch):
+        """Pairs ruled out by length or composition never reach the aligner."""
+        calls = []
+        monkeypatch.setattr(sequence_align, 'calc_percent_similarity',
+                            lambda *args, **kwargs: calls.append(args) or 100.0)
+        assert not is_similar('MALWMRLLPLL', 'MALWMRLLPLLALLALWGPDPAAA', 90)
+        assert not is_similar('AAAAAAAAAA', 'GGGGGGGGGG', 90)
+        assert calls == []
+        assert is_similar('MALW', 'MALW', 90)
+        assert len(calls) == 1
+
+    def test_empty_sequences(self):
+        assert not is_similar('', '', 0)
+        assert not is_similar('MALW', '', 0)
+
+    def test_batch(self):
+        pairs = _random_pairs(50)
+        seqs1, seqs2 = zip(*pairs)
+        assert is_similar_batch(seqs1, seqs2, 50) == [is_similar(a, b, 50) for a, b in pairs]
+        with pytest.raises(ValueError):
+            is_similar_batch(['MALW'], [], 50)
@@ -0,0 +1,182 @@
+"""
+Tests for the local numbering server and its client.
+"""
+import asyncio
+import json
+import socket
+import socketserver
+import threading
+
+import pytest
+from protein_ab_tools import client as client_module
+from protein_ab_tools.ab_analysis.numbering import (extract_regions, run_numbering,
+                                                    run_numbering_batch)
+from protein_ab_tools.align import calc_percent_similarity
+from protein_ab_tools.client import NumberingClient, ServerError, parse_address
+from protein_ab_tools.server import NumberingServer
+from protein_ab_tools.testing import synthetic_sequences, use_fake_anarci
+
+HEAVY_CHAIN_SEQ = 'QVQLVESGGGVVQPGRSLRLDCKASGITFSNSGMHWVRQAPGKGLEWVAVIWYDGSKRYYADSVKGRFTISRNSKNTLFLQMNSLRAEDTAVYYCATNDDYWGQGTLVTTVSS'
+LIGHT_CHAIN_SEQ = 'EIVLTQSPATLSLSPGERATLSCRASQSVSGYLAWYQQKPGQAPRLLIYDASNRATGIPARFSGSGSGTDFTLTISSLEPEDFAVYYCQQSSNWPRTFGQGTKVEIK'
+
+
+@pytest.fixture
+def server(tmp_path):
+    """A NumberingServer listening on a Unix socket, run on a background event loop."""
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    server = NumberingServer(max_wait=0.02)
+    address = str(tmp_path / 'pat.sock')
+    asyncio.run_coroutine_threadsafe(server.start(address), loop).result(10)
+    yield server, address
+    client_module.disconnect()
+    asyncio.run_coroutine_threadsafe(server.close(), loop).result(10)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(10)
+    loop.close()
+
+
+class _DroppingHandler(socketserver.StreamRequestHandler):
+    """Answers pings, then breaks off the response to any other request."""
+
+    def handle(self):
+        request_line = self.rfile.readline().decode()
+        length = 0
+        while (line := self.rfile.readline()) not in (b'\r\n', b''):
+            if line.lower().startswith(b'content-length:'):
+                length = int(line.split(b':')[1])
+        self.rfile.read(length)
+        if ' /ping ' in request_line:
+            body = json.dumps({'status': 'ok'}).encode()
+            self.wfile.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                             b'Connection: close\r\nContent-Length: %d\r\n\r\n%s'
+                             % (len(body), body))
+        elif self.server.garble:
+            self.wfile.write(b'not http\r\n\r\n')
+        else:
+            self.wfile.write(b'HTTP/1.1 200 OK\r\nContent-Length: 1000\r\n\r\n{"res')
+
+
+@pytest.fixture(params=[False, True], ids=['dropped', 'garbled'])
+def dropping_server(request, tmp_path):
+    """The address of a server that fails every numbering request."""
+    address = str(tmp_path / 'dropping.sock')
+    with socketserver.ThreadingUnixStreamServer(address, _DroppingHandler) as server:
+        server.garble = request.param
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield address
+        client_module.disconnect()
+        server.shutdown()
+
+
+class TestParseAddress:
+    """Test parse_address."""
+
+    def test_addresses(self):
+        """Socket paths, host:port and http URLs are recognised."""
+        assert parse_address('/tmp/pat.sock') == ('unix', '/tmp/pat.sock')
+        assert parse_address('pat.sock') == ('unix', 'pat.sock')
+        assert parse_address('127.0.0.1:8765') == ('tcp', ('127.0.0.1', 8765))
+        assert parse_address('http://localhost:9000') == ('tcp', ('localhost', 9000))
+
+
+class TestServer:
+    """Test the server endpoints that do not need anarci."""
+
+    def test_ping_and_stats(self, server):
+        """The server answers pings and counts requests."""
+        _, address = server
+        client = NumberingClient(address)
+        assert client.ping()['status'] == 'ok'
+        assert client.stats()['requests'] == {'/ping': 1, '/stats': 1}
+
+    def test_similarity(self, server):
+        """Similarity matches calc_percent_similarity; errors raise ValueError."""
+        _, address = server
+        client = NumberingClient(address)
+        assert client.similarity(HEAVY_CHAIN_SEQ, LIGHT_CHAIN_SEQ) == \
+            calc_percent_similarity(HEAVY_CHAIN_SEQ, LIGHT_CHAIN_SEQ)
+        with pytest.raises(ValueError):
+            client.similarity('', 'ACD')
+
+    def test_bad_requests(self, server):
+        """Unknown endpoints and arguments are reported as server errors."""
+        _, address = server
+        client = NumberingClient(address)
+        with pytest.raises(ServerError, match='No endpoint'):
+            client.request('GET', '/missing')
+        with pytest.raises(ServerError):
+            client.request('POST', '/similarity', {'seq': 'ACD'})
+
+    @pytest.mark.parametrize('length', [b'abc', b'-5'])
+    def test_bad_content_length(self, server, length):
+        """A malformed or negative Content-Length gets a 400 response."""
+        _, address = server
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(10)
+            sock.connect(address)
+            sock.sendall(b'POST /similarity HTTP/1.1\r\nContent-Length: %s\r\n\r\n' % length)
+            response = sock.makefile('rb').read()
+        assert response.startswith(b'HTTP/1.1 400 ')
+        assert json.loads(response.split(b'\r\n\r\n', 1)[1]) == \
+            {'error': 'Malformed Content-Length'}
+
+    def test_routing_falls_back(self, tmp_path, monkeypatch):
+        """With no server running, PAT_SERVER is ignored."""
+        monkeypatch.setenv(client_module.ENV_VAR, str(tmp_path / 'missing.sock'))
+        assert client_module.active_client() is None
+        with pytest.raises(ConnectionError):
+            client_module.connect(str(tmp_path / 'missing.sock'))
+
+    def test_broken_response_falls_back(self, dropping_server):
+        """A server that drops or garbles a response is left for local numbering."""
+        seqs = synthetic_sequences(1, seed=1) + ['INVALID']
+        with use_fake_anarci():
+            local = run_numbering_batch(seqs)
+            client_module.connect(dropping_server)
+            assert [r.result for r in run_numbering_batch(seqs)] == [r.result for r in local]
+            assert client_module.active_client() is None
+            client_module.connect(dropping_server)
+            assert run_numbering(seqs[0], name='H-imgt-0') == local[0].result
+            assert client_module.active_client() is None
+
+    def test_broken_response_is_oserror(self, dropping_server):
+        """Dropped and garbled responses raise OSErrors."""
+        client = NumberingClient(dropping_server)
+        with pytest.raises(OSError):
+            client.similarity(HEAVY_CHAIN_SEQ, LIGHT_CHAIN_SEQ)
+
+
+@pytest.mark.requires_anarci
+class TestServerNumbering:
+    """Test numbering through the server."""
+
+    def test_number_and_regions(self, server):
+        """Server results equal local results."""
+        _, address = server
+        client = NumberingClient(address)
+        assert client.number(HEAVY_CHAIN_SEQ, name='h', germline=True) == \
+            run_numbering(HEAVY_CHAIN_SEQ, name='h', germline=True)
+        assert client.regions(LIGHT_CHAIN_SEQ, chain='L') == \
+            extract_regions(LIGHT_CHAIN_SEQ, chain='L')
+        with pytest.raises(ValueError, match='Invalid sequence'):
+            client.number('A' * 100)
+
+    def test_routing(self, server):
+        """After connect, run_numbering and run_numbering_batch use the server."""
+        numbering_server, address = server
+        seqs = [HEAVY_CHAIN_SEQ, 'INVALID', HEAVY_CHAIN_SEQ[:-1]]
+        local = run_numbering_batch(seqs, chain='H', as_chain=True)
+        client_module.connect(address)
+        routed = run_numbering_batch(seqs, chain='H', as_chain=True)
+        assert [r.result for r in routed] == [r.result for r in local]
+        assert [r.error for r in routed] == [r.error for r in local]
+        assert run_numbering(HEAVY_CHAIN_SEQ) == run_numbering_batch([HEAVY_CHAIN_SEQ],
+                                                                     names=['H-imgt'])[0].result
+        stats = client_module.active_client().stats()
+        assert stats['requests']['/number_batch'] == 2
+        assert stats['requests']['/number'] == 1
+        # Requests that arrive together share ANARCI calls.
+        assert stats['n_batches'] < stats['n_sequences']
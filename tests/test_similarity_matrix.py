@@ -0,0 +1,124 @@
+"""
+Tests for the similarity matrix engine.
+"""
+import importlib
+import math
+
+import numpy as np
+import pytest
+from protein_ab_tools.align.sequence_align import calc_percent_similarity
+from protein_ab_tools.align.similarity_matrix import is_similar_matrix, similarity_matrix
+
+SEQS = [
+    'MALWMRLLPLLALLALWGPDPAAA',
+    'MALWMRLLPLLALSSALWGPDPAAA',
+    'QVQLVESGGGVVQPGRSLRLDCKAS',
+    'EIVLTQSPATLSLSPGERATLSCRAS',
+    'MALWMRLLPLL',
+]
+
+
+def _pairwise(rows, cols):
+    return np.array([[calc_percent_similarity(a, b) for b in cols] for a in rows],
+                    dtype=np.float32)
+
+
+class TestSimilarityMatrix:
+    """Test the similarity_matrix function."""
+
+    @pytest.mark.parametrize('tile_size', [1, 2, 3, 100])
+    def test_square_matches_pairwise(self, tile_size):
+        """Every tiling gives the pairwise similarities of the upper triangle, mirrored."""
+        matrix = similarity_matrix(SEQS, tile_size=tile_size)
+        expected = _pairwise(SEQS, SEQS)
+        upper = np.triu_indices(len(SEQS))
+        assert matrix.dtype == np.float32
+        np.testing.assert_allclose(matrix[upper], expected[upper])
+        np.testing.assert_array_equal(matrix, matrix.T)
+        np.testing.assert_array_equal(np.diag(matrix), 100.0)
+
+    def test_only_upper_triangle_scored(self, monkeypatch):
+        """The square mode aligns each unordered pair once."""
+        module = importlib.import_module('protein_ab_tools.align.similarity_matrix')
+        calls = []
+        real = module.calc_percent_similarity
+
+        def counting(seq1, seq2, mode='blastp'):
+            calls.append((seq1, seq2))
+            return real(seq1, seq2, mode=mode)
+
+        monkeypatch.setattr(module, 'calc_percent_similarity', counting)
+        similarity_matrix(SEQS, tile_size=2)
+        n = len(SEQS)
+        assert len(calls) == n * (n + 1) // 2
+
+    def test_rectangular(self):
+        """Query-vs-library mode gives a len(seqs) x len(library) matrix."""
+        matrix = similarity_matrix(SEQS[:2], library=SEQS, tile_size=2)
+        np.testing.assert_allclose(matrix, _pairwise(SEQS[:2], SEQS))
+
+    def test_parallel_matches_serial(self):
+        """Process-pool tiles give the same matrix."""
+        serial = similarity_matrix(SEQS, tile_size=2)
+        parallel = similarity_matrix(SEQS, tile_size=2, n_jobs=2, max_pending=1)
+        np.testing.assert_array_equal(serial, parallel)
+
+    def test_memmap_output(self, tmp_path):
+        """A path writes a memory-mapped .npy file."""
+        path = tmp_path / 'sim.npy'
+        matrix = similarity_matrix(SEQS, tile_size=2, out=path)
+        assert isinstance(matrix, np.memmap)
+        np.testing.assert_array_equal(np.load(path), similarity_matrix(SEQS))
+
+    def test_existing_array(self):
+        """An existing array is filled in place and must have the right shape."""
+        out = np.zeros((2, len(SEQS)), dtype=np.float64)
+        assert similarity_matrix(SEQS[:2], library=SEQS, out=out) is out
+        with pytest.raises(ValueError):
+            similarity_matrix(SEQS, out=out)
+
+    def test_empty_sequence_is_nan(self):
+        """Pairs with nothing to align are NaN instead of an error."""
+        matrix = similarity_matrix(['', 'MALW'])
+        assert math.isnan(matrix[0, 0])
+        assert matrix[1, 1] == 100.0
+
+    def test_empty_input(self):
+        """No sequences give an empty matrix."""
+        assert similarity_matrix([]).shape == (0, 0)
+
+
+class TestIsSimilarMatrix:
+    """Test the is_similar_matrix function."""
+
+    @pytest.mark.parametrize('min_identity', [0, 50, 80, 100])
+    def test_matches_thresholded_similarity(self, min_identity):
+        expected = similarity_matrix(SEQS) >= min_identity
+        np.testing.assert_array_equal(is_similar_matrix(SEQS, min_identity=min_identity,
+                                                        tile_size=2), expected)
+
+    def test_rectangular_and_parallel(self):
+        expected = similarity_matrix(SEQS[:2], library=SEQS) >= 80
+        matrix = is_similar_matrix(SEQS[:2], library=SEQS, min_identity=80, n_jobs=2)
+        assert matrix.dtype == bool
+        np.testing.assert_array_equal(matrix, expected)
+
+    def test_prunes_distant_pairs(self, monkeypatch):
+        """Only pairs whose composition bound reaches the threshold are aligned."""
+        module = importlib.import_module('protein_ab_tools.align.similarity_matrix')
+        calls = []
+        real = module.calc_percent_similarity
+
+        def counting(seq1, seq2, mode='blastp'):
+            calls.append((seq1, seq2))
+            return real(seq1, seq2, mode=mode)
+
+        monkeypatch.setattr(module, 'calc_percent_similarity', counting)
+        is_similar_matrix(SEQS, min_identity=90)
+        # The diagonal plus the two related 24/25-residue sequences.
+        assert len(calls) == len(SEQS) + 1
+
+    def test_empty_sequence_is_false(self):
+        matrix = is_similar_matrix(['', 'MALW'], min_identity=0)
+        assert not matrix[0, 0] and not matrix[0, 1]
+        assert matrix[1, 1]
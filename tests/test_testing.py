@@ -0,0 +1,112 @@
+"""
+Tests for the synthetic antibody generator and the ANARCI stand-in.
+"""
+import pytest
+from protein_ab_tools.ab_analysis import numbering
+from protein_ab_tools.ab_analysis.numbering import (extract_regions, run_numbering,
+                                                    run_numbering_batch)
+from protein_ab_tools.testing import (J_TEMPLATES, V_TEMPLATES, fake_anarci,
+                                      synthetic_sequences, use_fake_anarci)
+
+
+class TestSyntheticSequences:
+    """Test synthetic_sequences."""
+
+    def test_seeded(self):
+        """The same seed gives the same sequences, another seed others."""
+        assert synthetic_sequences(20, seed=1) == synthetic_sequences(20, seed=1)
+        assert synthetic_sequences(20, seed=1) != synthetic_sequences(20, seed=2)
+        assert synthetic_sequences(5, 'L', seed=1) != synthetic_sequences(5, 'H', seed=1)
+
+    def test_domains(self):
+        """Domains have V-domain lengths and end in a J framework 4."""
+        heavy = synthetic_sequences(50, 'H')
+        light = synthetic_sequences(50, 'L')
+        assert all(110 <= len(seq) <= 135 for seq in heavy)
+        assert all(100 <= len(seq) <= 120 for seq in light)
+        assert all(seq[-11] == 'W' for seq in heavy)
+        assert all(seq[-10] == 'F' for seq in light)
+
+    def test_unmutated(self):
+        """Without mutations, sequences are made of germline templates."""
+        fwr1s = {t.fwr1 for t in V_TEMPLATES}
+        fwr4s = {fwr4 for genes in J_TEMPLATES.values() for _, fwr4 in genes}
+        for seq in synthetic_sequences(20, 'L', mutation_rate=0, cdr_mutation_rate=0):
+            assert any(seq.startswith(fwr1) for fwr1 in fwr1s)
+            assert any(seq.endswith(fwr4) for fwr4 in fwr4s)
+
+
+class TestFakeAnarci:
+    """Test fake_anarci and use_fake_anarci."""
+
+    def test_result_structure(self):
+        """Results are shaped like anarci's; non-antibodies give None."""
+        seq = synthetic_sequences(1)[0]
+        numbered, details, hits = fake_anarci([('h', seq), ('x', 'ACDEFGHIK' * 12)],
+                                              allow=['H'], assign_germline=True)
+        (numbering_, start, end), = numbered[0]
+        assert (start, end) == (0, len(seq) - 1)
+        assert ''.join(aa for _, aa in numbering_ if aa != '-') == seq
+        assert [number for (number, _), _ in numbering_[:3]] == [1, 2, 3]
+        assert details[0][0]['chain_type'] == 'H'
+        assert details[0][0]['query_name'] == 'h'
+        assert details[0][0]['germlines']['v_gene'][0][1].startswith('IGHV')
+        assert hits[0][0][0] == 'id'
+        assert numbered[1] is None and details[1] is None
+
+    def test_chain_types(self):
+        """Light chains are numbered as kappa or lambda and rejected as heavy."""
+        light = synthetic_sequences(30, 'L')
+        numbered, details, _ = fake_anarci([(str(i), seq) for i, seq in enumerate(light)])
+        assert {d[0]['chain_type'] for d in details} == {'K', 'L'}
+        numbered, _, _ = fake_anarci([('l', light[0])], allow=['H'])
+        assert numbered == [None]
+
+    def test_long_cdr3(self):
+        """CDR3s longer than 13 residues get insertions at 111 and 112."""
+        seq = synthetic_sequences(1, mutation_rate=0, cdr_mutation_rate=0)[0]
+        cdr3_start = seq.index('YYC') + 3
+        long_seq = seq[:cdr3_start] + 'ARDYYGSGSYYNPFDY' + seq[-11:]
+        domain = fake_anarci([('h', long_seq)])[0][0][0][0]
+        keys = [key for key, _ in domain if 110 <= key[0] <= 113]
+        assert keys == [(110, ' '), (111, ' '), (111, 'A'), (112, 'B'), (112, 'A'),
+                        (112, ' '), (113, ' ')]
+
+    def test_numbering_functions(self):
+        """The package's numbering functions run on the stand-in."""
+        seq = synthetic_sequences(1, mutation_rate=0, cdr_mutation_rate=0)[0]
+        with use_fake_anarci():
+            regions = extract_regions(seq)
+            batch = run_numbering_batch([seq, 'INVALID'], chain='H')
+            with pytest.raises(AssertionError, match='kabat'):
+                run_numbering(seq, scheme='kabat')
+        assert {regions['vh_fwr1'].replace('-', ''), regions['vh_fwr2']} <= \
+            {t.fwr1 for t in V_TEMPLATES} | {t.fwr2 for t in V_TEMPLATES}
+        assert regions['vh_fwr4'] in [fwr4 for _, fwr4 in J_TEMPLATES['H']]
+        assert len(regions['vh_fwr3']) == 39
+        assert [record.ok for record in batch] == [True, False]
+
+    def test_restored(self):
+        """The numbering module is left as it was."""
+        before = dict(numbering.__dict__)
+        with use_fake_anarci():
+            assert numbering.anarci is fake_anarci
+        assert numbering.ANARCI_AVAILABLE == before['ANARCI_AVAILABLE']
+        for name in numbering._ANARCI_NAMES:
+            assert numbering.__dict__.get(name) is before.get(name)
+
+
+@pytest.mark.requires_anarci
+class TestAgainstAnarci:
+    """Test that the stand-in numbers synthetic sequences as anarci does."""
+
+    @pytest.mark.parametrize('chain', ['H', 'L'])
+    def test_same_numbering(self, chain):
+        """IMGT numbering and chain types equal anarci's."""
+        seqs = synthetic_sequences(40, chain, seed=7)
+        real = run_numbering_batch(seqs, chain=chain)
+        with use_fake_anarci():
+            fake = run_numbering_batch(seqs, chain=chain)
+        for r, f in zip(real, fake):
+            assert f.result[0] == r.result[0]
+            assert f.result[1][0][0]['chain_type'] == r.result[1][0][0]['chain_type']